@@ -0,0 +1,85 @@
+# scripts/check_conformance.py
+"""
+Record golden traces from the reference run_sim, or check the alternate engines against them.
+
+Run from repo root:
+
+  PYTHONPATH=src python scripts/check_conformance.py record golden/
+  PYTHONPATH=src python scripts/check_conformance.py check golden/
+
+check runs every engine of cyber_sim.conformance.EXACT_ENGINES (draw for draw), DISTRIBUTION_ENGINES
+(KS / chi-square), SUMMARY_ENGINES (KS on per-run averages) and the record_run replay check, and exits with
+status 1 if any case fails. tests/golden is a small golden directory checked by the test suite.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.conformance import (
+    DEFAULT_CORNERS, EXACT_ENGINES, DISTRIBUTION_ENGINES, SUMMARY_ENGINES, record_golden, load_golden, check_exact,
+    check_distribution, check_summary, check_replay,
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", choices=["record", "check"])
+    parser.add_argument("path")
+    parser.add_argument("--corners", nargs="*", default=list(DEFAULT_CORNERS))
+    parser.add_argument("--steps", type=int, default=300)  # length of the exact-replay traces
+    parser.add_argument("--reps", type=int, default=200)  # independent runs for the distribution tests
+    parser.add_argument("--dist_steps", type=int, default=60)
+    parser.add_argument("--alpha", type=float, default=0.01)  # family-wise level per case
+    parser.add_argument("--engines", nargs="*", default=None)  # subset of the engines to check
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        P = apply_defaults(default_parameters())
+        cases = record_golden(P, args.path, corners={k: DEFAULT_CORNERS[k] for k in args.corners},
+                              T=args.steps, n_reps=args.reps, dist_T=args.dist_steps)
+        print(f"Recorded {len(cases)} golden cases in {args.path}")
+        return 0
+
+    golden = load_golden(args.path)
+    failed = False
+    for name, engine in EXACT_ENGINES.items():
+        if args.engines is not None and name not in args.engines:
+            continue
+        report = check_exact(golden, engine)
+        failed |= not report["ok"].all()
+        print(f"\n[exact] {name}: {int(report['ok'].sum())}/{len(report)} cases match")
+        if not report["ok"].all():
+            print(report[~report["ok"]].to_string(index=False))
+
+    for name, engine in DISTRIBUTION_ENGINES.items():
+        if args.engines is not None and name not in args.engines:
+            continue
+        summary, tests = check_distribution(golden, engine, alpha=args.alpha)
+        failed |= not summary["ok"].all()
+        print(f"\n[distribution] {name}: {int(summary['ok'].sum())}/{len(summary)} cases pass")
+        print(summary.to_string(index=False))
+
+    for name, engine in SUMMARY_ENGINES.items():
+        if args.engines is not None and name not in args.engines:
+            continue
+        summary, tests = check_summary(golden, engine, alpha=args.alpha)
+        failed |= not summary["ok"].all()
+        ran = summary["skipped"] == ""
+        print(f"\n[summary] {name}: {int(summary['ok'][ran].sum())}/{int(ran.sum())} cases pass, {int((~ran).sum())} skipped")
+        print(summary.to_string(index=False))
+
+    if args.engines is None or "record_run" in args.engines:
+        report = check_replay(golden)
+        failed |= not report["ok"].all()
+        print(f"\n[replay] record_run: {int(report['ok'].sum())}/{len(report)} cases match")
+        if not report["ok"].all():
+            print(report[~report["ok"]].to_string(index=False))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
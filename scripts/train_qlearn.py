@@ -10,12 +10,17 @@ macOS/Linux:
 Windows PowerShell:
   $env:PYTHONPATH="src"
   python scripts\train_qlearn.py
+
+The workflow is a pipeline of cached stages (cyber_sim.pipeline): train, greedy eval, baseline evals,
+threat checks, threat curve and heuristic checks. Stage outputs are stored under --artifacts and reused
+when their inputs did not change, e.g. changing only --p_attack_high reruns the high threat check only.
 """
 
 from __future__ import annotations
 
 import argparse
 import json
+import os
 
 import numpy as np
 
@@ -23,7 +28,133 @@ from cyber_sim.parameters import default_parameters, apply_defaults
 from cyber_sim.sim import run_sim, run_one
 from cyber_sim.state import make_initial_state
 from cyber_sim.rl import QLearner
-from cyber_sim.metrics import summarize_run, rolling_action_freq
+from cyber_sim.tilecoding import LinearQLearner
+from cyber_sim.metrics import summarize_run, rolling_action_freq, bootstrap_means, diff_table
+from cyber_sim.sensitivity import sensitivity_curve
+from cyber_sim.telemetry import Telemetry
+from cyber_sim.results import ResultsStore
+from cyber_sim.pipeline import Pipeline
+
+
+BASELINES = ("threshold_v1", "always_passive", "random")
+
+
+#Pipeline stages, each one takes its config (and the outputs of the stages it depends on)
+def eval_bootstrap(cfg: dict, df):
+    # block-bootstrap resamples of the summary metrics, only with --ci
+    if cfg["n_boot"] <= 0:
+        return None
+    return bootstrap_means(df, n_boot=cfg["n_boot"], rng=np.random.default_rng(cfg["boot_seed"]))
+
+
+def train_stage(cfg: dict) -> dict:
+    agent = QLearner(n_actions=3) if cfg["agent"] == "qlearn" else LinearQLearner(n_actions=3)
+
+    telemetry = None
+    if cfg["telemetry"] is not None:
+        telemetry = Telemetry(every=cfg["telemetry_every"], path=cfg["telemetry"])
+
+    train_df = run_one(
+        cfg["P"],
+        seed=cfg["seed"],
+        policy=cfg["policy"],
+        T=cfg["steps"],
+        agent=agent,
+        learn=1,
+        epsilon=float(cfg["P"]["rl_epsilon"]),
+        telemetry=telemetry,
+    )
+    return {
+        "agent": agent,
+        "summary": summarize_run(train_df),
+        "action_mix": rolling_action_freq(train_df, window=500),
+    }
+
+
+def greedy_eval_stage(cfg: dict, train: dict) -> dict:
+    eval_q_df = run_one(
+        cfg["P"],
+        seed=cfg["seed"],
+        policy=cfg["policy"],
+        T=cfg["steps"],
+        agent=train["agent"],
+        learn=0,
+        epsilon=0.0,  # greedy eval
+    )
+    return {
+        "summary": summarize_run(eval_q_df),
+        "action_mix": rolling_action_freq(eval_q_df, window=250),
+        "bootstrap": eval_bootstrap(cfg, eval_q_df),
+    }
+
+
+def baseline_eval_stage(cfg: dict) -> dict:
+    df = run_one(cfg["P"], seed=cfg["seed"], policy=cfg["policy"], T=cfg["steps"], agent=None)
+    return {"summary": summarize_run(df), "bootstrap": eval_bootstrap(cfg, df)}
+
+
+#Threat Sensitivity Analysis, compares QLearn vs. threshold_v1 vs. random policy
+def threat_check_stage(cfg: dict, train: dict) -> tuple[dict, dict]:
+    P2 = cfg["P"].copy()
+    P2["defender_policy"] = cfg["policy"]
+    P2["rl_learn"] = 0
+    P2["rl_epsilon"] = 0.0
+    P2["p_attack"] = float(cfg["p_attack"])
+    P2["Seed"] = int(cfg["seed"])
+
+    rng = np.random.default_rng(int(P2["Seed"]))
+    df = run_sim(P2, make_initial_state(P2), rng, agent=train["agent"])
+    return summarize_run(df), df["action_name"].value_counts(normalize=True).to_dict()
+
+
+# Dense threat curve between the low and high threat levels, evaluated in one batched pass
+def threat_curve_stage(cfg: dict, train: dict):
+    grid = {"p_attack": np.linspace(cfg["p_attack_low"], cfg["p_attack_high"], cfg["points"])}
+    return sensitivity_curve(cfg["P"], grid, policy=cfg["policy"], agent=train["agent"])
+
+
+# Heuristic policies under low/high threat
+def heuristic_check_stage(cfg: dict) -> dict:
+    P2 = cfg["P"].copy()
+    P2["defender_policy"] = cfg["policy"]
+    P2["p_attack"] = float(cfg["p_attack"])
+    P2["Seed"] = int(cfg["seed"])
+
+    rng = np.random.default_rng(int(P2["Seed"]))
+    df = run_sim(P2, make_initial_state(P2), rng, agent=None)
+    return summarize_run(df)
+
+
+def build_pipeline(args: argparse.Namespace, P) -> Pipeline:
+    rl_policy = "qlearn_v1" if args.agent == "qlearn" else "linear_v1"
+    pipe = Pipeline(store=None if args.no_cache else args.artifacts, workers=args.workers)
+
+    pipe.add("train", train_stage, {
+        "P": P, "agent": args.agent, "policy": rl_policy, "seed": args.train_seed, "steps": args.train_steps,
+        "telemetry": args.telemetry, "telemetry_every": args.telemetry_every,
+    })
+    pipe.add("eval_greedy", greedy_eval_stage, {
+        "P": P, "policy": rl_policy, "seed": args.eval_seed, "steps": args.eval_steps, "n_boot": args.ci, "boot_seed": 0,
+    }, deps=["train"])
+    for k, policy in enumerate(BASELINES):
+        pipe.add(f"eval_{policy}", baseline_eval_stage, {
+            "P": P, "policy": policy, "seed": args.eval_seed, "steps": args.eval_steps, "n_boot": args.ci, "boot_seed": k + 1,
+        })
+
+    for level in ("low", "high"):
+        p_attack = getattr(args, f"p_attack_{level}")
+        pipe.add(f"threat_{level}", threat_check_stage,
+                 {"P": P, "policy": rl_policy, "p_attack": p_attack, "seed": 123}, deps=["train"])
+        for policy in ("threshold_v1", "random"):
+            pipe.add(f"heuristic_{policy}_{level}", heuristic_check_stage,
+                     {"P": P, "policy": policy, "p_attack": p_attack, "seed": 123})
+
+    if args.threat_curve_points > 0:
+        pipe.add("threat_curve", threat_curve_stage, {
+            "P": P, "policy": rl_policy, "p_attack_low": args.p_attack_low, "p_attack_high": args.p_attack_high,
+            "points": args.threat_curve_points,
+        }, deps=["train"])
+    return pipe
 
 
 def main() -> None:
@@ -32,93 +163,72 @@ def main() -> None:
     parser.add_argument("--eval_steps", type=int, default=25_000)
     parser.add_argument("--train_seed", type=int, default=1)
     parser.add_argument("--eval_seed", type=int, default=2)
-    parser.add_argument("--epsilon", type=float, default=None)  
+    parser.add_argument("--epsilon", type=float, default=None)
+    parser.add_argument("--agent", choices=["qlearn", "linear"], default="qlearn")  # tabular (qlearn_v1) or tile-coded (linear_v1)
     parser.add_argument("--p_attack_low", type=float, default=0.10)
     parser.add_argument("--p_attack_high", type=float, default=0.60)
     parser.add_argument("--print_action_mix", action="store_true")
+    parser.add_argument("--threat_curve_points", type=int, default=0)
+    parser.add_argument("--telemetry", type=str, default=None)  # JSONL path for training telemetry
+    parser.add_argument("--telemetry_every", type=int, default=5_000)
+    parser.add_argument("--results", type=str, default=None)  # results store directory for the evaluation summaries
+    parser.add_argument("--artifacts", type=str, default=".artifacts")  # stage cache directory
+    parser.add_argument("--no_cache", action="store_true")  # rerun every stage, nothing is stored
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))  # stages run concurrently
+    parser.add_argument("--ci", type=int, default=0)  # block-bootstrap resamples for greedy vs baseline CIs (0 = off)
     args = parser.parse_args()
 
     #Parameter values to be used during test execution
     P = apply_defaults(default_parameters())
     if args.epsilon is not None:
         P["rl_epsilon"] = float(args.epsilon)
+    rl_policy = "qlearn_v1" if args.agent == "qlearn" else "linear_v1"
 
-    #Create an instance of the QLearner agent
-    agent = QLearner(n_actions=3)
-
-   #Initial training run
-    train_df = run_one(
-        P,
-        seed=args.train_seed,
-        policy="qlearn_v1",
-        T=args.train_steps,
-        agent=agent,
-        learn=1,
-        epsilon=float(P["rl_epsilon"]),
-    )
-    train_summary = summarize_run(train_df)
-
-    #Evaluation runs
-    eval_q_df = run_one(
-        P,
-        seed=args.eval_seed,
-        policy="qlearn_v1",
-        T=args.eval_steps,
-        agent=agent,
-        learn=0,
-        epsilon=0.0,  # greedy eval
-    )
-
-    eval_thr_df = run_one(
-        P, seed=args.eval_seed, policy="threshold_v1", T=args.eval_steps, agent=None
-    )
-    eval_pas_df = run_one(
-        P, seed=args.eval_seed, policy="always_passive", T=args.eval_steps, agent=None
-    )
-    eval_rnd_df = run_one(
-        P, seed=args.eval_seed, policy="random", T=args.eval_steps, agent=None
-    )
+    pipe = build_pipeline(args, P)
+    out = pipe.run()
+    print("Stages:", json.dumps({name: pipe.status[name] for name in pipe.stages}))
 
+    train_summary = out["train"]["summary"]
     eval_summary = {
-        "qlearn_greedy": summarize_run(eval_q_df),
-        "threshold_v1": summarize_run(eval_thr_df),
-        "always_passive": summarize_run(eval_pas_df),
-        "random": summarize_run(eval_rnd_df),
+        "qlearn_greedy": out["eval_greedy"]["summary"],
+        "threshold_v1": out["eval_threshold_v1"]["summary"],
+        "always_passive": out["eval_always_passive"]["summary"],
+        "random": out["eval_random"]["summary"],
     }
 
+    if args.results is not None:
+        store = ResultsStore(args.results)
+        for policy, summary in zip((rl_policy,) + BASELINES, eval_summary.values()):
+            P_eval = P.copy()
+            P_eval["defender_policy"] = policy
+            P_eval["T"] = int(args.eval_steps)
+            store.append(P_eval, args.eval_seed, summary)
+        store.flush()
+
     print("\nTraining Summary:")
     print(json.dumps(train_summary, indent=2, sort_keys=True))
 
     print("\nEvaluation Summary:")
     print(json.dumps(eval_summary, indent=2, sort_keys=True))
 
+    if args.ci > 0:
+        for policy in BASELINES:
+            table = diff_table(out["eval_greedy"]["bootstrap"], out[f"eval_{policy}"]["bootstrap"])
+            table = table.drop(index="mean_reward")  # baselines log rl_reward = 0, only the outcomes compare
+            print(f"\nqlearn_greedy - {policy} (95% block-bootstrap CI, {args.ci} resamples):")
+            print(table.to_string(float_format=lambda x: f"{x:.4f}"))
+
     #Additional diagnostics
     if args.print_action_mix:
-        train_action_mix = rolling_action_freq(train_df, window=500)
-        eval_action_mix_q = rolling_action_freq(eval_q_df, window=250)
-
         print("\nQ size end (train):", train_summary.get("q_size_end", None))
         print("\nTrain action mix by window (head):")
-        print(train_action_mix.head())
+        print(out["train"]["action_mix"].head())
 
         print("\nEval action mix (qlearn greedy) by window (head):")
-        print(eval_action_mix_q.head())
+        print(out["eval_greedy"]["action_mix"].head())
 
-    #Threat Sensitivity Analysis, compares QLearn vs. threshold_v1 vs. random policy
-    def eval_qlearn_under(p_attack: float, seed: int = 123) -> tuple[dict, dict]:
-        P2 = P.copy()
-        P2["defender_policy"] = "qlearn_v1"
-        P2["rl_learn"] = 0
-        P2["rl_epsilon"] = 0.0
-        P2["p_attack"] = float(p_attack)
-        P2["Seed"] = int(seed)
-
-        rng = np.random.default_rng(int(P2["Seed"]))
-        df = run_sim(P2, make_initial_state(P2), rng, agent=agent)
-        return summarize_run(df), df["action_name"].value_counts(normalize=True).to_dict()
-
-    low_sum, low_mix = eval_qlearn_under(args.p_attack_low)
-    high_sum, high_mix = eval_qlearn_under(args.p_attack_high)
+    low_sum, low_mix = out["threat_low"]
+    high_sum, high_mix = out["threat_high"]
 
     print("\nThreat Check")
     print("LOW THREAT:", low_sum)
@@ -126,22 +236,15 @@ def main() -> None:
     print("HIGH THREAT:", high_sum)
     print("HIGH THREAT action mix:", high_mix)
 
-    # Compare heuristic policies under low/high threat
-    def eval_policy_under(policy: str, p_attack: float, seed: int = 123) -> dict:
-        P2 = P.copy()
-        P2["defender_policy"] = policy
-        P2["p_attack"] = float(p_attack)
-        P2["Seed"] = int(seed)
-
-        rng = np.random.default_rng(int(P2["Seed"]))
-        df = run_sim(P2, make_initial_state(P2), rng, agent=None)
-        return summarize_run(df)
+    if args.threat_curve_points > 0:
+        print("\nThreat Curve (qlearn greedy):")
+        print(out["threat_curve"].to_string(index=False))
 
     print("\n=== HEURISTICS THREAT CHECK ===")
-    print("THRESH low :", eval_policy_under("threshold_v1", args.p_attack_low))
-    print("THRESH high:", eval_policy_under("threshold_v1", args.p_attack_high))
-    print("RAND low   :", eval_policy_under("random", args.p_attack_low))
-    print("RAND high  :", eval_policy_under("random", args.p_attack_high))
+    print("THRESH low :", out["heuristic_threshold_v1_low"])
+    print("THRESH high:", out["heuristic_threshold_v1_high"])
+    print("RAND low   :", out["heuristic_random_low"])
+    print("RAND high  :", out["heuristic_random_high"])
 
 
 if __name__ == "__main__":
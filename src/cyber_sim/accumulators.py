@@ -0,0 +1,230 @@
+"""
+Mergeable online summaries for map-reduce aggregation of many runs.
+
+SummaryAccumulator keeps, for the summarize_run metrics, the step count, sums, Welford moments (mean, M2),
+min/max, the action histogram and optionally a quantile sketch. It updates from single rows, chunks of rows
+(DataFrame in either schema, dict of arrays, run_sim(schema = 'rows') lists) or whole runs, and merge() combines two accumulators with Chan's
+parallel formulas, so the result does not depend on how runs were split across chunks, workers or merge order
+(up to float rounding). Every finished run also adds its per-run means to run-level moments, which give the
+spread across seeds.
+
+  acc = SummaryAccumulator()
+  for seed in seeds:
+    acc.add_run(run_one(P, seed, ...))
+  total = merge_all([acc_worker_1, acc_worker_2, ...])
+  total.summary(), total.stats()
+"""
+from .enums import Action
+from .schema import column
+
+import numpy as np
+
+#summarize_run key -> logged column
+METRICS = {
+  'mean_reward': 'rl_reward',
+  'mean_outage': 'outage_next',
+  'mean_damage_step': 'damage_step',
+  'time_it_comp': 'it_comp_end',
+  'time_ot_comp': 'ot_comp_end',
+}
+
+
+def _combine(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+  #Chan et al. pairwise update of (count, mean, M2)
+  n = n_a + n_b
+  if n == 0:
+    return 0, mean_a, m2_a
+  delta = mean_b - mean_a
+  mean = mean_a + delta * (n_b / n)
+  m2 = m2_a + m2_b + delta ** 2 * (n_a * n_b / n)
+  return n, mean, m2
+
+
+class QuantileSketch:
+  """
+  Relative-error quantile sketch (DDSketch): values fall into logarithmic buckets of width rel_acc, so any
+  quantile is returned within a relative error of rel_acc, merging adds bucket counts. One sketch per column.
+  """
+  def __init__(self, k, rel_acc = 0.01):
+    self.k = int(k)
+    self.rel_acc = float(rel_acc)
+    self.gamma = (1.0 + self.rel_acc) / (1.0 - self.rel_acc)
+    self._log_gamma = np.log(self.gamma)
+    self.pos = [dict() for _ in range(self.k)]
+    self.neg = [dict() for _ in range(self.k)]
+    self.zeros = np.zeros(self.k, dtype = np.int64)
+
+  def update(self, X):
+    X = np.asarray(X, dtype = float).reshape(-1, self.k)
+    for j in range(self.k):
+      x = X[:, j]
+      self.zeros[j] += np.count_nonzero(x == 0)
+      for sign, buckets in ((1, self.pos[j]), (-1, self.neg[j])):
+        v = x[sign * x > 0] * sign
+        if v.size:
+          keys, counts = np.unique(np.ceil(np.log(v) / self._log_gamma).astype(np.int64), return_counts = True)
+          for key, c in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + c
+
+  def merge(self, other):
+    if other.k != self.k or other.rel_acc != self.rel_acc:
+      raise ValueError("can only merge sketches with the same shape and accuracy")
+    for j in range(self.k):
+      for mine, theirs in ((self.pos[j], other.pos[j]), (self.neg[j], other.neg[j])):
+        for key, c in theirs.items():
+          mine[key] = mine.get(key, 0) + c
+    self.zeros += other.zeros
+    return self
+
+  def quantile(self, j, q):
+    #ascending order: negative buckets by decreasing magnitude, zeros, positive buckets by increasing magnitude
+    neg = sorted(self.neg[j].items(), reverse = True)
+    pos = sorted(self.pos[j].items())
+    total = sum(c for _, c in neg) + int(self.zeros[j]) + sum(c for _, c in pos)
+    if total == 0:
+      return np.nan
+    rank = q * (total - 1)
+    seen = 0
+    for key, c in neg:
+      seen += c
+      if seen > rank:
+        return -2.0 * self.gamma ** key / (self.gamma + 1.0)
+    seen += int(self.zeros[j])
+    if seen > rank:
+      return 0.0
+    for key, c in pos:
+      seen += c
+      if seen > rank:
+        return 2.0 * self.gamma ** key / (self.gamma + 1.0)
+    return 2.0 * self.gamma ** pos[-1][0] / (self.gamma + 1.0)
+
+
+class SummaryAccumulator:
+  """
+  Online, mergeable version of summarize_run over any number of steps and runs.
+  quantiles = True also keeps a QuantileSketch (relative accuracy rel_acc) of every metric.
+  """
+  def __init__(self, quantiles = False, rel_acc = 0.01):
+    k = len(METRICS)
+    #pooled over all steps
+    self.n = 0
+    self.sum = np.zeros(k)
+    self.mean = np.zeros(k)
+    self.m2 = np.zeros(k)
+    self.min = np.full(k, np.inf)
+    self.max = np.full(k, -np.inf)
+    self.action_counts = np.zeros(len(Action), dtype = np.int64)
+    self.q_size_end = np.nan
+    self.sketch = QuantileSketch(k, rel_acc) if quantiles else None
+
+    #run level moments of the per-run means, and the sums of the run still open
+    self.n_runs = 0
+    self.run_mean = np.zeros(k)
+    self.run_m2 = np.zeros(k)
+    self._open_n = 0
+    self._open_sum = np.zeros(k)
+
+  def _chunk(self, chunk):
+    #(m, k) metric matrix, action and q_size columns of a row dict, list of row dicts, DataFrame or dict of arrays
+    if isinstance(chunk, list):
+      keys = chunk[0].keys() if chunk else ('outage_next', 'action')
+      chunk = {c: [r[c] for r in chunk] for c in keys if c in ('action', 'q_size') or c in METRICS.values()}
+    elif isinstance(chunk, dict) and np.ndim(chunk.get('outage_next', 0)) == 0:
+      chunk = {c: [v] for c, v in chunk.items()}
+    m = len(chunk['outage_next'])
+    X = np.empty((m, len(METRICS)))
+    for j, c in enumerate(METRICS.values()):
+      X[:, j] = np.asarray(chunk[c], dtype = float) if c in chunk else 0.0
+    q_size = column(chunk, 'q_size') if hasattr(chunk, 'columns') else chunk.get('q_size', np.nan)
+    return X, np.asarray(chunk['action'], dtype = np.int64), np.asarray(q_size, dtype = float).ravel()
+
+  def update(self, chunk):
+    """Adds one row (dict), or a chunk of rows (DataFrame in either schema, dict of arrays, list of row dicts) of the open run"""
+    X, action, q_size = self._chunk(chunk)
+    m = X.shape[0]
+    if m == 0:
+      return self
+    self.n, self.mean, self.m2 = _combine(self.n, self.mean, self.m2, m, X.mean(axis = 0), ((X - X.mean(axis = 0)) ** 2).sum(axis = 0))
+    self.sum += X.sum(axis = 0)
+    self.min = np.minimum(self.min, X.min(axis = 0))
+    self.max = np.maximum(self.max, X.max(axis = 0))
+    self.action_counts += np.bincount(action, minlength = len(Action))
+    if self.sketch is not None:
+      self.sketch.update(X)
+
+    if q_size.size and not np.isnan(q_size[-1]):
+      self.q_size_end = float(q_size[-1])
+
+    self._open_n += m
+    self._open_sum += X.sum(axis = 0)
+    return self
+
+  def finish_run(self):
+    """Closes the open run, its means enter the run level moments"""
+    if self._open_n > 0:
+      self.n_runs, self.run_mean, self.run_m2 = _combine(self.n_runs, self.run_mean, self.run_m2, 1, self._open_sum / self._open_n, np.zeros(len(METRICS)))
+    self._open_n = 0
+    self._open_sum = np.zeros(len(METRICS))
+    return self
+
+  def add_run(self, df):
+    """update with a whole run (the run_sim DataFrame) and finish it"""
+    return self.update(df).finish_run()
+
+  def merge(self, other):
+    """Adds other into self (open runs of both are finished first) and returns self"""
+    self.finish_run()
+    other.finish_run()
+    self.n, self.mean, self.m2 = _combine(self.n, self.mean, self.m2, other.n, other.mean, other.m2)
+    self.sum += other.sum
+    self.min = np.minimum(self.min, other.min)
+    self.max = np.maximum(self.max, other.max)
+    self.action_counts += other.action_counts
+    #q_size only grows while an agent trains, the largest one is the latest
+    self.q_size_end = float(np.fmax(self.q_size_end, other.q_size_end))
+    self.n_runs, self.run_mean, self.run_m2 = _combine(self.n_runs, self.run_mean, self.run_m2, other.n_runs, other.run_mean, other.run_m2)
+    if self.sketch is not None and other.sketch is not None:
+      self.sketch.merge(other.sketch)
+    elif other.sketch is not None or self.sketch is not None:
+      self.sketch = None #only one side had a sketch, quantiles of the union are unknown
+    return self
+
+  def summary(self):
+    """summarize_run dict pooled over every step seen"""
+    out = {k: (float(self.mean[j]) if self.n else np.nan) for j, k in enumerate(METRICS)}
+    total = int(self.action_counts.sum())
+    out['action_freq'] = {Action(a).name: c / total for a, c in sorted(enumerate(self.action_counts.tolist()), key = lambda x: -x[1]) if c > 0}
+    out['q_size_end'] = self.q_size_end
+    return out
+
+  def stats(self, q = (0.05, 0.5, 0.95)):
+    """
+    DataFrame with one row per metric: steps, sum, mean, std, min, max over all steps, quantiles q (with a sketch),
+    and runs, run_mean, run_std over the per-run means
+    """
+    import pandas as pd
+    out = pd.DataFrame({
+      'steps': self.n,
+      'sum': self.sum,
+      'mean': self.mean if self.n else np.nan,
+      'std': np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.nan,
+      'min': self.min,
+      'max': self.max,
+    }, index = list(METRICS))
+    if self.sketch is not None:
+      for p in q:
+        out[f'q{p:g}'] = [self.sketch.quantile(j, p) for j in range(len(METRICS))]
+    out['runs'] = self.n_runs
+    out['run_mean'] = self.run_mean if self.n_runs else np.nan
+    out['run_std'] = np.sqrt(self.run_m2 / (self.n_runs - 1)) if self.n_runs > 1 else np.nan
+    return out
+
+
+def merge_all(accs):
+  """Pairwise (tree) merge of a list of accumulators, the inputs are merged into and should not be reused"""
+  accs = list(accs)
+  if not accs:
+    return SummaryAccumulator()
+  while len(accs) > 1:
+    accs = [accs[i].merge(accs[i + 1]) if i + 1 < len(accs) else accs[i] for i in range(0, len(accs), 2)]
+  return accs[0]
@@ -0,0 +1,166 @@
+"""
+Learning attacker co-trained against a learning defender (self-play) on the batched engine.
+
+The attacker is a tabular QLearner with 5 actions, one per (target, intensity) pair the fixed attack process
+can produce: no attack, IT low, IT high, OT low, OT high. It observes the defender's compromise flags,
+vulnerabilities and identification capability (attacker_discretizer) and is rewarded with the defender's loss
+(the rl_w_* weights, without the defender's action costs) minus its own effort and exposure costs (adv_*).
+During training its actions replace sample_attacker_batch through batch_step(target =, intensity =).
+"""
+from .enums import AttackTarget, Intensity
+from .rl import QLearner, learning_rates, rl_step_reward_batch
+from .batch import batch_parameters, batch_step, greedy_actions_batch, new_accumulator, accumulate_step, summarize_batch
+from .discretize import Discretizer
+from .episodic import sample_initial_states
+from .policies import make_policy
+from .schedules import check_stationary
+
+import numpy as np
+import pandas as pd
+
+#attacker action a -> (target, intensity)
+ATTACK_TARGETS = np.array([AttackTarget.NONE, AttackTarget.IT, AttackTarget.IT, AttackTarget.OT, AttackTarget.OT], dtype = np.int64)
+ATTACK_INTENSITIES = np.array([Intensity.NONE, Intensity.LOW, Intensity.HIGH, Intensity.LOW, Intensity.HIGH], dtype = np.int64)
+N_ATTACK_ACTIONS = len(ATTACK_TARGETS)
+
+
+def attacker_discretizer(Parameters):
+  """(it_comp, ot_comp, it_vuln, ot_vuln, id_cap) with 3 bins per continuous variable, 108 states"""
+  return Discretizer({
+    'it_comp': [0.5],
+    'ot_comp': [0.5],
+    'it_vuln': [1 / 3, 2 / 3],
+    'ot_vuln': [1 / 3, float(Parameters['ot_high_vuln_threshold'])],
+    'id_cap': [float(Parameters['rl_id_cap_lo']), float(Parameters['rl_id_cap_high'])],
+  })
+
+def make_attacker(Parameters, discretizer = None, replay = None):
+  #the attacker is a plain QLearner over its own state space and action set
+  return QLearner(n_actions = N_ATTACK_ACTIONS, replay = replay, discretizer = attacker_discretizer(Parameters) if discretizer is None else discretizer)
+
+
+def decide_attacks_batch(Parameters, States, rng, attacker, epsilon):
+  """Epsilon-greedy attacker actions for every environment, returns (attack action, target, intensity)"""
+  q = attacker.q_batch(attacker.encode_batch(Parameters, States))
+  a = greedy_actions_batch(q, rng)
+  n = a.shape[0]
+  explore = rng.random(n) < epsilon
+  if explore.any():
+    a = np.where(explore, rng.integers(0, N_ATTACK_ACTIONS, size = n), a)
+  return a, ATTACK_TARGETS[a], ATTACK_INTENSITIES[a]
+
+def attacker_reward_batch(Parameters, out):
+  """Defender loss caused this step minus attack effort and the penalty for detected footholds"""
+  #rl_step_reward_batch with no action costs (all actions given as PASSIVE) is exactly -loss
+  loss = -rl_step_reward_batch(Parameters, out['damage_step'], out['phys_damage_next'], out['outage_next'],
+                               out['it_comp_end'], out['ot_comp_end'], np.zeros_like(out['action']))
+  effort = (Parameters['adv_cost_low'] * (out['intensity'] == Intensity.LOW)
+            + Parameters['adv_cost_high'] * (out['intensity'] == Intensity.HIGH))
+  exposure = Parameters['adv_cost_detected'] * (out['it_detected'] + out['ot_detected'])
+  return loss - effort - exposure
+
+
+def train_selfplay(Parameters, defender, attacker, n_steps, n_envs = 256, schedule = 'simultaneous', phase_steps = 500,
+                   episode_len = 200, spec = None, seed = 1, log_every = 100):
+  """
+  Co-trains defender (QLearner or LinearQLearner) and attacker (make_attacker) for n_steps batched steps,
+  i.e. n_steps * n_envs transitions for each agent.
+  1. schedule = 'simultaneous': both agents update on every transition
+     schedule = 'alternating': the agents take turns every phase_steps steps, the one not learning plays greedily
+  2. every episode_len steps all environments restart from sample_initial_states(spec) (None = the *_init values)
+  3. exploration and step sizes are rl_epsilon/rl_alpha/rl_gamma for the defender and adv_* for the attacker
+  Returns a DataFrame with one row per log_every steps: mean rewards of both sides and the attacker's action mix.
+  """
+  check_stationary(Parameters, "self-play training")
+  P = Parameters.copy()
+  P['defender_policy'] = 'qlearn_v1' if isinstance(defender, QLearner) else 'linear_v1'
+  if schedule not in ('simultaneous', 'alternating'):
+    raise ValueError(f"Unknown self-play schedule: {schedule}")
+
+  PB = batch_parameters(P)
+  rng = np.random.default_rng(int(seed))
+  n = int(n_envs)
+  d_gamma, d_eps = float(P['rl_gamma']), float(P['rl_epsilon'])
+  a_alpha, a_gamma, a_eps = float(P['adv_alpha']), float(P['adv_gamma']), float(P['adv_epsilon'])
+
+  history = []
+  window = {'d_reward': 0.0, 'a_reward': 0.0, 'counts': np.zeros(N_ATTACK_ACTIONS, dtype = np.int64), 'steps': 0}
+
+  #bound to PB, so it reads the epsilon set for each phase
+  d_policy = make_policy(PB, agent = defender)
+  for t in range(int(n_steps)):
+    if t % int(episode_len) == 0:
+      SB = sample_initial_states(PB, spec or {}, n, rng)
+
+    if schedule == 'simultaneous':
+      d_learn = a_learn = True
+    else:
+      d_learn = (t // int(phase_steps)) % 2 == 0
+      a_learn = not d_learn
+
+    #the defender plays greedily on its Q-values (no epsilon, no UCB bonus) while it is not learning
+    PB['rl_epsilon'] = d_eps if d_learn else 0.0
+    PB['rl_learn'] = 1 if d_learn else 0
+    s_d = defender.encode_batch(PB, SB)
+    s_a = attacker.encode_batch(PB, SB)
+    action = d_policy.decide_batch(SB, rng)
+    a, target, intensity = decide_attacks_batch(PB, SB, rng, attacker, a_eps if a_learn else 0.0)
+
+    out = batch_step(PB, SB, rng, action, target = target, intensity = intensity)
+    r_d = rl_step_reward_batch(PB, out['damage_step'], out['phys_damage_next'], out['outage_next'], out['it_comp_end'], out['ot_comp_end'], action)
+    r_a = attacker_reward_batch(PB, out)
+
+    if d_learn:
+      defender.update_batch(s_d, action, r_d, defender.encode_batch(PB, SB), alpha = learning_rates(P, defender, s_d, action), gamma = d_gamma)
+    if a_learn:
+      attacker.update_batch(s_a, a, r_a, attacker.encode_batch(PB, SB), alpha = a_alpha, gamma = a_gamma)
+
+    window['d_reward'] += float(r_d.sum())
+    window['a_reward'] += float(r_a.sum())
+    window['counts'] += np.bincount(a, minlength = N_ATTACK_ACTIONS)
+    window['steps'] += 1
+
+    if window['steps'] == int(log_every) or t == int(n_steps) - 1:
+      m = window['steps'] * n
+      rec = {'t': t + 1, 'defender_reward': window['d_reward'] / m, 'attacker_reward': window['a_reward'] / m}
+      for k, name in enumerate(('none', 'it_low', 'it_high', 'ot_low', 'ot_high')):
+        rec['freq_' + name] = window['counts'][k] / m
+      history.append(rec)
+      window = {'d_reward': 0.0, 'a_reward': 0.0, 'counts': np.zeros(N_ATTACK_ACTIONS, dtype = np.int64), 'steps': 0}
+
+  return pd.DataFrame(history)
+
+def evaluate_selfplay(Parameters, defender, attacker, T = None, n_envs = 256, seed = 123):
+  """
+  Greedy defender vs greedy attacker, n_envs environments for T steps from the *_init state (learning frozen).
+  attacker = None plays the defender against the fixed attack process instead.
+  Returns the mean of the summarize_batch columns plus the attacker's mean reward.
+  """
+  check_stationary(Parameters, "self-play evaluation")
+  P = Parameters.copy()
+  P['defender_policy'] = 'qlearn_v1' if isinstance(defender, QLearner) else 'linear_v1'
+  P['rl_epsilon'] = 0.0
+  P['rl_learn'] = 0
+  PB = batch_parameters(P)
+  T = int(P['T'] if T is None else T)
+  n = int(n_envs)
+  rng = np.random.default_rng(int(seed))
+  SB = sample_initial_states(PB, {}, n, rng)
+
+  acc = new_accumulator(PB, n, T, agent = defender)
+  a_reward = 0.0
+  d_policy = make_policy(PB, agent = defender)
+  for _ in range(T):
+    action = d_policy.decide_batch(SB, rng)
+    if attacker is None:
+      target = intensity = None
+    else:
+      _, target, intensity = decide_attacks_batch(PB, SB, rng, attacker, 0.0)
+
+    out = batch_step(PB, SB, rng, action, target = target, intensity = intensity)
+    accumulate_step(acc, PB, action, out)
+    a_reward += float(attacker_reward_batch(PB, out).sum())
+
+  out = {k: float(np.mean(v)) for k, v in summarize_batch(acc).items()}
+  out['attacker_reward'] = a_reward / (T * n)
+  return out
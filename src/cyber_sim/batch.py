@@ -0,0 +1,303 @@
+"""
+Batched (vectorized) version of the simulation loop. Instead of one Parameters/State pair, we step n
+independent environments at once where every state variable is a numpy array of length n. Any parameter
+can also be given per environment (an array of length n), which lets us evaluate a whole grid of parameter
+values in a single pass. The phase ordering and formulas are the same as sim_step, only the random number
+stream differs, so results match the reference loop in distribution but not draw for draw.
+"""
+from .utils import clip01
+from .enums import Action, AttackTarget, Intensity
+from .rl import LEARNING_POLICIES, rl_step_reward_batch
+from .policies import greedy_actions_batch, make_policy
+from .schedules import as_schedule, scheduled_parameters, apply_schedules
+
+import numpy as np
+
+STATE_KEYS = ('it_vuln', 'ot_vuln', 'id_cap', 'it_comp', 'ot_comp', 'downtime', 'phys_damage', 'outage')
+FLAG_KEYS = ('it_comp', 'ot_comp')
+
+
+def batch_parameters(Parameters, overrides = None, n = None):
+  """
+  Converts a Parameters series into a plain dict used by the batched engine.
+  overrides maps parameter names to arrays of length n (one value per environment).
+  """
+  PB = {}
+  for k, v in Parameters.items():
+    #schedules are kept and compiled by the run loop (schedules.py)
+    PB[k] = v if isinstance(v, str) or as_schedule(v) is not None else float(v)
+
+  for k, v in (overrides or {}).items():
+    v = np.asarray(v, dtype = float)
+    if n is not None and v.shape != (n,):
+      raise ValueError(f"override for {k} must have shape ({n},), got {v.shape}")
+    PB[k] = v
+
+  return PB
+
+class GroupedGenerator:
+  """
+  Common random numbers for the batched engine: wraps a Generator so that environments with the same group id
+  get the same draws (groups is an array of length n). The engine draws full arrays every step, (n,) or (k, n)
+  with the environments last, or (n, m) with them first, so grouped environments stay on the same draws as
+  long as they make the same calls. Other shapes (and square (n, n) draws) come from the plain generator.
+  """
+  def __init__(self, rng, groups):
+    self.rng = rng
+    _, self.groups = np.unique(np.asarray(groups), return_inverse = True)
+    self.n = self.groups.shape[0]
+    self.n_groups = int(self.groups.max()) + 1 if self.n else 0
+
+  def _draw(self, draw, size):
+    shape = () if size is None else tuple(np.atleast_1d(size))
+    if len(shape) >= 1 and shape[-1] == self.n and not (len(shape) == 2 and shape[0] == self.n):
+      return draw(shape[:-1] + (self.n_groups,))[..., self.groups]
+    if len(shape) == 2 and shape[0] == self.n and shape[1] != self.n:
+      return draw((self.n_groups, shape[1]))[self.groups]
+    return draw(size)
+
+  def random(self, size = None):
+    return self._draw(self.rng.random, size)
+
+  def integers(self, low, high = None, size = None):
+    return self._draw(lambda s: self.rng.integers(low, high, size = s), size)
+
+def make_initial_batch_state(Parameters, n):
+  #same initial values as make_initial_state, broadcast out to n environments
+  S = {}
+  for k in STATE_KEYS:
+    v = np.broadcast_to(Parameters[k + '_init'], (n,))
+    if k in FLAG_KEYS:
+      S[k] = np.array(v, dtype = np.int64)
+    elif k in ('it_vuln', 'ot_vuln', 'id_cap'):
+      S[k] = np.array(clip01(v), dtype = float)
+    else:
+      S[k] = np.array(v, dtype = float)
+  return S
+
+def gov_mult_batch(Parameters):
+  return 0.5 + 0.5 * clip01(Parameters['G'])
+
+
+def decide_actions_batch(Parameters, States, rng, agent = None):
+  """
+  Vectorized choose_action, a thin wrapper over the policy's decide_batch (policies.py). qlearn_v1 and linear_v1
+  read the agent's current values through agent.encode_batch / agent.q_batch.
+  """
+  return make_policy(Parameters, agent = agent).decide_batch(States, rng)
+
+
+def apply_defender_action_batch(Parameters, States, action):
+  """Vectorized apply_defender_action, returns the boosts as a dict of arrays"""
+  gm = gov_mult_batch(Parameters)
+  passive = action == Action.PASSIVE
+  active = action == Action.ACTIVE
+  recover = action == Action.RECOVER
+
+  States['it_vuln'] = np.where(passive, clip01(States['it_vuln'] - gm * Parameters['delta_it_vuln']), States['it_vuln'])
+  States['ot_vuln'] = np.where(passive, clip01(States['ot_vuln'] - gm * Parameters['delta_ot_vuln']), States['ot_vuln'])
+  States['id_cap'] = np.where(passive, clip01(States['id_cap'] + gm * Parameters['delta_id_cap']), States['id_cap'])
+
+  return {
+    'detect_boost': active * (gm * Parameters['delta_detect']),
+    'contain_boost': active * (gm * Parameters['delta_contain']),
+    'active_damage_reduction': active * clip01(gm * Parameters['active_damage_reduction']),
+    'recover_clear_boost': recover * (gm * Parameters['delta_recover_clear']),
+    'downtime_reduction_boost': recover * clip01(gm * Parameters['delta_downtime_reduction']),
+  }
+
+def p_high_batch(Parameters, States):
+  return clip01(Parameters['p_high_base'] * np.exp(-Parameters['k_deterrence'] * States['id_cap']))
+
+def p_ot_batch(Parameters, States):
+  #probability that an attack targets OT
+  ot_high = States['ot_vuln'] >= Parameters['ot_high_vuln_threshold']
+  return clip01(Parameters['p_ot_given_attack_base']
+                + Parameters['p_ot_bonus_if_it_comp'] * (States['it_comp'] == 1)
+                + Parameters['p_ot_bonus_if_ot_high_vuln'] * ot_high)
+
+def sample_attacker_batch(Parameters, States, rng, u = None):
+  """
+  Vectorized sample_attacker_event, returns (target, intensity) arrays.
+  u optionally supplies the uniform draws, shape (3, n) for attack occurrence, target and intensity
+  (fleet.py uses this to correlate the attacker across sites).
+  """
+  n = States['it_comp'].shape[0]
+  if u is None:
+    u = rng.random((3, n))
+  attack = u[0] <= Parameters['p_attack']
+  target = np.where(u[1] < p_ot_batch(Parameters, States), int(AttackTarget.OT), int(AttackTarget.IT))
+  intensity = np.where(u[2] < p_high_batch(Parameters, States), int(Intensity.HIGH), int(Intensity.LOW))
+
+  target = np.where(attack, target, int(AttackTarget.NONE))
+  intensity = np.where(attack, intensity, int(Intensity.NONE))
+  return target, intensity
+
+def resolve_attack_batch(Parameters, States, rng, target, intensity):
+  """Vectorized resolve_attack, returns (p_success, success) arrays"""
+  vuln = np.where(target == AttackTarget.OT, States['ot_vuln'], States['it_vuln'])
+  p_success = clip01(Parameters['base_success_mult'] * vuln + Parameters['high_success_bonus'] * (intensity == Intensity.HIGH))
+  p_success = np.where(target == AttackTarget.NONE, 0.0, p_success)
+
+  success = rng.random(p_success.shape[0]) < p_success
+  States['it_comp'] = np.where(success & (target == AttackTarget.IT), 1, States['it_comp'])
+  States['ot_comp'] = np.where(success & (target == AttackTarget.OT), 1, States['ot_comp'])
+  return p_success, success.astype(np.int64)
+
+def detect_and_contain_batch(Parameters, States, rng, comp_key, B):
+  n = States[comp_key].shape[0]
+  comp = States[comp_key] == 1
+  detected = comp & (rng.random(n) < clip01(Parameters['p_detect_base'] + B['detect_boost']))
+  contained = detected & (rng.random(n) < clip01(Parameters['p_contain_base'] + B['contain_boost']))
+  States[comp_key] = np.where(contained, 0, States[comp_key])
+  return detected.astype(np.int64), contained.astype(np.int64)
+
+
+def batch_step(Parameters, States, rng, action, target = None, intensity = None, u = None, attacker = None):
+  """
+  One timestep for every environment, following the same phase order as sim_step.
+  target/intensity can be passed in to override the attacker process (e.g. a learning attacker),
+  attacker(Parameters, States, rng) -> (target, intensity) replaces the sampler on the state after the defender
+  action (e.g. a tilted attacker), otherwise they are sampled from sample_attacker_batch (with the uniforms u if given).
+  Returns a dict of per-environment step outcomes.
+  """
+  #defender action effects
+  B = apply_defender_action_batch(Parameters, States, action)
+
+  #attacker strategy determination
+  if attacker is not None:
+    target, intensity = attacker(Parameters, States, rng)
+  elif target is None:
+    target, intensity = sample_attacker_batch(Parameters, States, rng, u = u)
+
+  #attack resolution
+  p_success, attack_success = resolve_attack_batch(Parameters, States, rng, target, intensity)
+
+  #defender detection and containment step
+  it_detected, it_contained = detect_and_contain_batch(Parameters, States, rng, 'it_comp', B)
+  ot_detected, ot_contained = detect_and_contain_batch(Parameters, States, rng, 'ot_comp', B)
+
+  #damage step
+  ot_comp = States['ot_comp'] == 1
+  damage = Parameters['base_damage'] * np.where(intensity == Intensity.HIGH, Parameters['high_damage_multiplier'], 1.0)
+  damage_step = ot_comp * (damage * (1.0 - B['active_damage_reduction']))
+  States['phys_damage'] = np.maximum(0.0, States['phys_damage'] + damage_step)
+
+  #downtime
+  recover = action == Action.RECOVER
+  comp_present = (States['it_comp'] == 1) | ot_comp
+  downtime_step = Parameters['downtime_comp_cost'] * comp_present + Parameters['downtime_damage_cost'] * States['phys_damage']
+  dt = np.maximum(0.0, States['downtime'] + downtime_step - Parameters.get('downtime_decay', 0.0))
+  States['downtime'] = np.where(recover, np.maximum(0.0, dt * (1.0 - B['downtime_reduction_boost'])), dt)
+
+  #recovery action step
+  n = action.shape[0]
+  p_clear = clip01(Parameters['p_recover_clear_base'] + B['recover_clear_boost'])
+  it_cleared = recover & (States['it_comp'] == 1) & (rng.random(n) < p_clear)
+  ot_cleared = recover & (States['ot_comp'] == 1) & (rng.random(n) < p_clear)
+  States['it_comp'] = np.where(it_cleared, 0, States['it_comp'])
+  States['ot_comp'] = np.where(ot_cleared, 0, States['ot_comp'])
+
+  frac = clip01(Parameters.get('damage_recover_decay', 0.0))
+  States['phys_damage'] = np.where(recover, np.maximum(0.0, States['phys_damage'] * (1.0 - frac)), States['phys_damage'])
+
+  #damage persistence
+  States['phys_damage'] = np.maximum(0.0, States['phys_damage'] * Parameters.get('damage_persistence', 1.0))
+
+  #compromise state after recovery step
+  it_comp_end = States['it_comp'].copy()
+  ot_comp_end = States['ot_comp'].copy()
+
+  #system outage state at end of timestep
+  comp_present = (it_comp_end == 1) | (ot_comp_end == 1)
+  outage_status = (Parameters.get('outage_comp_cost', 0.40) * comp_present
+                   + Parameters.get('outage_damage_cost', 0.20) * States['phys_damage'])
+  States['outage'] = clip01((1.0 - Parameters.get('outage_decay', 0.60)) * States['outage'] + outage_status)
+
+  return {
+    'action': action,
+    'attack': target,
+    'intensity': intensity,
+    'p_success': p_success,
+    'attack_success': attack_success,
+    'it_detected': it_detected,
+    'it_contained': it_contained,
+    'ot_detected': ot_detected,
+    'ot_contained': ot_contained,
+    'damage_step': damage_step,
+    'downtime_step': downtime_step,
+    'recovery_it_cleared': it_cleared.astype(np.int64),
+    'recovery_ot_cleared': ot_cleared.astype(np.int64),
+    'it_comp_end': it_comp_end,
+    'ot_comp_end': ot_comp_end,
+    'phys_damage_next': States['phys_damage'],
+    'outage_status': outage_status,
+    'outage_next': States['outage'],
+  }
+
+
+def new_accumulator(Parameters, n, T, agent = None):
+  """Empty per-environment accumulator for run_batch (and other loops built on batch_step)"""
+  policy = Parameters.get('defender_policy', 'always_passive')
+  return {
+    'steps': int(T),
+    'reward': np.zeros(n),
+    'outage': np.zeros(n),
+    'damage_step': np.zeros(n),
+    'it_comp': np.zeros(n),
+    'ot_comp': np.zeros(n),
+    'action_counts': np.zeros((n, 3), dtype = np.int64),
+    'q_size': agent.n_visited() if policy in LEARNING_POLICIES else np.nan,
+  }
+
+def accumulate_step(acc, Parameters, action, out):
+  #adds one batch_step outcome to the accumulator
+  acc['outage'] += out['outage_next']
+  acc['damage_step'] += out['damage_step']
+  acc['it_comp'] += out['it_comp_end']
+  acc['ot_comp'] += out['ot_comp_end']
+  acc['action_counts'][np.arange(action.shape[0]), action] += 1
+
+  #rl_reward is only logged for learning policies in sim_step
+  if Parameters.get('defender_policy', 'always_passive') in LEARNING_POLICIES:
+    acc['reward'] += rl_step_reward_batch(Parameters, out['damage_step'], out['phys_damage_next'], out['outage_next'], out['it_comp_end'], out['ot_comp_end'], action)
+
+def run_batch(Parameters, States, rng, T = None, agent = None):
+  """
+  Runs T steps of every environment and accumulates the quantities summarize_run needs.
+  Only frozen agents are supported for qlearn_v1/linear_v1 (rl_learn is ignored, the agent is never updated).
+  Scheduled parameters take the same value in every environment at a given step.
+  Returns a dict of per-environment arrays: sums of the logged metrics plus action counts.
+  """
+  T = int(Parameters['T'] if T is None else T)
+  Parameters, compiled = scheduled_parameters(Parameters, T)
+  policy = Parameters.get('defender_policy', 'always_passive')
+  n = States['it_comp'].shape[0]
+
+  if policy in LEARNING_POLICIES and agent is None:
+    raise ValueError("Q-learning policy requires an agent instance")
+
+  acc = new_accumulator(Parameters, n, T, agent = agent)
+  defender = make_policy(Parameters, agent = agent)
+  for t in range(T):
+    apply_schedules(Parameters, compiled, t)
+    action = defender.decide_batch(States, rng)
+    out = batch_step(Parameters, States, rng, action)
+    accumulate_step(acc, Parameters, action, out)
+
+  return acc
+
+def summarize_batch(acc):
+  """Per-environment version of metrics.summarize_run, returns a dict of column name -> array"""
+  T = acc['steps']
+  out = {
+    'mean_reward': acc['reward'] / T,
+    'mean_outage': acc['outage'] / T,
+    'mean_damage_step': acc['damage_step'] / T,
+    'time_it_comp': acc['it_comp'] / T,
+    'time_ot_comp': acc['ot_comp'] / T,
+  }
+  for a in Action:
+    out['freq_' + a.name] = acc['action_counts'][:, int(a)] / T
+  out['q_size_end'] = np.full(acc['reward'].shape[0], acc['q_size'], dtype = float)
+  return out
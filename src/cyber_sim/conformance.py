@@ -0,0 +1,451 @@
+"""
+Golden-trace conformance checks for alternate engines.
+
+record_golden runs the reference run_sim for every golden policy on a set of parameter corners and stores
+1. the full trace of each case (exact replay reference)
+2. per-step outcomes of n_reps independent runs at a few check times (distributional reference)
+in a directory, together with the parameters and the frozen Q-table used by qlearn_v1. Engines are then checked
+against it:
+- check_exact(golden, engine): engine(Parameters, State, rng, agent) must give the same rows as run_sim, draw for
+  draw (e.g. other output schemas, scheduled-but-constant parameters, a faster scalar step)
+- check_distribution(golden, engine): engine(Parameters, agent, n_reps, T, seed) returns per-step outcomes
+  {column: (n_reps, T) array} that must match the reference in distribution (e.g. the batched engine). Every
+  column is tested across the independent runs at each check time (two-sample KS for continuous outcomes,
+  chi-square for discrete ones) and on its per-run time average (KS), with a Bonferroni correction per case.
+- check_summary(golden, engine): engine(Parameters, agent, n_reps, T, seed) returns per-run averages only
+  {column: (n_reps,) array} (e.g. skip-ahead, the fleet), tested against the golden per-run averages (KS)
+- check_replay(golden): record_run must rebuild exactly the run it recorded. record_run gives the policy its own
+  random stream, so its reference is a third golden trace, the run_sim loop on the same split streams.
+
+  golden = record_golden(apply_defaults(default_parameters()), 'golden/')
+  check_exact(load_golden('golden/'), EXACT_ENGINES['compact'])
+  check_distribution(load_golden('golden/'), batch_outcomes)
+  check_summary(load_golden('golden/'), SUMMARY_ENGINES['skipahead'])
+  check_replay(load_golden('golden/'))
+"""
+from .rl import QLearner
+from .sim import run_sim, sim_step
+from .state import make_initial_state
+from .batch import batch_parameters, make_initial_batch_state, batch_step
+from .policies import make_policy
+from .schema import full_frame
+from .schedules import Piecewise
+from .runlog import params_to_dict, record_run, RunRecord
+from .skipahead import run_skipahead
+from .fleet import run_fleet
+
+import json
+import math
+import os
+import numpy as np
+
+GOLDEN_POLICIES = ('always_passive', 'random', 'threshold_v1', 'qlearn_v1')
+
+#name -> parameter overrides, the corners of the parameter space the golden traces cover
+DEFAULT_CORNERS = {
+  'base': {},
+  'low_threat': {'p_attack': 0.05},
+  'high_threat': {'p_attack': 0.90, 'p_high_base': 0.8},
+  'no_governance': {'G': 0.0},
+  'full_governance': {'G': 1.0},
+  'compromised_start': {'it_comp_init': 1, 'ot_comp_init': 1, 'id_cap_init': 0.0, 'phys_damage_init': 0.5, 'outage_init': 0.5},
+}
+
+#per-step outcomes compared in distribution
+DISCRETE_OUTCOMES = ('action', 'attack', 'intensity', 'attack_success', 'it_comp_end', 'ot_comp_end')
+CONTINUOUS_OUTCOMES = ('damage_step', 'phys_damage_next', 'downtime_step', 'outage_next')
+
+#summarize_run metric -> outcome column it averages, compared by summary-level engines
+SUMMARY_OUTCOMES = {'mean_outage': 'outage_next', 'mean_damage_step': 'damage_step', 'time_it_comp': 'it_comp_end',
+                    'time_ot_comp': 'ot_comp_end'}
+
+
+#numpy-only test statistics
+def ks_2samp(x, y):
+  """Two-sample Kolmogorov-Smirnov statistic and asymptotic p-value"""
+  x, y = np.sort(np.asarray(x, dtype = float)), np.sort(np.asarray(y, dtype = float))
+  grid = np.concatenate([x, y])
+  d = float(np.max(np.abs(np.searchsorted(x, grid, side = 'right') / x.size - np.searchsorted(y, grid, side = 'right') / y.size)))
+  ne = x.size * y.size / (x.size + y.size)
+  lam = (math.sqrt(ne) + 0.12 + 0.11 / math.sqrt(ne)) * d
+  return d, kolmogorov_sf(lam)
+
+def kolmogorov_sf(lam):
+  #P(K > lam) for the Kolmogorov distribution, 2 sum (-1)^(k-1) exp(-2 k^2 lam^2)
+  if lam < 0.2:
+    return 1.0
+  k = np.arange(1, 101)
+  return float(min(max(2.0 * np.sum((-1.0) ** (k - 1) * np.exp(-2.0 * k ** 2 * lam ** 2)), 0.0), 1.0))
+
+def chi2_sf(x, df):
+  #upper tail of the chi-square distribution, regularized upper incomplete gamma Q(df / 2, x / 2)
+  a, x = 0.5 * df, 0.5 * x
+  if x <= 0:
+    return 1.0
+  log_pre = -x + a * math.log(x) - math.lgamma(a)
+  if x < a + 1.0:
+    #series for the lower tail
+    term = total = 1.0 / a
+    n = a
+    while abs(term) > abs(total) * 1e-15:
+      n += 1.0
+      term *= x / n
+      total += term
+    return max(0.0, 1.0 - total * math.exp(log_pre))
+  #continued fraction for the upper tail (modified Lentz)
+  b = x + 1.0 - a
+  c = 1.0 / 1e-300
+  d = 1.0 / b
+  h = d
+  for i in range(1, 1000):
+    an = -i * (i - a)
+    b += 2.0
+    d = an * d + b
+    d = 1e-300 if abs(d) < 1e-300 else d
+    c = b + an / c
+    c = 1e-300 if abs(c) < 1e-300 else c
+    d = 1.0 / d
+    h *= d * c
+    if abs(d * c - 1.0) < 1e-15:
+      break
+  return min(1.0, math.exp(log_pre) * h)
+
+def chi2_2samp(x, y, min_count = 10):
+  """
+  Chi-square homogeneity test of two samples of a discrete outcome, values seen fewer than min_count times in
+  total are pooled into one category. Returns (statistic, p-value), p = 1 when only one category is left.
+  """
+  values, inverse = np.unique(np.concatenate([x, y]), return_inverse = True)
+  counts = np.zeros((2, values.size))
+  np.add.at(counts[0], inverse[:len(x)], 1)
+  np.add.at(counts[1], inverse[len(x):], 1)
+  rare = counts.sum(axis = 0) < min_count
+  if rare.any():
+    counts = np.column_stack([counts[:, ~rare], counts[:, rare].sum(axis = 1)])
+    counts = counts[:, counts.sum(axis = 0) > 0]
+  if counts.shape[1] < 2:
+    return 0.0, 1.0
+  expected = counts.sum(axis = 1, keepdims = True) * counts.sum(axis = 0, keepdims = True) / counts.sum()
+  stat = float(((counts - expected) ** 2 / expected).sum())
+  return stat, chi2_sf(stat, counts.shape[1] - 1)
+
+
+#golden cases and engines
+def golden_agent(Parameters, seed = 0, steps = 3000):
+  """QLearner trained by the reference loop (deterministic for a seed), frozen by the golden qlearn_v1 cases"""
+  P = dict(Parameters)
+  P['defender_policy'], P['rl_learn'], P['T'] = 'qlearn_v1', 1, int(steps)
+  agent = QLearner(n_actions = 3)
+  run_sim(P, make_initial_state(P), np.random.default_rng(int(seed)), agent = agent, schema = 'rows')
+  return agent
+
+def agent_from_table(q, visited):
+  agent = QLearner(n_actions = 3)
+  agent.Q.values[:] = q
+  agent.Q.mark_visited(np.flatnonzero(visited))
+  return agent
+
+def case_parameters(Parameters, policy, corner, T):
+  P = dict(Parameters)
+  P.update(corner)
+  P['defender_policy'] = policy
+  P['T'] = int(T)
+  P['rl_learn'] = 0
+  return P
+
+def reference_outcomes(Parameters, agent, n_reps, T, seed):
+  """per-step outcomes of n_reps reference runs (seeds seed, seed + 1, ...), {column: (n_reps, T) array}"""
+  P = dict(Parameters)
+  P['T'] = int(T)
+  out = {c: np.empty((int(n_reps), int(T))) for c in DISCRETE_OUTCOMES + CONTINUOUS_OUTCOMES}
+  for i in range(int(n_reps)):
+    rows = run_sim(P, make_initial_state(P), np.random.default_rng(int(seed) + i), agent = agent, schema = 'rows')
+    for c in out:
+      out[c][i] = [r[c] for r in rows]
+  return out
+
+def replay_reference(Parameters, seed, agent = None):
+  """rows of the run_sim loop on record_run's streams (environment and policy streams spawned from seed)"""
+  P = dict(Parameters)
+  State = make_initial_state(P)
+  env_seed, policy_seed = np.random.SeedSequence(int(seed)).spawn(2)
+  rng, policy_rng = np.random.default_rng(env_seed), np.random.default_rng(policy_seed)
+  defender = make_policy(P, agent = agent)
+  rows = []
+  for t in range(int(P['T'])):
+    sim_step(P, State, rng, t, rows, agent = agent, policy_rng = policy_rng, defender = defender)
+  return rows
+
+def batch_outcomes(Parameters, agent, n_reps, T, seed):
+  """per-step outcomes of the batched engine (n_reps environments in one batch), same layout as reference_outcomes"""
+  PB = batch_parameters(Parameters)
+  SB = make_initial_batch_state(PB, int(n_reps))
+  rng = np.random.default_rng(int(seed))
+  defender = make_policy(PB, agent = agent)
+  out = {c: np.empty((int(n_reps), int(T))) for c in DISCRETE_OUTCOMES + CONTINUOUS_OUTCOMES}
+  for t in range(int(T)):
+    step = batch_step(PB, SB, rng, defender.decide_batch(SB, rng))
+    for c in out:
+      out[c][:, t] = step[c]
+  return out
+
+def _compact_engine(Parameters, State, rng, agent = None):
+  return full_frame(run_sim(Parameters, State, rng, agent = agent, schema = 'compact'))
+
+def _rows_engine(Parameters, State, rng, agent = None):
+  return run_sim(Parameters, State, rng, agent = agent, schema = 'rows')
+
+def _constant_schedule_engine(Parameters, State, rng, agent = None):
+  #every numeric parameter as a one-point schedule, exercises the scheduled code path
+  P = {k: Piecewise([(0, v)]) if isinstance(v, float) else v for k, v in Parameters.items()}
+  return run_sim(P, State, rng, agent = agent)
+
+def skipahead_summaries(Parameters, agent, n_reps, T, seed):
+  """per-run averages of n_reps run_skipahead runs of T steps (seeds seed, seed + 1, ...)"""
+  P = dict(Parameters)
+  P['T'] = int(T)
+  out = {c: np.empty(int(n_reps)) for c in SUMMARY_OUTCOMES.values()}
+  for i in range(int(n_reps)):
+    summary = run_skipahead(P, make_initial_state(P), np.random.default_rng(int(seed) + i), agent = agent)
+    for k, c in SUMMARY_OUTCOMES.items():
+      out[c][i] = summary[k]
+  return out
+
+def fleet_summaries(Parameters, agent, n_reps, T, seed):
+  """per-site averages of one uncorrelated fleet (rho = 0) of n_reps sites, each site is an independent run"""
+  sites, _ = run_fleet(Parameters, int(n_reps), np.random.default_rng(int(seed)), T = int(T), agent = agent, rho = 0.0)
+  return {c: sites[k].to_numpy() for k, c in SUMMARY_OUTCOMES.items()}
+
+#engines that must reproduce run_sim draw for draw
+EXACT_ENGINES = {
+  'run_sim': run_sim,
+  'compact': _compact_engine,
+  'rows': _rows_engine,
+  'constant_schedules': _constant_schedule_engine,
+}
+
+#engines that must match run_sim in distribution
+DISTRIBUTION_ENGINES = {
+  'batch': batch_outcomes,
+}
+
+#engines that report per-run averages only, which must match run_sim's in distribution
+SUMMARY_ENGINES = {
+  'skipahead': skipahead_summaries,
+  'fleet': fleet_summaries,
+}
+
+
+class GoldenCase:
+  """
+  One golden case: parameters, seed, the reference trace and the reference outcome samples
+  (samples[c] is (n_reps, len(times)), means[c] the (n_reps,) per-run averages over the dist_T steps), and the
+  replay reference (replay_reference, None for golden directories recorded without it)
+  """
+  def __init__(self, name, params, seed, trace, samples, means, times, dist_T, agent_table = None, replay_trace = None):
+    self.name = name
+    self.params = dict(params)
+    self.seed = int(seed)
+    self.trace = trace
+    self.samples = samples
+    self.means = means
+    self.times = np.asarray(times, dtype = np.int64)
+    self.dist_T = int(dist_T)
+    self.agent_table = agent_table
+    self.replay_trace = replay_trace
+
+  def agent(self):
+    return None if self.agent_table is None else agent_from_table(*self.agent_table)
+
+
+def record_golden(Parameters, path = None, corners = None, policies = GOLDEN_POLICIES, seed = 1, T = 300,
+                  n_reps = 200, dist_T = 60, n_times = 3, agent_steps = 3000):
+  """
+  Records the golden cases (one per policy and corner, corners default to DEFAULT_CORNERS) from the reference run_sim.
+  1. trace: the T-step run_sim log for seed
+  2. samples: outcomes of n_reps runs of dist_T steps at n_times check times spread over the run, and their
+     per-run averages
+  3. replay_trace: the T-step replay_reference log for seed
+  qlearn_v1 cases use golden_agent(Parameters) frozen (rl_learn = 0, rl_epsilon as given, so exploration is covered).
+  Writes the cases to path when given, returns the list of GoldenCase.
+  """
+  corners = DEFAULT_CORNERS if corners is None else corners
+  times = np.unique(np.linspace(0, int(dist_T) - 1, int(n_times) + 1)[1:].astype(np.int64))
+  agent = golden_agent(Parameters, steps = agent_steps) if 'qlearn_v1' in policies else None
+  table = (agent.q_array(), agent.Q.visited.copy()) if agent is not None else None
+
+  cases = []
+  for policy in policies:
+    for corner_name, corner in corners.items():
+      P = case_parameters(Parameters, policy, corner, T)
+      case_agent = agent_from_table(*table) if policy == 'qlearn_v1' else None
+      rows = run_sim(P, make_initial_state(P), np.random.default_rng(int(seed)), agent = case_agent, schema = 'rows')
+      trace = {c: np.asarray([r[c] for r in rows]) for c in rows[0]}
+      rows = replay_reference(P, seed, agent = agent_from_table(*table) if policy == 'qlearn_v1' else None)
+      replay_trace = {c: np.asarray([r[c] for r in rows]) for c in rows[0]}
+      out = reference_outcomes(P, case_agent, n_reps, dist_T, seed)
+      samples = {c: v[:, times] for c, v in out.items()}
+      means = {c: v.mean(axis = 1) for c, v in out.items()}
+      cases.append(GoldenCase(f"{policy}-{corner_name}", P, seed, trace, samples, means, times, dist_T,
+                              table if policy == 'qlearn_v1' else None, replay_trace))
+
+  if path is not None:
+    save_golden(cases, path)
+  return cases
+
+def save_golden(cases, path):
+  os.makedirs(path, exist_ok = True)
+  manifest = []
+  for case in cases:
+    np.savez_compressed(os.path.join(path, f"{case.name}.trace.npz"), **case.trace)
+    np.savez_compressed(os.path.join(path, f"{case.name}.samples.npz"), times = case.times, **case.samples)
+    np.savez_compressed(os.path.join(path, f"{case.name}.means.npz"), **case.means)
+    if case.replay_trace is not None:
+      np.savez_compressed(os.path.join(path, f"{case.name}.replay.npz"), **case.replay_trace)
+    entry = {'name': case.name, 'params': params_to_dict(case.params), 'seed': case.seed, 'dist_T': case.dist_T, 'agent': None}
+    if case.agent_table is not None:
+      entry['agent'] = f"{case.name}.agent.npz"
+      np.savez_compressed(os.path.join(path, entry['agent']), q = case.agent_table[0], visited = case.agent_table[1])
+    manifest.append(entry)
+  with open(os.path.join(path, 'manifest.json'), 'w') as f:
+    json.dump(manifest, f, indent = 1)
+
+def load_golden(path):
+  with open(os.path.join(path, 'manifest.json')) as f:
+    manifest = json.load(f)
+  cases = []
+  for entry in manifest:
+    with np.load(os.path.join(path, f"{entry['name']}.trace.npz")) as z:
+      trace = {c: z[c] for c in z.files}
+    with np.load(os.path.join(path, f"{entry['name']}.samples.npz")) as z:
+      samples = {c: z[c] for c in z.files if c != 'times'}
+      times = z['times']
+    with np.load(os.path.join(path, f"{entry['name']}.means.npz")) as z:
+      means = {c: z[c] for c in z.files}
+    table = None
+    if entry['agent'] is not None:
+      with np.load(os.path.join(path, entry['agent'])) as z:
+        table = (z['q'], z['visited'])
+    replay_trace = None
+    if os.path.exists(os.path.join(path, f"{entry['name']}.replay.npz")):
+      with np.load(os.path.join(path, f"{entry['name']}.replay.npz")) as z:
+        replay_trace = {c: z[c] for c in z.files}
+    cases.append(GoldenCase(entry['name'], entry['params'], entry['seed'], trace, samples, means, times, entry['dist_T'], table,
+                            replay_trace))
+  return cases
+
+
+#checks
+def compare_trace(trace, df, atol = 0.0):
+  """Columns of df that differ from (or are missing in) the reference trace, and the first differing step"""
+  mismatched, first_t = [], None
+  for c, ref in trace.items():
+    if c not in df.columns or len(df) != len(ref):
+      mismatched.append(c)
+      continue
+    got = df[c].to_numpy()
+    if ref.dtype.kind in 'fi':
+      same = np.isclose(got.astype(float), ref.astype(float), rtol = 0.0, atol = atol, equal_nan = True)
+    else:
+      same = got.astype(str) == ref.astype(str)
+    if not same.all():
+      mismatched.append(c)
+      t = int(np.argmin(same))
+      first_t = t if first_t is None else min(first_t, t)
+  return mismatched, first_t
+
+def check_exact(golden, engine, atol = 0.0):
+  """
+  Runs engine(Parameters, State, rng, agent) on every golden case with the golden seed and compares its rows
+  (DataFrame in either schema, or list of row dicts) with the golden trace, column by column.
+  Returns one dict per case: name, ok, steps, mismatched (columns that differ or are missing) and first_t
+  (first differing step).
+  """
+  import pandas as pd
+  report = []
+  for case in golden:
+    P = dict(case.params)
+    out = engine(P, make_initial_state(P), np.random.default_rng(case.seed), agent = case.agent())
+    df = pd.DataFrame(out) if isinstance(out, list) else full_frame(out)
+    mismatched, first_t = compare_trace(case.trace, df, atol = atol)
+    report.append({'name': case.name, 'ok': not mismatched, 'steps': len(df), 'mismatched': mismatched, 'first_t': first_t})
+  return pd.DataFrame(report)
+
+def check_distribution(golden, engine, alpha = 0.01, seed = 12345):
+  """
+  Runs engine(Parameters, agent, n_reps, T, seed) for every golden case and tests its outcomes against the golden
+  samples at each check time (KS for CONTINUOUS_OUTCOMES, chi-square for DISCRETE_OUTCOMES) and the per-run
+  averages of every column (KS, t = -1).
+  Returns (summary, tests): summary has one row per case (min p-value, number of tests, ok at family-wise level
+  alpha with a Bonferroni correction), tests one row per case, column and check time.
+  """
+  import pandas as pd
+  tests = []
+  for case in golden:
+    n_reps = next(iter(case.samples.values())).shape[0]
+    out = engine(dict(case.params), case.agent(), n_reps, case.dist_T, seed)
+    for c in DISCRETE_OUTCOMES + CONTINUOUS_OUTCOMES:
+      y = np.asarray(out[c], dtype = float)
+      for j, t in enumerate(case.times.tolist()):
+        stat, p = chi2_2samp(case.samples[c][:, j], y[:, t]) if c in DISCRETE_OUTCOMES else ks_2samp(case.samples[c][:, j], y[:, t])
+        tests.append({'name': case.name, 'column': c, 't': t, 'test': 'chi2' if c in DISCRETE_OUTCOMES else 'ks', 'stat': stat, 'p_value': p})
+      stat, p = ks_2samp(case.means[c], y.mean(axis = 1))
+      tests.append({'name': case.name, 'column': c, 't': -1, 'test': 'ks', 'stat': stat, 'p_value': p})
+
+  tests = pd.DataFrame(tests)
+  summary = tests.groupby('name', sort = False).agg(min_p = ('p_value', 'min'), n_tests = ('p_value', 'size')).reset_index()
+  summary['ok'] = summary['min_p'] >= alpha / summary['n_tests']
+  return summary, tests
+
+def check_summary(golden, engine, alpha = 0.01, seed = 12345):
+  """
+  Runs engine(Parameters, agent, n_reps, T, seed) for every golden case and tests the per-run averages it returns
+  against the golden ones (KS per column of SUMMARY_OUTCOMES the engine reports).
+  Cases the engine rejects with ValueError (e.g. skip-ahead needs a deterministic policy) are reported as skipped.
+  Returns (summary, tests) like check_distribution, summary also has skipped (the reason, '' when the case ran).
+  """
+  import pandas as pd
+  tests, skipped = [], {}
+  for case in golden:
+    n_reps = next(iter(case.means.values())).shape[0]
+    try:
+      out = engine(dict(case.params), case.agent(), n_reps, case.dist_T, seed)
+    except ValueError as e:
+      skipped[case.name] = str(e)
+      continue
+    for c in SUMMARY_OUTCOMES.values():
+      if c in out:
+        stat, p = ks_2samp(case.means[c], out[c])
+        tests.append({'name': case.name, 'column': c, 't': -1, 'test': 'ks', 'stat': stat, 'p_value': p})
+
+  tests = pd.DataFrame(tests, columns = ['name', 'column', 't', 'test', 'stat', 'p_value'])
+  summary = tests.groupby('name', sort = False).agg(min_p = ('p_value', 'min'), n_tests = ('p_value', 'size')).reset_index()
+  summary['ok'] = summary['min_p'] >= alpha / summary['n_tests']
+  summary['skipped'] = ''
+  rows = [{'name': name, 'min_p': np.nan, 'n_tests': 0, 'ok': True, 'skipped': reason} for name, reason in skipped.items()]
+  summary = pd.concat([summary, pd.DataFrame(rows, columns = summary.columns)], ignore_index = True) if rows else summary
+  return summary, tests
+
+def check_replay(golden, record = record_run, every = 25):
+  """
+  Records every golden case with record(Parameters, seed, agent, every = every) (default runlog.record_run), round
+  trips the record through its json form and checks that the rebuilt rows match the golden replay trace exactly,
+  for the whole run and for a range starting between the last checkpoint and the end of the run.
+  Returns one dict per case like check_exact.
+  """
+  import pandas as pd
+  report = []
+  for case in golden:
+    if case.replay_trace is None:
+      raise ValueError(f"golden case {case.name} has no replay trace, record the golden directory again")
+    rec = record(dict(case.params), case.seed, agent = case.agent(), every = every)
+    rec = RunRecord.from_dict(json.loads(json.dumps(rec.to_dict())))
+
+    mismatched, first_t = compare_trace(case.replay_trace, rec.rows())
+    #a range starting after the last checkpoint, rebuilt from that checkpoint and not from the start of the run
+    last = rec.checkpoints[-1][0]
+    start, stop = last + min(rec.every, rec.T - last) // 2, rec.T
+    part, _ = compare_trace({c: v[start:stop] for c, v in case.replay_trace.items()}, rec.rows(start, stop))
+    mismatched += [f"{c}[{start}:{stop}]" for c in part]
+    report.append({'name': case.name, 'ok': not mismatched, 'steps': rec.T, 'mismatched': mismatched, 'first_t': first_t})
+  return pd.DataFrame(report)
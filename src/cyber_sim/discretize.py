@@ -0,0 +1,86 @@
+from bisect import bisect_right
+
+import numpy as np
+
+#continuous state variables and the range used by uniform_discretizer when none is given
+#(downtime is an unbounded stock, 5.0 covers what long runs under the default parameters reach)
+DEFAULT_RANGES = {
+  'it_vuln': (0.0, 1.0),
+  'ot_vuln': (0.0, 1.0),
+  'id_cap': (0.0, 1.0),
+  'downtime': (0.0, 5.0),
+  'phys_damage': (0.0, 1.0),
+  'outage': (0.0, 1.0),
+}
+
+
+class Discretizer:
+  """
+  Maps a state to a single integer index for tabular learning.
+  edges is a dict of state variable -> increasing bin edges, a variable with m edges gets m + 1 bins
+  (bin = number of edges <= x, the same convention as rl_bin and np.digitize). The per-variable bins are
+  packed in mixed radix with the last variable varying fastest, so n_states = prod(len(edges) + 1).
+  Variables not listed are ignored.
+  """
+  def __init__(self, edges):
+    self.names = tuple(edges)
+    self.edges = {}
+    for k in self.names:
+      e = np.asarray(edges[k], dtype = float).ravel()
+      if e.size > 1 and np.any(np.diff(e) <= 0):
+        raise ValueError(f"bin edges for {k} must be strictly increasing")
+      self.edges[k] = e
+
+    self.shape = tuple(self.edges[k].size + 1 for k in self.names)
+    self.n_states = int(np.prod(self.shape, dtype = object))
+    strides = np.cumprod((1,) + self.shape[:0:-1], dtype = object)[::-1]
+    self.strides = tuple(int(x) for x in strides)
+
+    #plain python lists for the scalar path, bisect is much faster than numpy on single values
+    self._edge_lists = [self.edges[k].tolist() for k in self.names]
+
+  def bins(self, State):
+    return tuple(bisect_right(e, float(State[k])) for k, e in zip(self.names, self._edge_lists))
+
+  def index(self, State):
+    i = 0
+    for k, e, stride in zip(self.names, self._edge_lists, self.strides):
+      i += bisect_right(e, float(State[k])) * stride
+    return i
+
+  def index_batch(self, States):
+    i = np.zeros(np.shape(States[self.names[0]]), dtype = np.int64)
+    for k, stride in zip(self.names, self.strides):
+      i += np.digitize(States[k], self.edges[k]) * stride
+    return i
+
+  def unindex(self, i):
+    #inverse of index, returns the tuple of per-variable bins
+    out = []
+    for size, stride in zip(self.shape, self.strides):
+      out.append((int(i) // stride) % size)
+    return tuple(out)
+
+
+def default_discretizer(Parameters):
+  """The original 108 state discretization (it_comp, ot_comp, id_cap, phys_damage, outage) from the rl_* thresholds"""
+  return Discretizer({
+    'it_comp': [0.5],
+    'ot_comp': [0.5],
+    'id_cap': [float(Parameters['rl_id_cap_lo']), float(Parameters['rl_id_cap_high'])],
+    'phys_damage': [float(Parameters['rl_damage_lo']), float(Parameters['rl_damage_high'])],
+    'outage': [float(Parameters['rl_outage_lo']), float(Parameters['rl_outage_high'])],
+  })
+
+def uniform_discretizer(bins, ranges = None, flags = True):
+  """
+  Equal width bins, e.g. uniform_discretizer({'it_vuln': 10, 'ot_vuln': 10, 'outage': 20}).
+  bins maps variable -> number of bins, ranges optionally overrides DEFAULT_RANGES.
+  flags = True also splits on it_comp and ot_comp (placed first, like the default discretization).
+  """
+  ranges = dict(DEFAULT_RANGES, **(ranges or {}))
+  edges = {'it_comp': [0.5], 'ot_comp': [0.5]} if flags else {}
+  for k, n in bins.items():
+    lo, hi = ranges[k]
+    edges[k] = np.linspace(lo, hi, int(n) + 1)[1:-1]
+  return Discretizer(edges)
@@ -0,0 +1,293 @@
+"""
+Gaussian-process emulator of summarize_run metrics over parameter space.
+
+Trained on sweep results (the tables of sensitivity_curve / evaluate_design, or any DataFrame or dict with one column
+per parameter and per metric), it predicts every metric with a standard deviation at arbitrary parameter points
+without simulating. Each metric gets its own GP:
+1. inputs scaled to the unit cube of bounds, outputs standardized
+2. constant mean, ARD squared-exponential kernel plus a noise term for the simulation noise
+3. hyperparameters (length scales, signal and noise variance) fitted by maximizing the log marginal likelihood,
+   Adam on the log hyperparameters with analytic gradients
+Prediction is a kernel row times precomputed weights and the variance a product with the inverse Cholesky factor,
+so a batch of points costs a few microseconds per point.
+
+suggest() picks the next points to simulate: greedy maximum posterior variance over random candidates, summed over
+the metrics as a fraction of each metric's prior variance. The GP variance does not depend on the observed values,
+so every pick is conditioned exactly on the previous ones and a batch spreads out instead of piling up in one spot.
+active_learning() runs the loop (simulate, fit, suggest) from a Latin hypercube start.
+
+  em = GPEmulator(bounds).fit(sensitivity_curve(P, grid, policy = 'threshold_v1'))
+  em.predict({'G': 0.45, 'p_attack': 0.3, 'k_deterrence': 1.5})
+  next_points = em.suggest(16)
+"""
+from .accumulators import METRICS
+from .sensitivity import sensitivity_curve
+from .global_sensitivity import evaluate_design
+
+import numpy as np
+import pandas as pd
+
+#log hyperparameter ranges: length scales on the unit cube, signal and noise variance of the standardized output
+LOG_LENGTH = (np.log(0.02), np.log(20.0))
+LOG_SIGNAL = (np.log(1e-3), np.log(1e2))
+LOG_NOISE = (np.log(1e-8), np.log(1.0))
+
+
+def latin_hypercube(n, k, rng):
+  #one point in every 1/n slice of every axis, in the unit cube
+  return (np.argsort(rng.random((k, n)), axis = 1).T + rng.random((n, k))) / n
+
+def _scaled_sq(A, B, ls):
+  #per-dimension squared differences scaled by the length scales, shape (k, len(A), len(B))
+  return ((A.T[:, :, None] - B.T[:, None, :]) / ls[:, None, None]) ** 2
+
+
+class GaussianProcess:
+  """Single-output GP regression on unit-cube inputs, see the module docstring"""
+  def __init__(self, X, y, theta = None, iters = 200, lr = 0.05):
+    self.X = np.asarray(X, dtype = float)
+    y = np.asarray(y, dtype = float)
+    n, k = self.X.shape
+    self.mu = float(y.mean())
+    self.sd = float(y.std()) if y.std() > 0 else 1.0
+    self.z = (y - self.mu) / self.sd
+    #constant outputs (e.g. mean_reward of a fixed policy) need no fit
+    self.constant = not y.std() > 0
+    #theta = log length scales (k), log signal variance, log noise variance
+    self.theta = np.concatenate([np.full(k, np.log(0.5)), [0.0, np.log(0.1)]]) if theta is None else np.array(theta, dtype = float)
+    self.lml = np.nan
+    if not self.constant:
+      self._optimize(int(iters), float(lr))
+    self._cache()
+
+  def _unpack(self, theta):
+    k = self.X.shape[1]
+    return np.exp(theta[:k]), np.exp(theta[k]), np.exp(theta[k + 1])
+
+  def _factor(self, theta):
+    #(K_f, D, Linv) of the training inputs, D holds the scaled squared differences per dimension
+    ls, s2, noise = self._unpack(theta)
+    D = _scaled_sq(self.X, self.X, ls)
+    Kf = s2 * np.exp(-0.5 * D.sum(axis = 0))
+    K = Kf + noise * np.eye(Kf.shape[0])
+    jitter = 1e-10
+    while True:
+      try:
+        L = np.linalg.cholesky(K + jitter * np.eye(K.shape[0]))
+        break
+      except np.linalg.LinAlgError:
+        jitter *= 10.0
+    return Kf, D, np.linalg.inv(L)
+
+  def log_marginal_likelihood(self, theta):
+    """(log marginal likelihood, gradient wrt theta)"""
+    Kf, D, Linv = self._factor(theta)
+    noise = self._unpack(theta)[2]
+    Kinv = Linv.T @ Linv
+    alpha = Kinv @ self.z
+    n = self.z.shape[0]
+    lml = -0.5 * self.z @ alpha + np.log(np.diag(Linv)).sum() - 0.5 * n * np.log(2.0 * np.pi)
+
+    #d lml / d theta_i = 0.5 tr((alpha alpha^T - K^-1) dK / d theta_i)
+    A = np.outer(alpha, alpha) - Kinv
+    AK = A * Kf
+    grad = np.concatenate([0.5 * (AK[None, :, :] * D).sum(axis = (1, 2)), [0.5 * AK.sum(), 0.5 * noise * np.trace(A)]])
+    return float(lml), grad
+
+  def _optimize(self, iters, lr):
+    k = self.X.shape[1]
+    lo = np.array([LOG_LENGTH[0]] * k + [LOG_SIGNAL[0], LOG_NOISE[0]])
+    hi = np.array([LOG_LENGTH[1]] * k + [LOG_SIGNAL[1], LOG_NOISE[1]])
+    theta = np.clip(self.theta, lo, hi)
+    m, v = np.zeros_like(theta), np.zeros_like(theta)
+    best, best_theta = -np.inf, theta.copy()
+    for it in range(1, iters + 1):
+      lml, g = self.log_marginal_likelihood(theta)
+      if lml > best:
+        best, best_theta = lml, theta.copy()
+      #Adam ascent step
+      m = 0.9 * m + 0.1 * g
+      v = 0.999 * v + 0.001 * g ** 2
+      theta = np.clip(theta + lr * (m / (1 - 0.9 ** it)) / (np.sqrt(v / (1 - 0.999 ** it)) + 1e-8), lo, hi)
+    self.theta, self.lml = best_theta, best
+
+  def _cache(self):
+    self.ls, self.s2, self.noise = self._unpack(self.theta)
+    if self.constant:
+      self.alpha = np.zeros(self.X.shape[0])
+      self.Linv = np.zeros((self.X.shape[0], self.X.shape[0]))
+      return
+    _, _, self.Linv = self._factor(self.theta)
+    self.alpha = self.Linv.T @ (self.Linv @ self.z)
+    self.LinvT = np.ascontiguousarray(self.Linv.T)
+    #scaled training inputs and their squared norms for the prediction kernel
+    self.Xs = self.X / self.ls
+    self.xx = (self.Xs ** 2).sum(axis = 1)
+
+  def kernel(self, A, B):
+    return self.s2 * np.exp(-0.5 * _scaled_sq(A, B, self.ls).sum(axis = 0))
+
+  def kernel_train(self, U):
+    #kernel(U, X) through |u|^2 + |x|^2 - 2 u.x, a handful of numpy calls whatever the dimension
+    Us = U / self.ls
+    d2 = (Us ** 2).sum(axis = 1)[:, None] + self.xx[None, :] - 2.0 * (Us @ self.Xs.T)
+    return self.s2 * np.exp(-0.5 * np.maximum(d2, 0.0))
+
+  def predict(self, U, noise = False):
+    """(mean, std) at the unit-cube points U, std of the latent mean or, with noise = True, of a new simulated run"""
+    if self.constant:
+      return np.full(U.shape[0], self.mu), np.zeros(U.shape[0])
+    Ks = self.kernel_train(U)
+    V = Ks @ self.LinvT
+    var = np.maximum(self.s2 - (V ** 2).sum(axis = 1), 0.0) + (self.noise if noise else 0.0)
+    return self.mu + self.sd * (Ks @ self.alpha), self.sd * np.sqrt(var)
+
+
+class GPEmulator:
+  """
+  One GaussianProcess per metric over the parameters of bounds (name -> (lo, hi), e.g. default_bounds).
+  metrics defaults to the summarize_run metrics (accumulators.METRICS).
+  """
+  def __init__(self, bounds, metrics = None, iters = 200, lr = 0.05):
+    self.bounds = dict(bounds)
+    self.names = list(self.bounds)
+    self.lo = np.array([b[0] for b in self.bounds.values()], dtype = float)
+    self.hi = np.array([b[1] for b in self.bounds.values()], dtype = float)
+    self.metrics = list(METRICS) if metrics is None else list(metrics)
+    self.iters = int(iters)
+    self.lr = float(lr)
+    self.models = {}
+    self.table = None
+
+  def to_unit(self, points):
+    """Unit-cube array (n, k) of points: dict / DataFrame with a column per parameter, or an array in bounds order"""
+    if hasattr(points, 'keys'):
+      X = np.column_stack([np.atleast_1d(np.asarray(points[k], dtype = float)) for k in self.names])
+    else:
+      X = np.asarray(points, dtype = float).reshape(-1, len(self.names))
+    return (X - self.lo) / (self.hi - self.lo)
+
+  def from_unit(self, U):
+    return self.lo + U * (self.hi - self.lo)
+
+  def fit(self, table, warm_start = True):
+    """
+    Fits every metric's GP on table (columns for the parameters and the metrics), returns self.
+    warm_start starts the hyperparameter search from the previous fit, if any.
+    """
+    U = self.to_unit(table)
+    self.table = {k: np.asarray(table[k], dtype = float) for k in self.names + self.metrics}
+    for m in self.metrics:
+      prev = self.models.get(m) if warm_start else None
+      self.models[m] = GaussianProcess(U, self.table[m], theta = None if prev is None else prev.theta, iters = self.iters, lr = self.lr)
+    self._stack()
+    return self
+
+  def _stack(self):
+    #the fitted GPs stacked along a leading metric axis, so predict_array costs the same few numpy calls for any metric count
+    self._fitted = [j for j, m in enumerate(self.metrics) if not self.models[m].constant]
+    gps = [self.models[self.metrics[j]] for j in self._fitted]
+    self._mu_all = np.array([self.models[m].mu for m in self.metrics])
+    if not gps:
+      return
+    self._inv_ls = np.stack([1.0 / gp.ls for gp in gps])
+    self._XsT = np.stack([gp.Xs.T for gp in gps])
+    self._xx = np.stack([gp.xx for gp in gps])
+    self._alpha = np.stack([gp.alpha for gp in gps])[:, :, None]
+    self._LinvT = np.stack([gp.LinvT for gp in gps])
+    self._s2 = np.array([gp.s2 for gp in gps])[:, None]
+    self._noise = np.array([gp.noise for gp in gps])[:, None]
+    self._mu = np.array([gp.mu for gp in gps])[:, None]
+    self._sd = np.array([gp.sd for gp in gps])[:, None]
+
+  def add(self, table):
+    """Refits on the previous training table plus table"""
+    both = {k: np.concatenate([self.table[k], np.asarray(table[k], dtype = float)]) for k in self.table}
+    return self.fit(both)
+
+  def predict_array(self, U, noise = False):
+    """Fast path on unit-cube points U (n, k): (mean, std) arrays of shape (n, len(metrics))"""
+    U = np.asarray(U, dtype = float).reshape(-1, len(self.names))
+    mean = np.tile(self._mu_all, (U.shape[0], 1))
+    std = np.zeros_like(mean)
+    if self._fitted:
+      #same computation as GaussianProcess.predict, with a leading metric axis
+      Us = U[None, :, :] * self._inv_ls[:, None, :]
+      d2 = (Us ** 2).sum(axis = 2)[:, :, None] + self._xx[:, None, :] - 2.0 * (Us @ self._XsT)
+      Ks = self._s2[:, :, None] * np.exp(-0.5 * np.maximum(d2, 0.0))
+      var = np.maximum(self._s2 - ((Ks @ self._LinvT) ** 2).sum(axis = 2), 0.0) + (self._noise if noise else 0.0)
+      mean[:, self._fitted] = (self._mu + self._sd * (Ks @ self._alpha)[:, :, 0]).T
+      std[:, self._fitted] = (self._sd * np.sqrt(var)).T
+    return mean, std
+
+  def predict(self, points, noise = False):
+    """DataFrame with the points, every metric's prediction and its std (column metric + '_std')"""
+    U = self.to_unit(points)
+    mean, std = self.predict_array(U, noise = noise)
+    df = pd.DataFrame(self.from_unit(U), columns = self.names)
+    for j, m in enumerate(self.metrics):
+      df[m] = mean[:, j]
+      df[m + '_std'] = std[:, j]
+    return df
+
+  def length_scales(self):
+    """DataFrame (metric x parameter) of the fitted length scales on the unit cube, short scales = strong effects"""
+    return pd.DataFrame({m: self.models[m].ls for m in self.metrics}, index = self.names).T
+
+  def suggest(self, n, candidates = 2000, metrics = None, rng = None):
+    """
+    n points to simulate next, greedy maximum posterior variance over random candidate points.
+    1. score every candidate by the sum over metrics of posterior variance / prior variance
+    2. take the best one and condition every GP on it (a rank one update of the candidate variances)
+    3. repeat n times
+    Returns a DataFrame of the points (parameter values) with their score when picked.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    metrics = self.metrics if metrics is None else list(metrics)
+    C = rng.random((int(candidates), len(self.names))) if np.ndim(candidates) == 0 else self.to_unit(candidates)
+    gps = [self.models[m] for m in metrics if not self.models[m].constant]
+
+    #per GP: candidate rows V = k(C, X) Linv^T, current posterior variances, and rank one factors of the picks
+    V = [gp.kernel_train(C) @ gp.LinvT for gp in gps]
+    var = [np.maximum(gp.s2 - (Vg ** 2).sum(axis = 1), 0.0) for gp, Vg in zip(gps, V)]
+    W = [[] for _ in gps]
+    picks, scores = [], []
+    for _ in range(int(n)):
+      score = sum(v / gp.s2 for gp, v in zip(gps, var)) if gps else np.zeros(C.shape[0])
+      j = int(np.argmax(score))
+      picks.append(j)
+      scores.append(float(score[j]))
+      for g, gp in enumerate(gps):
+        cov = gp.kernel(C, C[j:j + 1])[:, 0] - V[g] @ V[g][j]
+        for w in W[g]:
+          cov -= w * w[j]
+        w = cov / np.sqrt(max(cov[j], 0.0) + gp.noise)
+        W[g].append(w)
+        var[g] = np.maximum(var[g] - w ** 2, 0.0)
+
+    df = pd.DataFrame(self.from_unit(C[picks]), columns = self.names)
+    df['score'] = scores
+    return df
+
+
+def active_learning(Parameters, bounds, n_init = 20, rounds = 5, batch = 8, metrics = None, candidates = 2000,
+                    policy = None, agent = None, T = None, seed = 123, reps = 1, iters = 200):
+  """
+  Builds an emulator with as few simulations as possible.
+  1. simulate a Latin hypercube of n_init points (evaluate_design)
+  2. fit the emulator, simulate its batch suggested points (sensitivity_curve), refit, for rounds rounds
+  Returns (emulator, table of every simulated point with its round).
+  """
+  rng = np.random.default_rng(int(seed))
+  table = evaluate_design(Parameters, latin_hypercube(int(n_init), len(bounds), rng), bounds, policy = policy,
+                          agent = agent, T = T, seed = seed, reps = reps)
+  table['round'] = 0
+  em = GPEmulator(bounds, metrics = metrics, iters = iters).fit(table)
+  for r in range(1, int(rounds) + 1):
+    pts = em.suggest(batch, candidates = candidates, rng = rng)
+    new = sensitivity_curve(Parameters, {k: pts[k].to_numpy() for k in em.names}, policy = policy, agent = agent, T = T,
+                            seed = int(seed) + r, reps = reps)
+    new['round'] = r
+    table = pd.concat([table, new], ignore_index = True)
+    em.fit(table)
+  return em, table
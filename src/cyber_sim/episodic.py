@@ -0,0 +1,171 @@
+"""
+Episodic Q-learning with randomized initial states (exploring starts).
+
+The standard training run is one long trajectory from make_initial_state, which rarely reaches compromised or
+high damage states. Here many short episodes are run side by side with the batched engine (batch.py), each one
+starting from a state sampled from a configurable distribution, and all transitions update the same QLearner table.
+"""
+from .enums import Action
+from .schedules import check_stationary
+from .batch import STATE_KEYS, FLAG_KEYS, batch_parameters, batch_step
+from .policies import make_policy
+from .rl import N_STATES, QLearner, discretize_state_batch, learning_rates, rl_step_reward_batch
+from .discretize import default_discretizer
+from .qtable import DENSE_LIMIT
+
+import numpy as np
+import pandas as pd
+
+
+def exploring_starts_spec():
+  """
+  Default initial state distribution, covers every discretized state with positive probability.
+  Each entry is one of:
+  - a number (constant)
+  - ('uniform', lo, hi)
+  - ('bernoulli', p)
+  - ('choice', values, probs)
+  - a callable f(rng, n) returning n values
+  - an array of n values (one per environment)
+  """
+  return {
+    'it_vuln': ('uniform', 0.0, 1.0),
+    'ot_vuln': ('uniform', 0.0, 1.0),
+    'id_cap': ('uniform', 0.0, 1.0),
+    'it_comp': ('bernoulli', 0.5),
+    'ot_comp': ('bernoulli', 0.5),
+    'downtime': ('uniform', 0.0, 2.0),
+    'phys_damage': ('uniform', 0.0, 1.0),
+    'outage': ('uniform', 0.0, 1.0),
+  }
+
+def sample_initial_states(Parameters, spec, n, rng):
+  """Samples n initial states (batched state dict), variables missing from spec start at their *_init parameter"""
+  S = {}
+  for k in STATE_KEYS:
+    d = spec.get(k, Parameters[k + '_init'])
+
+    if callable(d):
+      v = np.asarray(d(rng, n), dtype = float)
+    elif isinstance(d, tuple) and d[0] == 'uniform':
+      v = rng.uniform(d[1], d[2], size = n)
+    elif isinstance(d, tuple) and d[0] == 'bernoulli':
+      v = (rng.random(n) < d[1]).astype(float)
+    elif isinstance(d, tuple) and d[0] == 'choice':
+      v = rng.choice(np.asarray(d[1], dtype = float), size = n, p = d[2] if len(d) > 2 else None)
+    elif isinstance(d, tuple):
+      raise ValueError(f"Unknown initial state distribution for {k}: {d[0]}")
+    elif np.ndim(d) > 0:
+      v = np.broadcast_to(np.asarray(d, dtype = float), (n,)).copy()
+    else:
+      v = np.full(n, float(d))
+
+    if k in FLAG_KEYS:
+      S[k] = (v >= 0.5).astype(np.int64)
+    elif k in ('it_vuln', 'ot_vuln', 'id_cap', 'outage'):
+      S[k] = np.clip(v, 0.0, 1.0)
+    else:
+      S[k] = np.maximum(v, 0.0)
+  return S
+
+
+def train_episodic(Parameters, agent, n_episodes, episode_len = 50, spec = None, n_envs = 256, seed = 1, exploring_starts = True):
+  """
+  Trains agent (QLearner or LinearQLearner) on n_episodes short episodes of episode_len steps.
+  1. n_envs episodes run in lockstep, each batch starts from states drawn with sample_initial_states(spec)
+  2. actions are epsilon-greedy w.r.t. the live table (rl_epsilon, decayed by rl_epsilon_decay), with exploring_starts the first action of every episode is uniform random
+  3. every step's transitions are counted and applied with agent.update_batch at learning_rates step sizes (episodes are truncated, not terminal, so targets still bootstrap)
+  Returns a dict with the number of steps simulated and the per-state / per-(state, action) visit counts,
+  states are counted on the agent's discretization (the default 108 states for a LinearQLearner).
+  """
+  check_stationary(Parameters, "episodic training")
+  P = Parameters.copy()
+  P['defender_policy'] = 'qlearn_v1' if isinstance(agent, QLearner) else 'linear_v1'
+  PB = batch_parameters(P)
+  spec = exploring_starts_spec() if spec is None else spec
+  rng = np.random.default_rng(int(seed))
+
+  alpha = float(P['rl_alpha'])
+  gamma = float(P['rl_gamma'])
+  #visit counts are a dense (n_states, n_actions) array when that is small enough, else a dict of flat index -> count
+  discretizer = getattr(agent, 'discretizer', None)
+  n_states = N_STATES if discretizer is None else discretizer.n_states
+  n_sa = n_states * agent.n_actions
+  sa_visits = np.zeros((n_states, agent.n_actions), dtype = np.int64) if n_sa <= DENSE_LIMIT else {}
+  steps = 0
+  defender = make_policy(PB, agent = agent)
+
+  remaining = int(n_episodes)
+  while remaining > 0:
+    n = min(int(n_envs), remaining)
+    SB = sample_initial_states(PB, spec, n, rng)
+
+    for k in range(int(episode_len)):
+      s = agent.encode_batch(PB, SB)
+      visited = discretize_state_batch(PB, SB, discretizer)
+      if exploring_starts and k == 0:
+        action = rng.integers(0, agent.n_actions, size = n)
+      else:
+        action = defender.decide_batch(SB, rng)
+
+      out = batch_step(PB, SB, rng, action)
+      r = rl_step_reward_batch(PB, out['damage_step'], out['phys_damage_next'], out['outage_next'], out['it_comp_end'], out['ot_comp_end'], action)
+      s_next = agent.encode_batch(PB, SB)
+
+      agent.update_batch(s, action, r, s_next, alpha = learning_rates(P, agent, s, action), gamma = gamma)
+      if getattr(agent, 'replay', None) is not None:
+        agent.replay.add_batch(s, action, r, s_next)
+        agent.replay_update(int(P.get('rl_replay_batch', 32)), int(P.get('rl_replay_updates', 1)), alpha, gamma)
+      count_visits(sa_visits, visited * agent.n_actions + action)
+
+    steps += n * int(episode_len)
+    remaining -= n
+
+  return coverage_report(sa_visits, n_states, agent.n_actions, steps)
+
+def count_visits(sa_visits, flat):
+  #flat = s * n_actions + a
+  flat, k = np.unique(flat, return_counts = True)
+  if isinstance(sa_visits, np.ndarray):
+    sa_visits.reshape(-1)[flat] += k
+  else:
+    for f, c in zip(flat.tolist(), k.tolist()):
+      sa_visits[f] = sa_visits.get(f, 0) + c
+
+def coverage_report(sa_visits, n_states, n_actions, steps = None):
+  """Summarizes (state, action) visit counts: coverage fractions plus per-state counts (dense counts only)"""
+  if isinstance(sa_visits, np.ndarray):
+    state_visits = sa_visits.sum(axis = 1)
+    n_seen, n_sa_seen = int(np.count_nonzero(state_visits)), int(np.count_nonzero(sa_visits))
+  else:
+    state_visits = None
+    n_seen, n_sa_seen = len({f // n_actions for f in sa_visits}), len(sa_visits)
+
+  return {
+    'steps': steps,
+    'state_visits': state_visits,
+    'sa_visits': sa_visits,
+    'state_coverage': n_seen / n_states,
+    'sa_coverage': n_sa_seen / (n_states * n_actions),
+  }
+
+def coverage_table(sa_visits, discretizer = None, Parameters = None):
+  """
+  Visit counts of the visited states as a DataFrame indexed by the per-variable bins.
+  discretizer is the agent's discretizer, None means the default one (Parameters are then needed for its thresholds).
+  """
+  if discretizer is None:
+    discretizer = default_discretizer(Parameters)
+
+  if isinstance(sa_visits, np.ndarray):
+    seen = np.flatnonzero(sa_visits.sum(axis = 1))
+    counts = sa_visits[seen]
+  else:
+    n_actions = len(Action)
+    seen = sorted({f // n_actions for f in sa_visits})
+    counts = np.array([[sa_visits.get(s * n_actions + a, 0) for a in range(n_actions)] for s in seen], dtype = np.int64).reshape(-1, n_actions)
+
+  index = pd.MultiIndex.from_tuples([discretizer.unindex(i) for i in seen], names = [k + '_bin' for k in discretizer.names])
+  df = pd.DataFrame(counts, index = index, columns = [a.name for a in Action][:counts.shape[1]])
+  df['total'] = df.sum(axis = 1)
+  return df
@@ -0,0 +1,204 @@
+"""
+Global sensitivity analysis of summarize_run outputs with respect to model parameters.
+
+Two methods are provided:
+1. Morris screening (elementary effects), r trajectories of k+1 runs each, cheap ranking of which parameters matter
+2. Sobol indices with the Saltelli design, n * (k + 2) runs, first order (S1) and total (ST) indices
+
+Both designs are simulated through sensitivity_curve, so every design point runs in the same batched pass.
+Bootstrap confidence intervals re-use the simulated outputs, no extra runs are needed for them.
+
+The model is stochastic, so every output carries simulation noise. By default (crn = True) the points compared by
+an index (the A, B and AB_i rows of one base sample, the points of one Morris trajectory) run on common random
+numbers, so the differences behind ST and the elementary effects measure the parameters rather than independent
+noise. This is a variance reduction, not an exact cancellation: once paths diverge (e.g. one run gets
+compromised and the other not) they consume their draws differently, and what is left still inflates ST and
+sigma. Short runs make it worse, raise T or reps until the CIs are narrow enough.
+"""
+from .sensitivity import sensitivity_curve
+
+import numpy as np
+import pandas as pd
+
+#parameters that are not model inputs (simulation control, rl hyperparameters, initial compromise flags)
+EXCLUDED_PARAMETERS = ('T', 'Seed', 'it_comp_init', 'ot_comp_init', 'rl_learn')
+#rl_* tune the learning defender, adv_* the learning attacker (adversary.py), neither moves the fixed attacker model
+EXCLUDED_PREFIXES = ('rl_', 'adv_')
+
+
+def default_bounds(Parameters, names = None, rel = 0.5):
+  """
+  Placeholder ranges of +/- rel around the current value of each parameter.
+  Probabilities and [0,1] state values are kept inside [0,1].
+  """
+  if names is None:
+    names = [k for k, v in Parameters.items()
+             if not isinstance(v, str) and k not in EXCLUDED_PARAMETERS and not k.startswith(EXCLUDED_PREFIXES)]
+
+  bounds = {}
+  for k in names:
+    v = float(Parameters[k])
+    lo, hi = v * (1.0 - rel), v * (1.0 + rel)
+    if v == 0.0:
+      lo, hi = 0.0, rel
+    if 0.0 <= v <= 1.0:
+      lo, hi = max(lo, 0.0), min(hi, 1.0)
+    bounds[k] = (lo, hi)
+  return bounds
+
+def scale_design(X, bounds):
+  #map unit-cube design points onto the parameter ranges
+  lo = np.array([b[0] for b in bounds.values()], dtype = float)
+  hi = np.array([b[1] for b in bounds.values()], dtype = float)
+  return lo + X * (hi - lo)
+
+def evaluate_design(Parameters, X, bounds, policy = None, agent = None, T = None, seed = 123, reps = 1, common = None):
+  """
+  Runs every row of the unit-cube design X (scaled by bounds) in one batched pass, returns the summary table.
+  Rows with the same common id (one per row, None = independent rows) run on common random numbers.
+  """
+  Xs = scale_design(X, bounds)
+  grid = {k: Xs[:, j] for j, k in enumerate(bounds)}
+  return sensitivity_curve(Parameters, grid, policy = policy, agent = agent, T = T, seed = seed, reps = reps, common = common)
+
+
+def morris_design(k, r, levels = 4, rng = None):
+  """
+  Builds r Morris trajectories in the unit cube on a grid with `levels` levels.
+  Each trajectory moves one factor at a time (random order) by +/- delta, delta = levels / (2 * (levels - 1)).
+  Returns (X, moved, step): X is (r * (k + 1), k), moved[t, j] is the factor changed between point j and j + 1
+  of trajectory t and step[t, j] the signed change.
+  """
+  rng = np.random.default_rng() if rng is None else rng
+  delta = levels / (2.0 * (levels - 1))
+  grid = np.arange(levels) / (levels - 1)
+
+  X = np.empty((r, k + 1, k))
+  moved = np.empty((r, k), dtype = np.int64)
+  step = np.empty((r, k))
+  for t in range(r):
+    x = rng.choice(grid, size = k)
+    X[t, 0] = x
+    order = rng.permutation(k)
+    for j, i in enumerate(order):
+      d = delta if x[i] + delta <= 1.0 + 1e-12 else -delta
+      x = x.copy()
+      x[i] += d
+      X[t, j + 1] = x
+      moved[t, j] = i
+      step[t, j] = d
+
+  return X.reshape(r * (k + 1), k), moved, step
+
+def morris_indices(Y, moved, step, conf = 0.95, n_boot = 1000, rng = None):
+  """
+  Elementary effect statistics from the outputs Y of a morris_design (one value per design row).
+  Returns a dict of arrays over factors: mu, mu_star, sigma and a bootstrap CI for mu_star (resampling trajectories).
+  """
+  rng = np.random.default_rng() if rng is None else rng
+  r, k = moved.shape
+  Y = np.asarray(Y, dtype = float).reshape(r, k + 1)
+
+  #EE[t, i] = elementary effect of factor i in trajectory t
+  EE = np.empty((r, k))
+  EE[np.arange(r)[:, None], moved] = np.diff(Y, axis = 1) / step
+
+  idx = rng.integers(0, r, size = (n_boot, r))
+  boot = np.abs(EE[idx]).mean(axis = 1)
+  q = (1.0 - conf) / 2.0
+
+  return {
+    'mu': EE.mean(axis = 0),
+    'mu_star': np.abs(EE).mean(axis = 0),
+    'sigma': EE.std(axis = 0, ddof = 1) if r > 1 else np.full(k, np.nan),
+    'mu_star_lo': np.quantile(boot, q, axis = 0),
+    'mu_star_hi': np.quantile(boot, 1.0 - q, axis = 0),
+  }
+
+def morris_screening(Parameters, bounds = None, r = 20, levels = 4, metrics = ('mean_outage', 'mean_damage_step'),
+                     policy = None, agent = None, T = None, seed = 123, reps = 1, conf = 0.95, n_boot = 1000, crn = True):
+  """
+  Morris screening of the parameters in bounds (default_bounds if None), r * (k + 1) simulated design points.
+  crn runs the points of each trajectory on common random numbers.
+  Returns a DataFrame indexed by (metric, parameter) sorted by mu_star within each metric.
+  """
+  bounds = default_bounds(Parameters) if bounds is None else bounds
+  rng = np.random.default_rng(int(seed))
+  X, moved, step = morris_design(len(bounds), int(r), levels = levels, rng = rng)
+  common = np.repeat(np.arange(int(r)), len(bounds) + 1) if crn else None
+  out = evaluate_design(Parameters, X, bounds, policy = policy, agent = agent, T = T, seed = seed, reps = reps, common = common)
+
+  frames = []
+  for m in metrics:
+    res = morris_indices(out[m].to_numpy(), moved, step, conf = conf, n_boot = n_boot, rng = rng)
+    df = pd.DataFrame(res, index = pd.Index(list(bounds), name = 'parameter'))
+    frames.append(df.sort_values('mu_star', ascending = False).assign(metric = m))
+  return pd.concat(frames).reset_index().set_index(['metric', 'parameter'])
+
+
+def saltelli_design(k, n, rng = None):
+  """
+  Saltelli design in the unit cube: base matrices A and B (n x k each) and the k matrices AB_i,
+  which are A with column i taken from B. Rows are stacked as [A, B, AB_0, ..., AB_{k-1}], n * (k + 2) in total.
+  """
+  rng = np.random.default_rng() if rng is None else rng
+  A = rng.random((n, k))
+  B = rng.random((n, k))
+  AB = np.repeat(A[None, :, :], k, axis = 0)
+  AB[np.arange(k), :, np.arange(k)] = B.T
+  return np.vstack([A, B, AB.reshape(k * n, k)])
+
+def sobol_from_outputs(Y, k, conf = 0.95, n_boot = 1000, rng = None):
+  """
+  First order (Saltelli 2010) and total (Jansen) Sobol indices from the outputs of a saltelli_design.
+  Both indices and their bootstrap CIs come from the same n * (k + 2) outputs.
+  """
+  rng = np.random.default_rng() if rng is None else rng
+  Y = np.asarray(Y, dtype = float)
+  n = Y.shape[0] // (k + 2)
+  fA, fB, fAB = Y[:n], Y[n:2 * n], Y[2 * n:].reshape(k, n)
+
+  def indices(rows):
+    #rows indexes the n base samples, can be a vector or a (n_boot, n) matrix of bootstrap draws
+    a, b, ab = fA[rows], fB[rows], fAB[:, rows]
+    var = np.concatenate([a, b], axis = -1).var(axis = -1)
+    var = np.where(var > 0, var, np.nan)
+    S1 = np.mean(b * (ab - a), axis = -1) / var
+    ST = 0.5 * np.mean((a - ab) ** 2, axis = -1) / var
+    return S1, ST
+
+  S1, ST = indices(np.arange(n))
+  bS1, bST = indices(rng.integers(0, n, size = (n_boot, n)))
+  q = (1.0 - conf) / 2.0
+
+  return {
+    'S1': S1,
+    'S1_lo': np.nanquantile(bS1, q, axis = 1),
+    'S1_hi': np.nanquantile(bS1, 1.0 - q, axis = 1),
+    'ST': ST,
+    'ST_lo': np.nanquantile(bST, q, axis = 1),
+    'ST_hi': np.nanquantile(bST, 1.0 - q, axis = 1),
+  }
+
+def sobol_indices(Parameters, bounds = None, n = 256, metrics = ('mean_outage', 'mean_damage_step'),
+                  policy = None, agent = None, T = None, seed = 123, reps = 1, conf = 0.95, n_boot = 1000, crn = True):
+  """
+  Sobol indices of the parameters in bounds (default_bounds if None) from n * (k + 2) simulated design points.
+  crn runs the A, B and AB_i rows of each base sample on common random numbers.
+  Returns a DataFrame indexed by (metric, parameter) sorted by ST within each metric.
+  Simulation noise left over shows up as inflated ST values (see the module docstring), raise T or reps when the
+  CIs are too wide.
+  """
+  bounds = default_bounds(Parameters) if bounds is None else bounds
+  k = len(bounds)
+  rng = np.random.default_rng(int(seed))
+  X = saltelli_design(k, int(n), rng = rng)
+  common = np.arange(X.shape[0]) % int(n) if crn else None
+  out = evaluate_design(Parameters, X, bounds, policy = policy, agent = agent, T = T, seed = seed, reps = reps, common = common)
+
+  frames = []
+  for m in metrics:
+    res = sobol_from_outputs(out[m].to_numpy(), k, conf = conf, n_boot = n_boot, rng = rng)
+    df = pd.DataFrame(res, index = pd.Index(list(bounds), name = 'parameter'))
+    frames.append(df.sort_values('ST', ascending = False).assign(metric = m))
+  return pd.concat(frames).reset_index().set_index(['metric', 'parameter'])
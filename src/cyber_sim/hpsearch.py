@@ -0,0 +1,181 @@
+"""
+Hyperparameter search over the rl_* keys with successive halving and Hyperband.
+
+Every configuration is a trial: an agent, the state and rng of its training run, and the steps trained so far.
+Successive halving trains all trials for a short budget, scores them by greedy-eval reward and keeps the best
+1/eta, the survivors continue training from where they stopped (their Q-tables, State and rng are kept) for an
+eta times larger budget, and so on. Hyperband runs several halving brackets that trade the number of
+configurations against their starting budget.
+
+Scores are always computed with the reward weights and action costs of the base Parameters (the objective),
+while each trial trains with its own rl_* values, so searching the reward weights searches reward shaping and
+scores stay comparable. All trials are evaluated on the same seed (common random numbers). With workers > 1
+the trials of a rung train in a process pool.
+"""
+from .rl import QLearner
+from .sim import run_sim
+from .state import make_initial_state
+from .batch import batch_parameters, make_initial_batch_state, run_batch, summarize_batch
+from .episodic import train_episodic
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import math
+import numpy as np
+import pandas as pd
+
+#name -> ('log', lo, hi), ('uniform', lo, hi) or ('choice', values)
+DEFAULT_SPACE = {
+  'rl_alpha': ('log', 0.02, 0.5),
+  'rl_gamma': ('uniform', 0.80, 0.995),
+  'rl_epsilon': ('log', 0.02, 0.4),
+  'rl_w_outage': ('log', 0.5, 8.0),
+  'rl_w_phys_damage': ('log', 0.5, 8.0),
+  'rl_w_ot_comp': ('log', 0.5, 8.0),
+  'rl_cost_active': ('log', 0.01, 0.5),
+  'rl_cost_recover': ('log', 0.01, 0.5),
+}
+
+
+def sample_configs(space, n, rng):
+  """n random configurations (dicts of parameter -> value) from a search space"""
+  configs = [dict() for _ in range(int(n))]
+  for k, spec in space.items():
+    kind = spec[0]
+    if kind == 'log':
+      v = np.exp(rng.uniform(np.log(spec[1]), np.log(spec[2]), size = n))
+    elif kind == 'uniform':
+      v = rng.uniform(spec[1], spec[2], size = n)
+    elif kind == 'choice':
+      v = [spec[1][i] for i in rng.integers(0, len(spec[1]), size = n)]
+    else:
+      raise ValueError(f"Unknown search space entry for {k}: {kind}")
+    for c, x in zip(configs, v):
+      c[k] = x.item() if hasattr(x, 'item') else x
+  return configs
+
+
+class Trial:
+  """One configuration under training, picklable so it can move between worker processes"""
+  def __init__(self, trial_id, config, agent, P_train, seed):
+    self.trial_id = int(trial_id)
+    self.config = dict(config)
+    self.agent = agent
+    self.P_train = P_train
+    self.State = make_initial_state(P_train)
+    self.rng = np.random.default_rng(int(seed))
+    self.steps = 0
+    self.score = np.nan
+
+
+def evaluate_greedy(Parameters, agent, T = 2000, n_envs = 64, seed = 123):
+  """Mean per-step reward of the frozen greedy agent under Parameters' reward weights (batched, n_envs runs of T steps)"""
+  P = Parameters.copy()
+  P['rl_epsilon'] = 0.0
+  P['rl_learn'] = 0
+  PB = batch_parameters(P)
+  acc = run_batch(PB, make_initial_batch_state(PB, int(n_envs)), np.random.default_rng(int(seed)), T = int(T), agent = agent)
+  return float(np.mean(summarize_batch(acc)['mean_reward']))
+
+def advance_trial(trial, steps, P_eval, method = 'run', eval_steps = 2000, eval_envs = 64, eval_seed = 123, episode_len = 50):
+  """
+  Trains trial up to steps in total and scores it, returns the trial.
+  method = 'run' continues the trial's single training run (like scripts/train_qlearn.py), 'episodic' trains with
+  train_episodic on the same number of transitions.
+  """
+  add = int(steps) - trial.steps
+  if add > 0:
+    if method == 'run':
+      P = trial.P_train.copy()
+      P['T'] = add
+      run_sim(P, trial.State, trial.rng, agent = trial.agent)
+    elif method == 'episodic':
+      train_episodic(trial.P_train, trial.agent, max(add // int(episode_len), 1), episode_len = episode_len,
+                     seed = int(trial.rng.integers(2 ** 31)))
+    else:
+      raise ValueError(f"Unknown training method: {method}")
+    trial.steps = int(steps)
+  trial.score = evaluate_greedy(P_eval, trial.agent, T = eval_steps, n_envs = eval_envs, seed = eval_seed)
+  return trial
+
+
+def successive_halving(Parameters, configs, min_steps, max_steps = None, eta = 3, make_agent = None, method = 'run',
+                       eval_steps = 2000, eval_envs = 64, eval_seed = 123, seed = 1, workers = 1, bracket = 0):
+  """
+  Successive halving over a list of configurations.
+  1. rung r trains every surviving trial to min_steps * eta^r steps and scores it
+  2. the best len / eta trials (at least one) go on to the next rung, until one is left
+  With max_steps the rungs are counted back from the last one, max_steps // eta^(R - r) for R = floor(log_eta(max_steps /
+  min_steps)), so the last rung trains exactly max_steps (products of a truncated min_steps end below it), and
+  the survivors keep going up to that rung even once one is left.
+  make_agent() builds a fresh agent per trial (default QLearner(n_actions = 3)).
+  Returns (history, best): history has one row per trial and rung (config, steps, score), best is the winning Trial.
+  """
+  make_agent = make_agent or (lambda: QLearner(n_actions = 3))
+  agent0 = make_agent()
+  P_eval = Parameters.copy()
+  P_eval['defender_policy'] = 'qlearn_v1' if isinstance(agent0, QLearner) else 'linear_v1'
+
+  trials = []
+  for i, cfg in enumerate(configs):
+    P = P_eval.copy()
+    for k, v in cfg.items():
+      P[k] = v
+    P['rl_learn'] = 1
+    trials.append(Trial(i, cfg, agent0 if i == 0 else make_agent(), P, seed + i))
+
+  advance = {'P_eval': P_eval, 'method': method, 'eval_steps': eval_steps, 'eval_envs': eval_envs, 'eval_seed': eval_seed}
+  history = []
+  eta = int(eta)
+  if max_steps is not None:
+    n_rungs = max(int(math.floor(math.log(int(max_steps) / max(int(min_steps), 1), eta) + 1e-9)), 0)
+  rung = 0
+  pool = ProcessPoolExecutor(max_workers = int(workers)) if int(workers) > 1 else None
+  try:
+    while True:
+      if max_steps is None:
+        budget = int(min_steps) * eta ** rung
+      else:
+        budget = max(int(max_steps) // eta ** (n_rungs - rung), 1)
+      step = partial(advance_trial, steps = budget, **advance)
+      trials = list(map(step, trials) if pool is None else pool.map(step, trials))
+      for t in trials:
+        history.append(dict({'bracket': bracket, 'rung': rung, 'trial': t.trial_id, 'steps': t.steps, 'score': t.score}, **t.config))
+
+      trials.sort(key = lambda t: -t.score)
+      if (len(trials) == 1 and max_steps is None) or (max_steps is not None and rung >= n_rungs):
+        break
+      trials = trials[:max(len(trials) // eta, 1)]
+      rung += 1
+  finally:
+    if pool is not None:
+      pool.shutdown()
+
+  return pd.DataFrame(history), trials[0]
+
+def hyperband(Parameters, max_steps, min_steps = None, eta = 3, space = None, make_agent = None, method = 'run',
+              eval_steps = 2000, eval_envs = 64, eval_seed = 123, seed = 1, workers = 1):
+  """
+  Hyperband: successive halving brackets s = s_max ... 0, bracket s starts ceil((s_max + 1) / (s + 1) * eta^s)
+  random configurations (sample_configs over space, default DEFAULT_SPACE) at max_steps * eta^-s steps.
+  min_steps (default max_steps / eta^3) sets s_max. Returns (history of every bracket, best Trial over the
+  brackets' winners, which all reach max_steps).
+  """
+  space = DEFAULT_SPACE if space is None else space
+  eta = int(eta)
+  min_steps = max_steps / eta ** 3 if min_steps is None else min_steps
+  s_max = int(math.floor(math.log(max_steps / min_steps, eta) + 1e-9))
+  rng = np.random.default_rng(int(seed))
+
+  histories = []
+  best = None
+  for s in range(s_max, -1, -1):
+    n = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+    configs = sample_configs(space, n, rng)
+    h, winner = successive_halving(Parameters, configs, int(max_steps / eta ** s), max_steps = max_steps, eta = eta,
+                                   make_agent = make_agent, method = method, eval_steps = eval_steps, eval_envs = eval_envs,
+                                   eval_seed = eval_seed, seed = int(rng.integers(2 ** 31)), workers = workers, bracket = s)
+    histories.append(h)
+    if best is None or winner.score > best.score:
+      best = winner
+  return pd.concat(histories, ignore_index = True), best
@@ -0,0 +1,317 @@
+"""
+Mean-field (expected value) engine for cheap deterministic screening before running Monte Carlo.
+
+Instead of sampling, the engine propagates the distribution of the state through the sim_step phase order:
+1. the joint distribution of the compromise flags (it_comp, ot_comp) is kept exactly as 4 probabilities ("modes")
+2. within each mode the continuous variables are summarized by their conditional means, optionally with the
+   second moments of (phys_damage, outage, downtime)
+3. the policy's action probabilities are evaluated at each mode's conditional mean state
+Each step enumerates every (mode, action, attacker outcome, detection/recovery outcome) path with its probability.
+Along a path the stocks (phys_damage, outage, downtime) move by an affine map, which is what makes the first and
+second moments exact up to the mean-field closures: success/intensity probabilities and policy decisions use the
+conditional mean of the vulnerabilities and id_cap, and the clip of outage / max(0, .) of downtime are applied to
+the conditional means only.
+
+Every parameter can be an array (one value per screening point) like in the batch engine, all points are propagated
+together so a step costs some tens of microseconds per point with no Monte Carlo noise.
+The closures are accurate for always_passive, random, threshold_v1 and qlearn_v1 under the default parameters
+(within a few percent of sensitivity_curve). Policies that switch sharply on the vulnerabilities (e.g. linear_v1)
+can be far off, since the action at the mean state is not the mean action, so confirm screening hits with Monte Carlo.
+"""
+from .enums import Action, AttackTarget, Intensity
+from .utils import clip01
+from .rl import LEARNING_POLICIES
+from .batch import batch_parameters, gov_mult_batch
+from .policies import make_policy
+from .schedules import check_stationary
+
+import numpy as np
+import pandas as pd
+
+#mode c = 2 * it_comp + ot_comp
+MODE_IT = np.array([0, 0, 1, 1])
+MODE_OT = np.array([0, 1, 0, 1])
+
+#attacker outcomes k: none, IT low, IT high, OT low, OT high
+OUTCOME_TARGET = np.array([AttackTarget.NONE, AttackTarget.IT, AttackTarget.IT, AttackTarget.OT, AttackTarget.OT])
+OUTCOME_HIGH = np.array([0, 0, 1, 0, 1])
+
+#per-flag branches e through detection/containment and recovery: (flag after containment, flag at end of step)
+BRANCH_POST_DC = np.array([0, 1, 1])
+BRANCH_END = np.array([0, 0, 1])
+
+#stocks carried with second moments, in this order
+STOCKS = ('phys_damage', 'outage', 'downtime')
+
+
+def _pb(x, ndim):
+  #parameter (float or per point array) shaped to broadcast against arrays whose first axis is the point
+  x = np.asarray(x, dtype = float)
+  return x.reshape(x.shape + (1,) * (ndim - x.ndim)) if x.ndim else x
+
+def initial_moments(Parameters, n, second = False):
+  """Moment state of n points all starting at the *_init values (deterministic, so all mass on one mode)"""
+  def init(k):
+    return np.broadcast_to(np.asarray(Parameters[k + '_init'], dtype = float), (n,))
+
+  w = np.zeros((n, 4))
+  w[np.arange(n), (2 * init('it_comp') + init('ot_comp')).astype(int)] = 1.0
+  M = {'w': w}
+  for k in ('it_vuln', 'ot_vuln', 'id_cap'):
+    M[k] = np.repeat(clip01(init(k))[:, None], 4, axis = 1)
+  M['mean'] = np.repeat(np.stack([init(k) for k in STOCKS], axis = -1)[:, None, :], 4, axis = 1)
+  if second:
+    M['second'] = M['mean'][..., :, None] * M['mean'][..., None, :]
+  return M
+
+def mode_parameters(Parameters):
+  #every point/mode pair becomes one environment of the policy
+  return {k: np.repeat(v, 4) if isinstance(v, np.ndarray) else v for k, v in Parameters.items()}
+
+def action_probs(Parameters, M, agent = None, defender = None):
+  """
+  (n, 4, 3) action probabilities in each mode, the policy applied to the mode's conditional mean state.
+  defender is the policy bound to mode_parameters(Parameters), resolved here when not given.
+  """
+  policy = Parameters.get('defender_policy', 'always_passive')
+  n = M['w'].shape[0]
+  if policy == 'random':
+    return np.full((n, 4, 3), 1.0 / 3.0)
+
+  S4 = {k: M[k].ravel() for k in ('it_vuln', 'ot_vuln', 'id_cap')}
+  S4.update({k: M['mean'][..., i].ravel() for i, k in enumerate(STOCKS)})
+  S4['it_comp'] = np.tile(MODE_IT, n)
+  S4['ot_comp'] = np.tile(MODE_OT, n)
+
+  if policy in LEARNING_POLICIES:
+    if agent is None:
+      raise ValueError("Q-learning policy requires an agent instance")
+    q = agent.q_batch(agent.encode_batch(mode_parameters(Parameters), S4))
+    best = (q == q.max(axis = 1, keepdims = True)).astype(float)
+    probs = best / best.sum(axis = 1, keepdims = True) #greedy ties split evenly, like the random tie-break
+    eps = np.repeat(np.broadcast_to(np.asarray(Parameters['rl_epsilon'], dtype = float), (n,)), 4)[:, None]
+    probs = (1.0 - eps) * probs + eps / q.shape[1]
+  else:
+    defender = make_policy(mode_parameters(Parameters), agent = agent) if defender is None else defender
+    a = defender.decide_batch(S4, None)
+    probs = np.zeros((n * 4, 3))
+    probs[np.arange(n * 4), a] = 1.0
+  return probs.reshape(n, 4, 3)
+
+
+def meanfield_step(Parameters, M, agent = None, defender = None):
+  """
+  Advances the moment state M by one step (in place) and returns the expected step outcomes (arrays over points):
+  action probabilities, damage_step, it/ot_comp_end, outage_next, phys_damage_next and rl_reward.
+  Path axes: point n, mode c (4), action a (3), attacker outcome k (5), IT branch e (3), OT branch f (3).
+  defender: the policy as in action_probs, meanfield_run resolves it once per run.
+  """
+  P = Parameters
+  n = M['w'].shape[0]
+  gm = _pb(gov_mult_batch(P), 3)
+  pi = action_probs(P, M, agent = agent, defender = defender)
+
+  #defender action effects, (n, c, a)
+  passive = np.array([1.0, 0.0, 0.0])
+  active = np.array([0.0, 1.0, 0.0])
+  recover = np.array([0.0, 0.0, 1.0])
+  it_v = np.where(passive > 0, clip01(M['it_vuln'][..., None] - gm * _pb(P['delta_it_vuln'], 3)), M['it_vuln'][..., None])
+  ot_v = np.where(passive > 0, clip01(M['ot_vuln'][..., None] - gm * _pb(P['delta_ot_vuln'], 3)), M['ot_vuln'][..., None])
+  id_c = np.where(passive > 0, clip01(M['id_cap'][..., None] + gm * _pb(P['delta_id_cap'], 3)), M['id_cap'][..., None])
+
+  gm = _pb(gov_mult_batch(P), 2)
+  p_detect = clip01(_pb(P['p_detect_base'], 2) + active * gm * _pb(P['delta_detect'], 2))       #(n, a)
+  p_contain = clip01(_pb(P['p_contain_base'], 2) + active * gm * _pb(P['delta_contain'], 2))
+  keep_dc = 1.0 - p_detect * p_contain                                                          #flag survives detection/containment
+  adr = active * clip01(gm * _pb(P['active_damage_reduction'], 2))
+  p_clear = clip01(_pb(P['p_recover_clear_base'], 2) + recover * gm * _pb(P['delta_recover_clear'], 2))
+  keep_rec = 1.0 - recover * p_clear                                                            #flag survives the recovery step
+  dt_keep = 1.0 - recover * clip01(gm * _pb(P['delta_downtime_reduction'], 2))
+  pd_keep = 1.0 - recover * clip01(_pb(P.get('damage_recover_decay', 0.0), 2))
+
+  #attacker, (n, c, a, k)
+  it_c = MODE_IT[None, :, None].astype(float)
+  ot_c = MODE_OT[None, :, None].astype(float)
+  p_attack = _pb(P['p_attack'], 3)
+  p_ot = clip01(_pb(P['p_ot_given_attack_base'], 3) + _pb(P['p_ot_bonus_if_it_comp'], 3) * it_c
+                + _pb(P['p_ot_bonus_if_ot_high_vuln'], 3) * (ot_v >= _pb(P['ot_high_vuln_threshold'], 3)))
+  p_high = clip01(_pb(P['p_high_base'], 3) * np.exp(-_pb(P['k_deterrence'], 3) * id_c))
+  p_outcome = np.stack([1.0 - p_attack + 0.0 * p_ot,
+                        p_attack * (1.0 - p_ot) * (1.0 - p_high), p_attack * (1.0 - p_ot) * p_high,
+                        p_attack * p_ot * (1.0 - p_high), p_attack * p_ot * p_high], axis = -1)
+
+  is_it = (OUTCOME_TARGET == AttackTarget.IT).astype(float)
+  is_ot = (OUTCOME_TARGET == AttackTarget.OT).astype(float)
+  vuln = is_it * it_v[..., None] + is_ot * ot_v[..., None]
+  success = (is_it + is_ot) * clip01(_pb(P['base_success_mult'], 4) * vuln + _pb(P['high_success_bonus'], 4) * OUTCOME_HIGH)
+
+  #probability each flag is set after attack resolution and after detection/containment, (n, c, a, k)
+  it1 = it_c[..., None] + (1.0 - it_c[..., None]) * is_it * success
+  ot1 = ot_c[..., None] + (1.0 - ot_c[..., None]) * is_ot * success
+  u = it1 * keep_dc[:, None, :, None]
+  v = ot1 * keep_dc[:, None, :, None]
+
+  #branch probabilities through containment and recovery, (n, c, a, k, 3)
+  kr = keep_rec[:, None, :, None, None]
+  def branches(x):
+    x = x[..., None]
+    return np.concatenate([1.0 - x, x * (1.0 - kr), x * kr], axis = -1)
+  W = (M['w'][:, :, None, None, None, None] * pi[..., None, None, None] * p_outcome[..., None, None]
+       * branches(u)[..., :, None] * branches(v)[..., None, :])                                  #(n, c, a, k, e, f)
+
+  #affine maps of the stocks along each path, x' = A x + b with x = (phys_damage, outage, downtime).
+  #A only depends on the action and b does not depend on the mode, which keeps the moment sums small
+  o2 = BRANCH_POST_DC[None, :].astype(float)                          #OT flag after containment, (e, f)
+  comp2 = np.maximum(BRANCH_POST_DC[:, None], BRANCH_POST_DC[None, :]).astype(float)
+  comp3 = np.maximum(BRANCH_END[:, None], BRANCH_END[None, :]).astype(float)
+
+  mult = np.where(OUTCOME_HIGH == 1, _pb(P['high_damage_multiplier'], 2), 1.0)    #(n, k)
+  dmg = _pb(P['base_damage'], 3) * mult[:, None, :] * (1.0 - adr)[..., None]     #(n, a, k)
+  dmg = dmg[..., None, None] * o2                                                 #(n, a, k, e, f)
+
+  pers = _pb(P.get('damage_persistence', 1.0), 2)
+  q = 1.0 - _pb(P.get('outage_decay', 0.60), 2)
+  a_comp, a_dmg = _pb(P.get('outage_comp_cost', 0.40), 5), _pb(P.get('outage_damage_cost', 0.20), 2)
+  c_comp, c_dmg = _pb(P['downtime_comp_cost'], 5), _pb(P['downtime_damage_cost'], 2)
+  decay = _pb(P.get('downtime_decay', 0.0), 5)
+
+  r = pers * pd_keep                                                              #(n, a) phys_damage multiplier
+  g = dt_keep                                                                     #(n, a) downtime multiplier
+  A = np.zeros(r.shape + (3, 3))
+  A[..., 0, 0] = r
+  A[..., 1, 0] = a_dmg * r
+  A[..., 1, 1] = q
+  A[..., 2, 0] = g * c_dmg
+  A[..., 2, 2] = g
+
+  b_pd = r[..., None, None, None] * dmg                                           #(n, a, k, e, f)
+  b = np.stack(np.broadcast_arrays(
+    b_pd,
+    a_comp * comp3 + _pb(a_dmg, 5) * b_pd,
+    g[..., None, None, None] * (c_comp * comp2 + _pb(c_dmg, 5) * dmg - decay)), axis = -1)
+
+  Am = np.einsum('naij,ncj->ncai', A, M['mean'])                                 #(n, c, a, 3)
+
+  #aggregate paths by final mode = 2 * it_end + ot_end, a branch e ends with the flag set only for e = 2
+  def group(x):
+    #(n, e, f, ...) -> (n, 4, ...)
+    y = np.stack([x[:, :2].sum(axis = 1), x[:, 2]], axis = 1)
+    y = np.stack([y[:, :, :2].sum(axis = 2), y[:, :, 2]], axis = 2)
+    return y.reshape((y.shape[0], 4) + y.shape[3:])
+
+  W_ca = W.sum(axis = 3)                                                          #(n, c, a, e, f)
+  W_c = W.sum(axis = 1)                                                           #(n, a, k, e, f)
+  w_new = group(W_ca.sum(axis = (1, 2)))
+  safe = np.where(w_new > 1e-300, w_new, 1.0)
+  seen = w_new > 1e-300
+
+  #the maps are affine so the path average splits into sum W A m (over modes and actions) + sum W b
+  mean_new = group(np.einsum('ncaef,ncai->nefi', W_ca, Am) + np.einsum('nakef,nakefi->nefi', W_c, b)) / safe[..., None]
+  mean_new[..., 1] = clip01(mean_new[..., 1])
+  mean_new[..., 2] = np.maximum(0.0, mean_new[..., 2])
+  for k, x in (('it_vuln', it_v), ('ot_vuln', ot_v), ('id_cap', id_c)):
+    M[k] = np.where(seen, group(np.einsum('ncaef,nca->nef', W_ca, x)) / safe, M[k])
+  if 'second' in M:
+    #E[x' x'^T] along a path = A S A^T + A m b^T + b m^T A^T + b b^T (S, m conditional on the starting mode)
+    ASA = np.einsum('naik,nckl,najl->ncaij', A, M['second'], A)
+    second = np.einsum('ncaef,ncaij->nefij', W_ca, ASA)
+    WAm = np.einsum('ncakef,ncai->nakefi', W, Am)
+    cross = np.einsum('nakefi,nakefj->nefij', WAm, b)
+    second += cross + np.swapaxes(cross, -1, -2)
+    second += np.einsum('nakef,nakefi,nakefj->nefij', W_c, b, b, optimize = True)
+    M['second'] = np.where(seen[..., None, None], group(second) / safe[..., None, None], M['second'])
+  M['mean'] = np.where(seen[..., None], mean_new, M['mean'])
+  M['w'] = w_new
+
+  #expected step outcomes
+  act = W_ca.sum(axis = (1, 3, 4))
+  out = {
+    'action_probs': act,
+    'damage_step': np.einsum('nakef,nakef->n', W_c, dmg),
+    'it_comp_end': w_new[:, 2] + w_new[:, 3],
+    'ot_comp_end': w_new[:, 1] + w_new[:, 3],
+    'phys_damage_next': (w_new * M['mean'][..., 0]).sum(axis = 1),
+    'outage_next': (w_new * M['mean'][..., 1]).sum(axis = 1),
+    'downtime_next': (w_new * M['mean'][..., 2]).sum(axis = 1),
+  }
+  #expected rl_step_reward, the loss is linear in everything it uses
+  out['rl_reward'] = -(P['rl_w_damage_step'] * out['damage_step'] + P['rl_w_outage'] * out['outage_next']
+                       + P['rl_w_it_comp'] * out['it_comp_end'] + P['rl_w_ot_comp'] * out['ot_comp_end']
+                       + P['rl_w_phys_damage'] * out['phys_damage_next']
+                       + P.get('rl_cost_active', 0.0) * act[:, int(Action.ACTIVE)] + P.get('rl_cost_recover', 0.0) * act[:, int(Action.RECOVER)])
+  if 'second' in M:
+    for i, k in enumerate(STOCKS):
+      ex2 = (w_new * M['second'][..., i, i]).sum(axis = 1)
+      out['sd_' + k] = np.sqrt(np.maximum(0.0, ex2 - out[k + '_next'] ** 2))
+  return out
+
+
+def meanfield_parameters(Parameters, overrides = None, n = None):
+  """batch_parameters with every numeric parameter broadcast to an array of length n, as meanfield_step expects"""
+  check_stationary(Parameters, "the mean-field engine")
+  PB = batch_parameters(Parameters, overrides, n = n)
+  if n is None:
+    n = max([v.shape[0] for v in PB.values() if isinstance(v, np.ndarray)], default = 1)
+  return {k: v if isinstance(v, str) else np.broadcast_to(np.asarray(v, dtype = float), (n,)) for k, v in PB.items()}, n
+
+def meanfield_run(Parameters, T = None, overrides = None, agent = None, second = False):
+  """
+  Expected trajectories of T steps for one or more parameter points (overrides as in batch_parameters).
+  Returns a dict of step outcome -> (T, n) array, see meanfield_step.
+  """
+  PB, n = meanfield_parameters(Parameters, overrides)
+  T = int(Parameters['T'] if T is None else T)
+  M = initial_moments(PB, n, second = second)
+  policy = PB.get('defender_policy', 'always_passive')
+  defender = None if policy in LEARNING_POLICIES or policy == 'random' else make_policy(mode_parameters(PB), agent = agent)
+
+  traj = {}
+  for t in range(T):
+    out = meanfield_step(PB, M, agent = agent, defender = defender)
+    for k, v in out.items():
+      if k not in traj:
+        traj[k] = np.zeros((T,) + v.shape)
+      traj[k][t] = v
+  return traj
+
+def meanfield_curve(Parameters, grid, policy = None, agent = None, T = None, second = False, chunk = 4096):
+  """
+  Mean-field counterpart of sensitivity.sensitivity_curve: same grid argument and the same output columns
+  (approximate expected values instead of Monte Carlo means), learning policies are evaluated greedily.
+  With second = True the standard deviations of the stocks at the end of the run are added (sd_*_end).
+  Points are processed chunk at a time to bound memory (a step holds ~500 paths per point, ~5000 with second moments).
+  """
+  P = Parameters.copy()
+  if policy is not None:
+    P['defender_policy'] = policy
+  learning = P.get('defender_policy') in LEARNING_POLICIES
+  if learning:
+    P['rl_learn'] = 0
+    P['rl_epsilon'] = 0.0
+
+  grid = {k: np.asarray(v, dtype = float).ravel() for k, v in grid.items()}
+  n_points = len(next(iter(grid.values())))
+  if any(len(v) != n_points for v in grid.values()):
+    raise ValueError("all grid axes must have the same number of points, use parameter_grid for a cartesian product")
+
+  parts = []
+  for lo in range(0, n_points, int(chunk)):
+    sub = {k: v[lo:lo + int(chunk)] for k, v in grid.items()}
+    traj = meanfield_run(P, T = T, overrides = sub, agent = agent, second = second)
+    part = {
+      'mean_reward': traj['rl_reward'].mean(axis = 0) if learning else np.zeros(len(next(iter(sub.values())))),
+      'mean_outage': traj['outage_next'].mean(axis = 0),
+      'mean_damage_step': traj['damage_step'].mean(axis = 0),
+      'time_it_comp': traj['it_comp_end'].mean(axis = 0),
+      'time_ot_comp': traj['ot_comp_end'].mean(axis = 0),
+    }
+    freq = traj['action_probs'].mean(axis = 0)
+    for a in Action:
+      part['freq_' + a.name] = freq[:, int(a)]
+    if second:
+      for k in STOCKS:
+        part['sd_' + k + '_end'] = traj['sd_' + k][-1]
+    parts.append(pd.DataFrame(part))
+
+  df = pd.DataFrame(grid)
+  return pd.concat([df, pd.concat(parts, ignore_index = True)], axis = 1)
@@ -1,6 +1,10 @@
 import numpy as np
+import pandas as pd
 from .sim import run_sim
 from .state import make_initial_state
+from .schema import column
+from .enums import Action
+from .accumulators import METRICS
 
 
 def summarize_run(df):
@@ -11,24 +15,113 @@ def summarize_run(df):
   out['mean_damage_step'] = float(df['damage_step'].mean())
   out['time_it_comp'] = float(df['it_comp_end'].mean())
   out['time_ot_comp'] = float(df['ot_comp_end'].mean())
-  out['action_freq'] = (df['action_name'].value_counts(normalize=True)).to_dict()
-  out['q_size_end'] = float(df['q_size'].iloc[-1]) if 'q_size' in df.columns and not df['q_size'].isna().all() else np.nan
+  out['action_freq'] = action_freq(df)
+  q_size = column(df, 'q_size')
+  out['q_size_end'] = float(q_size.iloc[-1]) if isinstance(q_size, pd.Series) and not q_size.isna().all() else np.nan
   return out
 
 
+def action_freq(df):
+  #categorical action_name (compact schema) also counts the actions never played, drop them
+  f = df['action_name'].value_counts(normalize=True)
+  return {str(k): float(v) for k, v in f.items() if v > 0}
+
+
 def rolling_action_freq(df, window=500):
   # log for frequency of actions over time
   a = df['action_name']
   idx = np.arange(len(df))
   buckets = (idx // window)
   return (df.assign(bucket=buckets)
-            .groupby(['bucket','action_name'])
+            .groupby(['bucket','action_name'], observed=True)
             .size()
             .groupby(level=0)
             .apply(lambda s: (s / s.sum()))
             .unstack(fill_value=0.0))
 
 
+def block_bootstrap_starts(n, n_boot=2000, block_len=None, rng=None):
+  """
+  (n_boot, n_blocks) matrix of moving-block start indices, resample b is the concatenation of the blocks
+  x[start:start + block_len] (the last one cut so the resample has n values). block_len defaults to n^(1/3).
+  """
+  rng = np.random.default_rng() if rng is None else rng
+  block_len = max(int(round(n ** (1.0 / 3.0))), 1) if block_len is None else min(int(block_len), n)
+  n_blocks = -(-n // block_len)
+  return rng.integers(0, n - block_len + 1, size=(int(n_boot), n_blocks)), block_len
+
+def bootstrap_means(df, n_boot=2000, block_len=None, rng=None, starts=None):
+  """
+  Moving-block bootstrap of the summarize_run means (and action frequencies) of one run.
+  Every resample mean comes from prefix sums: the sum of a block is cs[start + len] - cs[start], so one
+  gather of the (n_boot, n_blocks) start matrix per column replaces n_boot resampled copies of the log.
+  starts (with the block_len it was drawn with, both from block_bootstrap_starts) shares the resample indices
+  between runs of the same length.
+  Returns (point estimates as a Series, DataFrame of n_boot resampled estimates).
+  """
+  n = len(df)
+  if starts is None:
+    starts, block_len = block_bootstrap_starts(n, n_boot, block_len, rng)
+  else:
+    if block_len is None:
+      raise ValueError("starts needs the block_len it was drawn with, block_bootstrap_starts returns both")
+    block_len = min(int(block_len), n)
+    starts = np.asarray(starts, dtype=np.int64)
+    if starts.ndim != 2 or starts.shape[1] != -(-n // block_len) or starts.min() < 0 or starts.max() > n - block_len:
+      raise ValueError(f"starts do not fit a run of {n} steps in blocks of {block_len}")
+  tail = n - (starts.shape[1] - 1) * block_len
+
+  cols = {k: np.asarray(df[c], dtype=float) for k, c in METRICS.items() if c in df.columns}
+  action = np.asarray(df['action'], dtype=np.int64)
+  for a in Action:
+    cols['freq_' + a.name] = (action == int(a)).astype(float)
+
+  full, last = starts[:, :-1], starts[:, -1]
+  est, draws = {}, {}
+  for k, x in cols.items():
+    cs = np.concatenate([[0.0], np.cumsum(x)])
+    block_sums = cs[block_len:] - cs[:-block_len]
+    est[k] = cs[-1] / n
+    draws[k] = (block_sums[full].sum(axis=1) + cs[last + tail] - cs[last]) / n
+  return pd.Series(est), pd.DataFrame(draws)
+
+def ci_table(est, draws, conf=0.95):
+  #percentile intervals and bootstrap standard errors
+  q = (1.0 - conf) / 2.0
+  return pd.DataFrame({
+    'estimate': est,
+    'se': draws.std(axis=0, ddof=1),
+    'lo': draws.quantile(q),
+    'hi': draws.quantile(1.0 - q),
+  })
+
+def bootstrap_ci(df, n_boot=2000, block_len=None, conf=0.95, seed=0):
+  """
+  Block-bootstrap confidence intervals of the summary metrics of one run, a DataFrame indexed by metric
+  (mean_reward, mean_outage, ..., freq_<action>) with estimate, se, lo and hi.
+  Blocks keep the autocorrelation of the step log, block_len defaults to n^(1/3).
+  """
+  est, draws = bootstrap_means(df, n_boot, block_len, np.random.default_rng(int(seed)))
+  return ci_table(est, draws, conf)
+
+def compare_runs(df_a, df_b, n_boot=2000, block_len=None, conf=0.95, seed=0):
+  """
+  Bootstrap CIs of the differences (run a - run b) of the summary metrics of two independent runs, plus
+  p_greater = share of resamples where a's metric is larger, e.g. compare_runs(qlearn_greedy_df, threshold_df).
+  """
+  rng_a, rng_b = [np.random.default_rng(s) for s in np.random.SeedSequence(int(seed)).spawn(2)]
+  est_a, draws_a = bootstrap_means(df_a, n_boot, block_len, rng_a)
+  est_b, draws_b = bootstrap_means(df_b, n_boot, block_len, rng_b)
+  return diff_table((est_a, draws_a), (est_b, draws_b), conf)
+
+def diff_table(boot_a, boot_b, conf=0.95):
+  #CIs of a - b from two (estimate, draws) pairs of bootstrap_means with the same number of resamples
+  (est_a, draws_a), (est_b, draws_b) = boot_a, boot_b
+  out = ci_table(est_a - est_b, draws_a - draws_b, conf)
+  out['p_greater'] = (draws_a - draws_b > 0).mean(axis=0)
+  return out
+
+
 #evaluate qlearning effectiveness under high vs low threat (different than attack intensity, basically just hard coding a probability of an attack occuring to examine 'high' and 'low' attack threat conditions)
 def eval_high_vs_low_threat(P, q_agent, p_attack, seed=123, T=25000):
     P2 = P.copy()
@@ -37,9 +130,10 @@ def eval_high_vs_low_threat(P, q_agent, p_attack, seed=123, T=25000):
     P2['rl_epsilon'] = 0.0
     P2['p_attack'] = p_attack
     P2['Seed'] = seed
+    P2['T'] = int(T)
     rng = np.random.default_rng(int(P2['Seed']))
-    df = run_sim(P2, make_initial_state(P2), rng)
-    return summarize_run(df), df['action_name'].value_counts(normalize=True).to_dict()
+    df = run_sim(P2, make_initial_state(P2), rng, agent=q_agent)
+    return summarize_run(df), action_freq(df)
 
 #compare threshold and random policy performance to qlearning performance in high and low threat conditions
 def eval_policy_under(P, policy, p_attack, seed=123, T=25000):
@@ -47,6 +141,7 @@ def eval_policy_under(P, policy, p_attack, seed=123, T=25000):
     P2['defender_policy'] = policy
     P2['p_attack'] = p_attack
     P2['Seed'] = seed
+    P2['T'] = int(T)
     rng = np.random.default_rng(int(P2['Seed']))
     df = run_sim(P2, make_initial_state(P2), rng)
     return summarize_run(df)
\ No newline at end of file
@@ -1,10 +1,10 @@
-import pandas as pd
 from .utils import add_kv_pairs
 
 # Model Parameters
 
-def default_parameters() -> pd.Series:
-    return pd.Series({
+def default_parameters() -> dict:
+    #plain dict (no pandas needed to simulate), any mapping with the same keys works as Parameters
+    return {
         #Simulation Control
         "T" : 500,
         'Seed': 1,
@@ -66,9 +66,9 @@ def default_parameters() -> pd.Series:
         #Recovery probabilities
         'p_recover_clear_base' : 0.10, #chance recovery clears compromise status
         'damage_recover_decay' : 0.05 #fraction of damage removed under RECOVER action
-    })
+    }
 
-def apply_defaults(P: pd.Series) -> pd.Series:
+def apply_defaults(P: dict) -> dict:
     P = P.copy()
     outage_defaults = {
         'outage_decay': 0.60,
@@ -91,6 +91,15 @@ def apply_defaults(P: pd.Series) -> pd.Series:
     'rl_gamma': 0.95,
     'rl_epsilon': 0.20,
 
+    #exploration / step size schedules, driven by the agent's learning steps and per-(s, a) visit counts (rl.py)
+    'rl_epsilon_decay': 'none',        # 'none', 'linear' or 'exp' decay of rl_epsilon towards rl_epsilon_min
+    'rl_epsilon_min': 0.01,
+    'rl_epsilon_decay_steps': 50_000,  # steps to reach rl_epsilon_min ('linear') or e-folding steps ('exp')
+    'rl_alpha_decay': 'none',          # 'visits': alpha = max(rl_alpha_min, 1 / N(s, a)^rl_alpha_omega) instead of rl_alpha
+    'rl_alpha_omega': 0.8,
+    'rl_alpha_min': 0.01,
+    'rl_ucb_c': 0.0,                   # > 0 adds a count-based UCB bonus to the Q-values when choosing actions
+
     #discretization values, this step allows for us to use the tabular q-learning technique with continuous data
     'rl_id_cap_lo' : 0.33,
     'rl_id_cap_high': 0.66,
@@ -109,12 +118,29 @@ def apply_defaults(P: pd.Series) -> pd.Series:
 
     'rl_learn' : 1,     # 1 = training mode, 0 = evaluation mode (stops updating)
 
+    #experience replay (only used when the agent has a replay buffer attached), mini-batch size and batches per env step
+    'rl_replay_batch': 32,
+    'rl_replay_updates': 1,
+
     #added small costs to certain action because I found under certain parameter values the agent would continuously recover
     'rl_cost_active': 0.05,
     'rl_cost_recover': 0.10,
 }
     add_kv_pairs(P, rl_defaults)
 
+    adversary_defaults = {
+    #learning attacker (adversary.py), only used when an attacker agent replaces the fixed attack process
+    'adv_alpha': 0.15,
+    'adv_gamma': 0.95,
+    'adv_epsilon': 0.20,
+
+    #attacker reward = defender loss (same rl_w_* weights, no defender action costs) - effort - exposure
+    'adv_cost_low': 0.05,       #effort of a low intensity attack
+    'adv_cost_high': 0.15,      #high intensity attacks need more resources
+    'adv_cost_detected': 0.50,  #penalty each time one of the attacker's footholds is detected
+}
+    add_kv_pairs(P, adversary_defaults)
+
     return P
 
 
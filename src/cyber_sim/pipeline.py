@@ -0,0 +1,172 @@
+"""
+Stage-cached experiment pipeline.
+
+A stage is a function fn(config, *upstream outputs) -> output with explicit inputs: a config (anything json-like,
+parameter Series and arrays included) and the names of the stages it depends on. Its key is a content hash of
+the function name, the source of the function's module, the source of the cyber_sim package, a version string
+(for changes outside both, e.g. a dependency upgrade), the config and the keys of its upstream stages, so a stage
+reruns exactly when one of its inputs or the code behind it changed. Outputs are pickled to a local artifact store (store/<stage>-<key>.pkl) and
+reused by later runs. Stages whose upstream stages are done run concurrently in a process pool (workers > 1),
+so the stage functions have to be importable module-level functions.
+"""
+from .schedules import as_schedule
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+_PACKAGE_HASH = None
+
+
+def _jsonable(x):
+  #json.dumps default: only types with an unambiguous spec, a repr could hold an address or collide
+  if isinstance(x, pd.Series):
+    return {str(k): v for k, v in x.items()}
+  if isinstance(x, np.ndarray):
+    return x.tolist()
+  if isinstance(x, np.generic):
+    return x.item()
+  s = as_schedule(x)
+  if s is not None:
+    return s.to_dict()
+  raise TypeError(f"cannot hash a stage config value of type {type(x).__name__}")
+
+def package_hash():
+  """Content hash of every .py file of the cyber_sim package, computed once per process"""
+  global _PACKAGE_HASH
+  if _PACKAGE_HASH is None:
+    root = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+    for d, dirs, files in sorted(os.walk(root)):
+      dirs[:] = sorted(x for x in dirs if x != '__pycache__')
+      for name in sorted(f for f in files if f.endswith('.py')):
+        path = os.path.join(d, name)
+        h.update(os.path.relpath(path, root).encode())
+        with open(path, 'rb') as f:
+          h.update(f.read())
+    _PACKAGE_HASH = h.hexdigest()[:16]
+  return _PACKAGE_HASH
+
+def code_hash(fn):
+  """Content hash of the source of fn's module (fn and the helpers it calls there), fn's own source as a fallback"""
+  try:
+    src = inspect.getsource(inspect.getmodule(fn))
+  except (OSError, TypeError):
+    try:
+      src = inspect.getsource(fn)
+    except (OSError, TypeError):
+      src = fn.__code__.co_code.hex()
+  return hashlib.sha256(src.encode()).hexdigest()[:16]
+
+def content_hash(*objs):
+  blob = json.dumps(objs, sort_keys = True, default = _jsonable)
+  return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+class Stage:
+  def __init__(self, name, fn, config = None, deps = (), version = '1'):
+    self.name = name
+    self.fn = fn
+    self.config = {} if config is None else config
+    self.deps = tuple(deps)
+    self.version = str(version)
+
+
+class Pipeline:
+  """
+  Stages added with add() and executed with run().
+  store = None disables the artifact store (everything reruns), workers = 1 runs the stages in this process.
+  After run(), status maps every stage to 'cached' or 'ran' and keys to its content hash.
+  """
+  def __init__(self, store = None, workers = 1):
+    self.store = store
+    self.workers = max(int(workers), 1)
+    self.stages = {}
+    self.status = {}
+    self.keys = {}
+    if store is not None:
+      os.makedirs(store, exist_ok = True)
+
+  def add(self, name, fn, config = None, deps = (), version = '1'):
+    if name in self.stages:
+      raise ValueError(f"Duplicate stage: {name}")
+    for d in deps:
+      if d not in self.stages:
+        raise ValueError(f"Stage {name} depends on unknown stage {d}")
+    self.stages[name] = Stage(name, fn, config, deps, version)
+    return name
+
+  def key(self, name):
+    if name not in self.keys:
+      s = self.stages[name]
+      self.keys[name] = content_hash(f'{s.fn.__module__}.{s.fn.__qualname__}', code_hash(s.fn), package_hash(), s.version,
+                                     s.config, [self.key(d) for d in s.deps])
+    return self.keys[name]
+
+  def _path(self, name):
+    return os.path.join(self.store, f'{name}-{self.key(name)}.pkl')
+
+  def _load(self, name):
+    if self.store is None or not os.path.exists(self._path(name)):
+      return None
+    with open(self._path(name), 'rb') as f:
+      return (pickle.load(f),)
+
+  def _save(self, name, output):
+    if self.store is None:
+      return
+    tmp = self._path(name) + '.tmp'
+    with open(tmp, 'wb') as f:
+      pickle.dump(output, f)
+    os.replace(tmp, self._path(name))
+
+  def _needed(self, targets):
+    #targets and everything upstream of them, in insertion (i.e. topological) order
+    need = set()
+    stack = list(self.stages if targets is None else targets)
+    while stack:
+      n = stack.pop()
+      if n not in need:
+        need.add(n)
+        stack.extend(self.stages[n].deps)
+    return [n for n in self.stages if n in need]
+
+  def run(self, targets = None):
+    """Runs (or loads) the targets and their upstream stages, returns {stage name: output}"""
+    outputs = {}
+    todo = []
+    for n in self._needed(targets):
+      hit = self._load(n)
+      if hit is not None:
+        outputs[n] = hit[0]
+        self.status[n] = 'cached'
+      else:
+        todo.append(n)
+
+    if self.workers == 1:
+      for n in todo:
+        s = self.stages[n]
+        outputs[n] = s.fn(s.config, *[outputs[d] for d in s.deps])
+        self._save(n, outputs[n])
+        self.status[n] = 'ran'
+      return outputs
+
+    with ProcessPoolExecutor(max_workers = self.workers) as pool:
+      running = {}
+      while todo or running:
+        for n in [n for n in todo if all(d in outputs for d in self.stages[n].deps)]:
+          s = self.stages[n]
+          running[pool.submit(s.fn, s.config, *[outputs[d] for d in s.deps])] = n
+          todo.remove(n)
+        done, _ = wait(running, return_when = FIRST_COMPLETED)
+        for fut in done:
+          n = running.pop(fut)
+          outputs[n] = fut.result()
+          self._save(n, outputs[n])
+          self.status[n] = 'ran'
+    return outputs
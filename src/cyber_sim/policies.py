@@ -0,0 +1,141 @@
+"""
+Defender policy plugins.
+
+A policy is a class bound to the Parameters (and the agent, for learning policies) of one run, with
+decide_batch(States, rng) returning one action per state using array operations. States is a dict of arrays
+(the batched engine) or a single State, in which case the result is a 0-d array. The registry maps
+defender_policy names to policy classes, make_policy resolves the name once per run, and both
+defender.choose_action and batch.decide_actions_batch are thin wrappers over it.
+
+New policies are added with register_policy(name, cls), e.g.
+
+  class AlwaysRecover(Policy):
+    def decide_batch(self, States, rng):
+      return np.full(np.shape(States['it_comp']), int(Action.RECOVER))
+
+  register_policy('always_recover', AlwaysRecover)
+"""
+from .enums import Action
+from .rl import LEARNING_POLICIES, scheduled_epsilon
+
+import numpy as np
+
+
+def greedy_actions_batch(q, rng):
+  """argmax over each row of q, breaking ties uniformly at random like QLearner.select_action"""
+  best = q == q.max(axis = 1, keepdims = True)
+  return np.argmax(np.where(best, rng.random(q.shape), -1.0), axis = 1)
+
+
+class Policy:
+  """Base class, subclasses implement decide_batch and may override decide for a cheaper single-state path"""
+  needs_agent = False
+
+  def __init__(self, Parameters, agent = None):
+    if self.needs_agent and agent is None:
+      raise ValueError("Q-learning policy requires an agent instance")
+    self.Parameters = Parameters
+    self.agent = agent
+
+  def decide_batch(self, States, rng):
+    raise NotImplementedError
+
+  def decide(self, State, rng):
+    #single state, same random draws as one decide_batch call
+    return int(self.decide_batch(State, rng))
+
+
+class AlwaysPassive(Policy):
+  """baseline/placeholder policy, the defender plays PASSIVE no matter what"""
+  def decide_batch(self, States, rng):
+    return np.full(np.shape(States['it_comp']), int(Action.PASSIVE))
+
+class RandomPolicy(Policy):
+  """uniform random pick of the three actions (PASSIVE, ACTIVE, RECOVER) at each time step"""
+  def decide_batch(self, States, rng):
+    return rng.integers(0, 3, size = np.shape(States['it_comp']))
+
+class ThresholdPolicy(Policy):
+  """
+  simple heuristic on parameter thresholds, in priority order:
+  1. OT compromised, or high physical damage / outage: RECOVER
+  2. IT compromised: ACTIVE
+  3. otherwise PASSIVE (improves id_cap when it is low, invests in long-term defensive assets otherwise)
+  """
+  def decide_batch(self, States, rng):
+    P = self.Parameters
+    recover = ((np.asarray(States['ot_comp']) == 1)
+               | (np.asarray(States['phys_damage']) >= P.get('phys_damage_threshold', 0.50))
+               | (np.asarray(States['outage']) >= P.get('outage_high_threshold', 0.60)))
+    active = np.logical_not(recover) & (np.asarray(States['it_comp']) == 1)
+    return np.where(recover, int(Action.RECOVER), np.where(active, int(Action.ACTIVE), int(Action.PASSIVE)))
+
+class LearningPolicy(Policy):
+  """
+  epsilon-greedy actions of a QLearner (qlearn_v1) or LinearQLearner (linear_v1), read through the agent.
+  epsilon follows rl_epsilon_decay over the agent's learning steps, rl_ucb_c > 0 adds the agent's count-based
+  UCB bonus to the Q-values (QLearner only) while learning, frozen agents (rl_learn = 0) act on the Q-values alone.
+  """
+  needs_agent = True
+
+  def __init__(self, Parameters, agent = None):
+    super().__init__(Parameters, agent = agent)
+    if float(Parameters.get('rl_ucb_c', 0.0)) > 0 and not hasattr(agent, 'ucb_bonus'):
+      raise ValueError("rl_ucb_c > 0 needs per-(s, a) visit counts (QLearner)")
+
+  def epsilon(self):
+    return scheduled_epsilon(self.Parameters, getattr(self.agent, 'n_steps', 0))
+
+  def ucb_c(self):
+    #the bonus is exploration, so evaluation of a frozen agent stays greedy on its Q-values
+    if int(self.Parameters.get('rl_learn', 1)) == 0:
+      return 0.0
+    return float(self.Parameters.get('rl_ucb_c', 0.0))
+
+  def decide_batch(self, States, rng):
+    if np.ndim(States['it_comp']) == 0:
+      #single State: a batch of one, returned as a 0-d array
+      return np.asarray(self.decide_batch({k: np.asarray(v)[None] for k, v in States.items()}, rng)[0])
+    s = self.agent.encode_batch(self.Parameters, States)
+    q = self.agent.q_batch(s)
+    ucb_c = self.ucb_c()
+    if ucb_c > 0:
+      q = q + ucb_c * self.agent.ucb_bonus(s)
+    action = greedy_actions_batch(q, rng)
+
+    n = q.shape[0]
+    explore = rng.random(n) < self.epsilon()
+    if explore.any():
+      action = np.where(explore, rng.integers(0, q.shape[1], size = n), action)
+    return action
+
+  def decide(self, State, rng):
+    #the agent's own single-state path (and random stream), which also learns through sim_step
+    s = self.agent.encode(self.Parameters, State)
+    ucb_c = self.ucb_c()
+    if ucb_c > 0:
+      return self.agent.select_action(s, float(self.epsilon()), rng, ucb_c = ucb_c)
+    return self.agent.select_action(s, float(self.epsilon()), rng)
+
+
+POLICY_REGISTRY = {
+  'always_passive': AlwaysPassive,
+  'random': RandomPolicy,
+  'threshold_v1': ThresholdPolicy,
+}
+for _name in LEARNING_POLICIES:
+  POLICY_REGISTRY[_name] = LearningPolicy
+
+
+def register_policy(name, cls):
+  """Makes cls (a Policy subclass) available as defender_policy = name"""
+  if not (isinstance(cls, type) and issubclass(cls, Policy)):
+    raise TypeError("policies must subclass policies.Policy")
+  POLICY_REGISTRY[str(name)] = cls
+
+def make_policy(Parameters, agent = None):
+  """Resolves Parameters['defender_policy'] to a policy instance bound to Parameters and agent"""
+  policy = Parameters.get('defender_policy', 'always_passive')
+  if policy not in POLICY_REGISTRY:
+    raise ValueError(f"Unknown defender_policy: {policy}")
+  return POLICY_REGISTRY[policy](Parameters, agent = agent)
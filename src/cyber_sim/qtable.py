@@ -0,0 +1,119 @@
+import numpy as np
+
+#largest table (n_states * n_actions entries) stored as a dense array, ~32 MB of float64
+DENSE_LIMIT = 2 ** 22
+
+
+class DenseQTable:
+  """
+  Q-values for every state in one (n_states, n_actions) array.
+  Behaves like the old dict-of-rows Q-table: len() counts visited states, row(s) creates (marks visited) and
+  get(s) does not. Indexing with an int array gathers rows for batched code.
+  """
+  def __init__(self, n_states, n_actions):
+    self.n_states = int(n_states)
+    self.n_actions = int(n_actions)
+    self.values = np.zeros((self.n_states, self.n_actions), dtype = float)
+    self.visited = np.zeros(self.n_states, dtype = bool)
+    self.n_visited = 0
+
+  def __len__(self):
+    return self.n_visited
+
+  def __contains__(self, s):
+    return bool(self.visited[s])
+
+  def __getitem__(self, s):
+    return self.values[s]
+
+  def row(self, s):
+    if not self.visited[s]:
+      self.visited[s] = True
+      self.n_visited += 1
+    return self.values[s]
+
+  def get(self, s, default = None):
+    return self.values[s] if self.visited[s] else default
+
+  def keys(self):
+    return np.flatnonzero(self.visited).tolist()
+
+  def items(self):
+    return [(s, self.values[s]) for s in self.keys()]
+
+  def mark_visited(self, s_idx):
+    new = np.unique(np.asarray(s_idx)[~self.visited[s_idx]])
+    self.visited[new] = True
+    self.n_visited += int(new.shape[0])
+
+  def add(self, s, a, step):
+    #(s, a) pairs must be unique, see QLearner.update_batch
+    self.values[s, a] += step
+
+  def to_array(self):
+    return self.values.copy()
+
+
+class SparseQTable:
+  """
+  Same interface as DenseQTable but only visited states are stored (dict of state index -> row),
+  used when the state space is too large for a dense array.
+  """
+  def __init__(self, n_states, n_actions):
+    self.n_states = int(n_states)
+    self.n_actions = int(n_actions)
+    self.rows = {}
+    self._zeros = np.zeros(self.n_actions, dtype = float)
+
+  def __len__(self):
+    return len(self.rows)
+
+  def __contains__(self, s):
+    return int(s) in self.rows
+
+  def __getitem__(self, s):
+    if np.ndim(s) == 0:
+      return self.rows.get(int(s), self._zeros)
+    s = np.asarray(s)
+    out = np.zeros((s.size, self.n_actions), dtype = float)
+    for j, i in enumerate(s.ravel().tolist()):
+      q = self.rows.get(i)
+      if q is not None:
+        out[j] = q
+    return out.reshape(s.shape + (self.n_actions,))
+
+  def row(self, s):
+    s = int(s)
+    if s not in self.rows:
+      self.rows[s] = np.zeros(self.n_actions, dtype = float)
+    return self.rows[s]
+
+  def get(self, s, default = None):
+    return self.rows.get(int(s), default)
+
+  def keys(self):
+    return list(self.rows)
+
+  def items(self):
+    return list(self.rows.items())
+
+  def mark_visited(self, s_idx):
+    for s in np.unique(s_idx).tolist():
+      self.row(s)
+
+  def add(self, s, a, step):
+    for i, j, d in zip(np.asarray(s).tolist(), np.asarray(a).tolist(), np.asarray(step).tolist()):
+      self.row(i)[j] += d
+
+  def to_array(self):
+    Qa = np.zeros((self.n_states, self.n_actions), dtype = float)
+    for s, q in self.rows.items():
+      Qa[s] = q
+    return Qa
+
+
+def make_q_table(n_states, n_actions, dense_limit = DENSE_LIMIT):
+  #dense storage unless the table would be larger than dense_limit entries
+  if int(n_states) * int(n_actions) <= int(dense_limit):
+    return DenseQTable(n_states, n_actions)
+  return SparseQTable(n_states, n_actions)
@@ -0,0 +1,334 @@
+"""
+Rare-event estimators for catastrophic outcomes under a fixed (or frozen learning) defender policy.
+
+An event is "the score of the state reaches the event threshold within T steps", e.g. phys_damage >= 0.75
+(DamageExceedance) or outage >= 0.9 for 5 consecutive steps (SustainedOutage). Under the default parameters these
+never show up in a few thousand brute-force runs, so next to crude Monte Carlo there are two variance reduction
+schemes, both built on the batched engine:
+
+1. importance sampling: the attacker draws (attack occurrence, OT target, high intensity) come from tilted
+   probabilities and every path carries the likelihood ratio of those draws up to its stopping time (hitting time
+   or T), so mean(W * 1{hit}) is unbiased. cross_entropy_tilt fits the tilt with the cross-entropy method.
+2. fixed-effort multilevel splitting: with levels l_1 < ... < l_m = threshold, stage k restarts n paths from the
+   states (and times) where stage k-1 paths first reached l_{k-1}, resampled with replacement, and counts the
+   fraction p_k reaching l_k before T. prod(p_k) is unbiased, its standard error comes from independent
+   replications. splitting_levels picks levels from a pilot run (separate from the estimate, so no bias).
+
+Every estimator returns a dict with the estimate, its standard error and the number of simulated environment steps,
+so schemes compare by work-normalized variance (std_error^2 * steps). Scheduled parameters are not supported.
+
+  event = DamageExceedance(0.75)
+  tilt, _ = cross_entropy_tilt(P, event, T = 200)
+  importance_sampling(P, event, T = 200, n = 20000, tilt = tilt)
+  multilevel_splitting(P, event, T = 200)
+"""
+from .enums import AttackTarget, Intensity
+from .rl import LEARNING_POLICIES
+from .batch import batch_parameters, make_initial_batch_state, batch_step, p_ot_batch, p_high_batch
+from .policies import make_policy
+from .schedules import check_stationary
+
+import numpy as np
+
+TILT_KEYS = ('p_attack', 'p_ot', 'p_high')
+
+
+class DamageExceedance:
+  """phys_damage reaches level"""
+  def __init__(self, level = 0.75):
+    self.threshold = float(level)
+
+  def prepare(self, States):
+    pass
+
+  def update(self, States):
+    pass
+
+  def score(self, States):
+    return States['phys_damage']
+
+
+class SustainedOutage:
+  """
+  outage stays at or above level for duration consecutive steps. The score is the current run length plus 1, or
+  outage / level below the level, so splitting also gets levels on the way up to the first step above it.
+  """
+  def __init__(self, level = 0.9, duration = 5):
+    self.level = float(level)
+    self.duration = int(duration)
+    self.threshold = self.duration + 1.0
+
+  def prepare(self, States):
+    States['outage_run'] = np.zeros(States['outage'].shape[0], dtype = np.int64)
+
+  def update(self, States):
+    States['outage_run'] = np.where(States['outage'] >= self.level, States['outage_run'] + 1, 0)
+
+  def score(self, States):
+    return np.where(States['outage_run'] > 0, States['outage_run'] + 1.0, States['outage'] / self.level)
+
+
+def _setup(Parameters, agent, what):
+  check_stationary(Parameters, what)
+  PB = batch_parameters(Parameters)
+  if PB.get('defender_policy', 'always_passive') in LEARNING_POLICIES and agent is None:
+    raise ValueError("Q-learning policy requires an agent instance")
+  return PB, make_policy(PB, agent = agent)
+
+def _initial(PB, event, n):
+  S = make_initial_batch_state(PB, int(n))
+  event.prepare(S)
+  return S
+
+def _take(States, idx):
+  return {k: v[idx] for k, v in States.items()}
+
+def _check_tilt(tilt):
+  tilt = dict(tilt or {})
+  for k, v in tilt.items():
+    if k not in TILT_KEYS:
+      raise ValueError(f"Unknown tilt key: {k}, expected one of {TILT_KEYS}")
+    if v is not None and not 0.0 < v < 1.0:
+      raise ValueError(f"tilted probability {k} must be in (0, 1), got {v}")
+  return tilt
+
+def _log_ratio(x, p, q):
+  #log P(x | p) - log P(x | q) for a Bernoulli draw x, zero wherever the draw was not tilted
+  with np.errstate(divide = 'ignore', invalid = 'ignore'):
+    lr = np.where(x, np.log(p) - np.log(q), np.log1p(-p) - np.log1p(-q))
+  return np.where(p == q, 0.0, lr)
+
+
+def sample_tilted_attacker(Parameters, States, rng, tilt):
+  """
+  sample_attacker_batch with the probabilities in tilt ('p_attack', 'p_ot', 'p_high', missing or None keeps the
+  nominal, state dependent value). Returns (target, intensity, log likelihood ratio nominal / tilted, draws) where
+  draws = (attack, ot, high) boolean arrays.
+  """
+  n = States['it_comp'].shape[0]
+  u = rng.random((3, n))
+  p = {
+    'p_attack': np.broadcast_to(Parameters['p_attack'], (n,)),
+    'p_ot': np.broadcast_to(p_ot_batch(Parameters, States), (n,)),
+    'p_high': np.broadcast_to(p_high_batch(Parameters, States), (n,)),
+  }
+  q = {k: p[k] if tilt.get(k) is None else np.full(n, float(tilt[k])) for k in TILT_KEYS}
+
+  attack = u[0] <= q['p_attack']
+  ot = u[1] < q['p_ot']
+  high = u[2] < q['p_high']
+  logw = _log_ratio(attack, p['p_attack'], q['p_attack'])
+  logw += np.where(attack, _log_ratio(ot, p['p_ot'], q['p_ot']) + _log_ratio(high, p['p_high'], q['p_high']), 0.0)
+
+  target = np.where(attack, np.where(ot, int(AttackTarget.OT), int(AttackTarget.IT)), int(AttackTarget.NONE))
+  intensity = np.where(attack, np.where(high, int(Intensity.HIGH), int(Intensity.LOW)), int(Intensity.NONE))
+  return target, intensity, logw, (attack, ot, high)
+
+
+def advance_to_level(Parameters, defender, event, States, t, level, T, rng, tilt = None):
+  """
+  Steps every path from States at times t until its score reaches level (hit) or it reaches step T.
+  Paths already at the level count as hits without stepping. Returns (paths, States at the stopping time, steps)
+  where paths is a dict of per-path arrays: hit, t (stopping time), logw (log likelihood ratio of the tilted attacker
+  draws), max_score, and the counts n_steps, n_attack, n_ot, n_high of the draws.
+  """
+  tilt = _check_tilt(tilt)
+  n = t.shape[0]
+  score = np.asarray(event.score(States), dtype = float)
+  paths = {
+    'hit': score >= level,
+    't': np.array(t, dtype = np.int64),
+    'logw': np.zeros(n),
+    'max_score': score.copy(),
+    'n_steps': np.zeros(n, dtype = np.int64),
+    'n_attack': np.zeros(n, dtype = np.int64),
+    'n_ot': np.zeros(n, dtype = np.int64),
+    'n_high': np.zeros(n, dtype = np.int64),
+  }
+  S_end = {k: v.copy() for k, v in States.items()}
+
+  #only the paths still running are stepped, dropped as soon as they stop
+  alive = np.flatnonzero(~paths['hit'] & (paths['t'] < T))
+  A = _take(States, alive)
+  tA = paths['t'][alive]
+  steps = 0
+  drawn = {}
+
+  def attacker(P, S, rng):
+    #drawn on the state after the defender action, like the reference attacker
+    target, intensity, drawn['logw'], drawn['draws'] = sample_tilted_attacker(P, S, rng, tilt)
+    return target, intensity
+
+  while alive.size:
+    action = defender.decide_batch(A, rng)
+    batch_step(Parameters, A, rng, action, attacker = attacker)
+    logw, (attack, ot, high) = drawn['logw'], drawn['draws']
+    event.update(A)
+    tA += 1
+    steps += alive.size
+
+    paths['logw'][alive] += logw
+    paths['n_steps'][alive] += 1
+    paths['n_attack'][alive] += attack
+    paths['n_ot'][alive] += attack & ot
+    paths['n_high'][alive] += attack & high
+    score = np.asarray(event.score(A), dtype = float)
+    paths['max_score'][alive] = np.maximum(paths['max_score'][alive], score)
+
+    reached = score >= level
+    done = reached | (tA >= T)
+    if done.any():
+      idx = alive[done]
+      paths['hit'][idx] = reached[done]
+      paths['t'][idx] = tA[done]
+      for k in S_end:
+        S_end[k][idx] = A[k][done]
+      keep = ~done
+      alive, A, tA = alive[keep], _take(A, keep), tA[keep]
+
+  return paths, S_end, steps
+
+
+def _mean_estimate(x, steps, **extra):
+  n = x.shape[0]
+  est = float(x.mean())
+  se = float(x.std(ddof = 1) / np.sqrt(n)) if n > 1 else np.nan
+  return dict({'estimate': est, 'std_error': se, 'rel_error': se / est if est > 0 else np.nan, 'steps': int(steps), 'n': n}, **extra)
+
+
+def crude_monte_carlo(Parameters, event, T, n = 10000, agent = None, seed = 0):
+  """Brute force: fraction of n independent paths that hit the event within T steps"""
+  PB, defender = _setup(Parameters, agent, "crude_monte_carlo")
+  rng = np.random.default_rng(int(seed))
+  paths, _, steps = advance_to_level(PB, defender, event, _initial(PB, event, n), np.zeros(int(n), dtype = np.int64),
+                                     event.threshold, int(T), rng)
+  return _mean_estimate(paths['hit'].astype(float), steps, hits = int(paths['hit'].sum()))
+
+
+def importance_sampling(Parameters, event, T, n = 10000, tilt = None, agent = None, seed = 0):
+  """
+  Importance sampling estimate of P(event within T steps) with the attacker tilted by tilt (see
+  sample_tilted_attacker). ess is the effective sample size of the weights of the hitting paths.
+  """
+  PB, defender = _setup(Parameters, agent, "importance_sampling")
+  rng = np.random.default_rng(int(seed))
+  paths, _, steps = advance_to_level(PB, defender, event, _initial(PB, event, n), np.zeros(int(n), dtype = np.int64),
+                                     event.threshold, int(T), rng, tilt = tilt)
+  w = np.where(paths['hit'], np.exp(paths['logw']), 0.0)
+  ess = float(w.sum() ** 2 / (w ** 2).sum()) if w.any() else 0.0
+  return _mean_estimate(w, steps, hits = int(paths['hit'].sum()), ess = ess, tilt = _check_tilt(tilt))
+
+
+def cross_entropy_tilt(Parameters, event, T, n = 2000, rho = 0.1, iters = 10, smoothing = 0.8, bounds = (0.01, 0.99),
+                       keys = TILT_KEYS, agent = None, seed = 0):
+  """
+  Fits the importance sampling tilt with the (multilevel) cross-entropy method.
+  1. simulate n paths under the current tilt (the nominal attacker at first)
+  2. the elite are the paths whose max score reaches gamma = min(threshold, 1 - rho quantile of the max scores)
+  3. the new tilted probabilities are the likelihood-ratio weighted frequencies of the elite draws
+     (attacks per step, OT targets and high intensities per attack), smoothed with the previous tilt
+  until gamma reaches the threshold and one update on the hitting paths is done, or iters runs out.
+  keys restricts which probabilities are tilted, the others keep their nominal values.
+  Returns (tilt, history) with one history row (dict) per iteration.
+  """
+  PB, defender = _setup(Parameters, agent, "cross_entropy_tilt")
+  rng = np.random.default_rng(int(seed))
+  lo, hi = bounds
+  tilt = {}
+  history = []
+  for it in range(int(iters)):
+    paths, _, steps = advance_to_level(PB, defender, event, _initial(PB, event, n), np.zeros(int(n), dtype = np.int64),
+                                       event.threshold, int(T), rng, tilt = tilt)
+    gamma = min(float(np.quantile(paths['max_score'], 1.0 - rho)), event.threshold)
+    elite = paths['max_score'] >= gamma
+    w = np.exp(paths['logw']) * elite
+
+    new = {}
+    for k, num, den in (('p_attack', 'n_attack', 'n_steps'), ('p_ot', 'n_ot', 'n_attack'), ('p_high', 'n_high', 'n_attack')):
+      if k not in keys:
+        continue
+      d = float((w * paths[den]).sum())
+      if d > 0:
+        v = float(np.clip((w * paths[num]).sum() / d, lo, hi))
+        new[k] = v if tilt.get(k) is None else smoothing * v + (1.0 - smoothing) * tilt[k]
+    tilt = dict(tilt, **new)
+    history.append(dict({'iter': it, 'gamma': gamma, 'hits': int(paths['hit'].sum()), 'steps': steps}, **tilt))
+    if gamma >= event.threshold:
+      break
+  return tilt, history
+
+
+def splitting_levels(Parameters, event, T, n = 1000, p0 = 0.2, max_levels = 100, agent = None, seed = 0):
+  """
+  Pilot run of adaptive multilevel splitting: each next level is the 1 - p0 quantile of the max scores that the
+  paths started from the previous level's entrance states reach before T, until p0 of them hit the threshold.
+  Returns the increasing level array, ending at event.threshold.
+  """
+  PB, defender = _setup(Parameters, agent, "splitting_levels")
+  rng = np.random.default_rng(int(seed))
+  S = _initial(PB, event, n)
+  t = np.zeros(int(n), dtype = np.int64)
+  levels = []
+  prev = -np.inf
+  while True:
+    paths, _, _ = advance_to_level(PB, defender, event, S, t, event.threshold, int(T), rng)
+    if paths['hit'].mean() >= p0:
+      break
+    if len(levels) >= int(max_levels) - 1:
+      raise ValueError(f"threshold not reached within {max_levels} levels (last level {prev}), raise max_levels")
+    ms = paths['max_score']
+    level = float(np.quantile(ms, 1.0 - p0))
+    if level <= prev:
+      #ties (integer scores) or no progress, take the next value actually reached
+      above = ms[ms > prev]
+      if not above.size:
+        raise ValueError(f"no pilot path got above level {prev} within T, increase n or T")
+      level = float(above.min())
+
+    entry, S_end, _ = advance_to_level(PB, defender, event, S, t, level, int(T), rng)
+    if not entry['hit'].any():
+      raise ValueError(f"no pilot path reached level {level} within T, increase n")
+    idx = rng.choice(np.flatnonzero(entry['hit']), size = int(n))
+    S, t = _take(S_end, idx), entry['t'][idx]
+    levels.append(level)
+    prev = level
+  levels.append(float(event.threshold))
+  return np.array(levels)
+
+
+def multilevel_splitting(Parameters, event, T, levels = None, n = 1000, n_runs = 10, agent = None, seed = 0):
+  """
+  Fixed-effort multilevel splitting estimate of P(event within T steps), mean of n_runs independent replications
+  with n paths per level (n in the result is n_runs). levels defaults to splitting_levels, a pilot with its own
+  seed whose steps are not counted. level_probs holds the mean conditional probability of every level.
+  """
+  PB, defender = _setup(Parameters, agent, "multilevel_splitting")
+  if levels is None:
+    levels = splitting_levels(Parameters, event, T, n = n, agent = agent, seed = int(seed) + 1)
+  levels = np.asarray(levels, dtype = float)
+  if np.any(np.diff(levels) <= 0):
+    raise ValueError("splitting levels must be strictly increasing")
+  if levels[-1] < event.threshold:
+    levels = np.append(levels, event.threshold)
+
+  rng = np.random.default_rng(int(seed))
+  estimates = np.zeros(int(n_runs))
+  probs = np.zeros((int(n_runs), levels.shape[0]))
+  steps = 0
+  for r in range(int(n_runs)):
+    S = _initial(PB, event, n)
+    t = np.zeros(int(n), dtype = np.int64)
+    est = 1.0
+    for k, level in enumerate(levels):
+      paths, S_end, s = advance_to_level(PB, defender, event, S, t, level, int(T), rng)
+      steps += s
+      probs[r, k] = paths['hit'].mean()
+      est *= probs[r, k]
+      if est == 0.0:
+        break
+      #multinomial resampling of the entrance states keeps the product estimator unbiased
+      idx = rng.choice(np.flatnonzero(paths['hit']), size = int(n))
+      S, t = _take(S_end, idx), paths['t'][idx]
+    estimates[r] = est
+
+  return _mean_estimate(estimates, steps, levels = levels, level_probs = probs.mean(axis = 0))
@@ -0,0 +1,133 @@
+import numpy as np
+
+
+class SumTree:
+  """
+  Binary sum tree over capacity leaves (prioritized replay): leaf i holds a weight, every inner node the sum of its
+  children, so updates and proportional sampling cost O(log capacity) per transition instead of a cumsum over the buffer.
+  """
+  def __init__(self, capacity):
+    self.n_leaves = 1
+    while self.n_leaves < capacity:
+      self.n_leaves *= 2
+    self.tree = np.zeros(2 * self.n_leaves, dtype = np.float64) #node 1 is the root, leaves start at n_leaves
+
+  def total(self):
+    return float(self.tree[1])
+
+  def get(self, idx):
+    return self.tree[self.n_leaves + np.asarray(idx)]
+
+  def update(self, idx, values):
+    #set the leaves, then recompute their ancestors one level at a time (repeated parents just write the same sum)
+    nodes = self.n_leaves + np.asarray(idx, dtype = np.int64).ravel()
+    self.tree[nodes] = values
+    if nodes.shape[0] == 1:
+      #single leaf (add): plain python walk up to the root
+      tree, i = self.tree, int(nodes[0]) // 2
+      while i >= 1:
+        tree[i] = tree[2 * i] + tree[2 * i + 1]
+        i //= 2
+      return
+    nodes = nodes // 2
+    while nodes[0] >= 1:
+      self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+      nodes = nodes // 2
+
+  def find(self, u):
+    """Leaf index of every mass u in [0, total), the first leaf whose prefix sum exceeds u"""
+    u = np.array(u, dtype = np.float64)
+    nodes = np.ones(u.shape[0], dtype = np.int64)
+    while nodes[0] < self.n_leaves:
+      left = 2 * nodes
+      right = u >= self.tree[left]
+      u = np.where(right, u - self.tree[left], u)
+      nodes = left + right
+    return nodes - self.n_leaves
+
+
+class ReplayBuffer:
+  """
+  Fixed capacity ring buffer of Q-learning transitions (s_idx, a, r, s_next_idx) stored in typed numpy arrays.
+  Once full, the oldest transitions are overwritten, so memory is set by capacity alone.
+  Sampling is uniform, or proportional to priority (|td error| + eps)^alpha when prioritized = True,
+  in which case sample() also returns importance weights (N * P(i))^-beta normalized to a max of 1.
+  Priorities live in a SumTree and new transitions get the running max priority, so add, sample and
+  update_priorities cost O(log capacity). Uniform buffers (or alpha = 0) keep no priorities at all.
+  The buffer has its own rng so replaying never changes the simulation's random stream.
+  """
+  def __init__(self, capacity, prioritized = False, alpha = 0.6, beta = 0.4, eps = 1e-3, seed = None):
+    self.capacity = int(capacity)
+    self.alpha = float(alpha)
+    #alpha = 0 gives every transition the same probability, i.e. uniform sampling with unit weights
+    self.prioritized = bool(prioritized) and self.alpha > 0
+    self.beta = float(beta)
+    self.eps = float(eps)
+    self.rng = np.random.default_rng(seed)
+
+    self.s = np.zeros(self.capacity, dtype = np.int32)
+    self.a = np.zeros(self.capacity, dtype = np.int8)
+    self.r = np.zeros(self.capacity, dtype = np.float32)
+    self.s_next = np.zeros(self.capacity, dtype = np.int32)
+    self.tree = SumTree(self.capacity) if self.prioritized else None
+    #largest priority seen so far, never lowered (as in the prioritized replay paper)
+    self.max_priority = 1.0
+
+    self.pos = 0 #next slot to write
+    self.size = 0
+
+  def __len__(self):
+    return self.size
+
+  def add(self, s, a, r, s_next):
+    #new transitions get the max priority so they are replayed at least once
+    i = self.pos
+    self.s[i] = s
+    self.a[i] = a
+    self.r[i] = r
+    self.s_next[i] = s_next
+    if self.prioritized:
+      self.tree.update([i], self.max_priority ** self.alpha)
+
+    self.pos = (i + 1) % self.capacity
+    self.size = min(self.size + 1, self.capacity)
+
+  def add_batch(self, s, a, r, s_next):
+    n = len(s)
+    if n > self.capacity:
+      s, a, r, s_next = s[-self.capacity:], a[-self.capacity:], r[-self.capacity:], s_next[-self.capacity:]
+      n = self.capacity
+
+    idx = (self.pos + np.arange(n)) % self.capacity
+    self.s[idx] = s
+    self.a[idx] = a
+    self.r[idx] = r
+    self.s_next[idx] = s_next
+    if self.prioritized:
+      self.tree.update(idx, self.max_priority ** self.alpha)
+
+    self.pos = int((self.pos + n) % self.capacity)
+    self.size = min(self.size + n, self.capacity)
+
+  def sample(self, batch_size):
+    """Returns (idx, s, a, r, s_next, weights), weights are all 1 for uniform sampling"""
+    if self.size == 0:
+      raise ValueError("cannot sample from an empty replay buffer")
+
+    if not self.prioritized:
+      idx = self.rng.integers(0, self.size, size = int(batch_size))
+      weights = np.ones(idx.shape[0])
+    else:
+      total = self.tree.total()
+      idx = np.minimum(self.tree.find(self.rng.random(int(batch_size)) * total), self.size - 1)
+      prob = self.tree.get(idx) / total
+      weights = (self.size * prob) ** -self.beta
+      weights = weights / weights.max()
+
+    return idx, self.s[idx], self.a[idx].astype(np.int64), self.r[idx].astype(float), self.s_next[idx], weights
+
+  def update_priorities(self, idx, td_error):
+    if self.prioritized:
+      priority = np.abs(td_error) + self.eps
+      self.max_priority = max(self.max_priority, float(np.max(priority)))
+      self.tree.update(idx, priority ** self.alpha)
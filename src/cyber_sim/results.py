@@ -0,0 +1,227 @@
+"""
+Partitioned columnar results store for sweep outputs on local disk.
+
+Layout (one .npy file per column, so a query only touches the columns and partitions it needs):
+  root/params/<param_hash>.json                                   parameters of every hash in the store
+  root/summaries/policy=<p>/param_hash=<h>/part=<k>/<column>.npy  one row per run (seed + summarize_run columns)
+  root/trajectories/policy=<p>/param_hash=<h>/seed=<s>/<column>.npy  full run DataFrames, optional
+
+Summaries are buffered by append() and written one part per partition by flush(). Queries filter partitions on
+policy, param_hash and any parameter value (read from the small params registry), then load the requested
+columns memory mapped and filter rows on stored columns, e.g.
+  store.query(columns = ['mean_outage'], policy = 'threshold_v1', where = {'p_attack': ('>', 0.5)})
+"""
+from .enums import Action
+from .runlog import params_to_dict, param_hash
+
+import json
+import operator
+import os
+import numpy as np
+import pandas as pd
+
+TABLES = ('summaries', 'trajectories')
+
+#action frequency columns, a run that never played an action has frequency 0 for it
+FREQ_COLUMNS = tuple('freq_' + a.name for a in Action)
+
+OPS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+       'in': lambda a, b: np.isin(a, list(b))}
+
+
+def flatten_summary(summary):
+  #summarize_run dict -> flat columns, action_freq becomes freq_<ACTION> like sensitivity_curve
+  out = {}
+  for k, v in summary.items():
+    if isinstance(v, dict):
+      for name, f in v.items():
+        out['freq_' + str(name)] = f
+    else:
+      out[k] = v
+  return out
+
+def _match(value, cond):
+  #cond is a value (equality) or an (op, value) pair
+  if isinstance(cond, tuple) and len(cond) == 2 and cond[0] in OPS:
+    return OPS[cond[0]](value, cond[1])
+  return value == cond
+
+def _write_columns(path, data):
+  os.makedirs(path, exist_ok = True)
+  for c, v in data.items():
+    a = np.asarray(v)
+    if a.dtype == object:
+      a = a.astype(str)
+    np.save(os.path.join(path, c + '.npy'), a, allow_pickle = False)
+
+def _partitions(path, key):
+  #values of key=<value> subdirectories
+  if not os.path.isdir(path):
+    return []
+  prefix = key + '='
+  return sorted(d[len(prefix):] for d in os.listdir(path) if d.startswith(prefix))
+
+
+class ResultsStore:
+  """Results store rooted at a local directory, see the module docstring for the layout"""
+  def __init__(self, root):
+    self.root = root
+    self._buffer = {} #(policy, hash) -> list of flat summary rows
+    self._params = {}
+    os.makedirs(os.path.join(root, 'params'), exist_ok = True)
+
+  def _register(self, Parameters):
+    h = param_hash(Parameters)
+    if h not in self._params:
+      path = os.path.join(self.root, 'params', h + '.json')
+      if not os.path.exists(path):
+        with open(path, 'w') as f:
+          json.dump(params_to_dict(Parameters), f, sort_keys = True, default = str)
+      self._params[h] = params_to_dict(Parameters)
+    return h
+
+  def params(self):
+    """Parameters of every hash in the store as a DataFrame indexed by param_hash"""
+    d = os.path.join(self.root, 'params')
+    for name in os.listdir(d):
+      h = name[:-len('.json')]
+      if name.endswith('.json') and h not in self._params:
+        with open(os.path.join(d, name)) as f:
+          self._params[h] = json.load(f)
+    out = pd.DataFrame.from_dict(self._params, orient = 'index')
+    out.index.name = 'param_hash'
+    return out
+
+  def append(self, Parameters, seed, summary, policy = None):
+    """Buffers one run summary (summarize_run dict or any flat dict of scalars), written by flush()"""
+    policy = Parameters.get('defender_policy', 'always_passive') if policy is None else policy
+    h = self._register(Parameters)
+    row = {'seed': int(seed)}
+    row.update(flatten_summary(summary))
+    self._buffer.setdefault((str(policy), h), []).append(row)
+
+  def flush(self):
+    """Writes the buffered summaries, one new part per partition"""
+    for (policy, h), rows in self._buffer.items():
+      base = os.path.join(self.root, 'summaries', 'policy=' + policy, 'param_hash=' + h)
+      k = len(_partitions(base, 'part'))
+      while os.path.exists(os.path.join(base, f'part={k:05d}')):
+        k += 1
+      df = pd.DataFrame(rows)
+      #runs that never played an action have no freq_ entry for it
+      freq = [c for c in df.columns if c.startswith('freq_')]
+      df[freq] = df[freq].fillna(0.0)
+      _write_columns(os.path.join(base, f'part={k:05d}'), {c: df[c].to_numpy() for c in df.columns})
+    self._buffer = {}
+
+  def write_trajectory(self, Parameters, seed, df, policy = None):
+    """Writes the DataFrame of one run (full or compact schema) to the trajectories table"""
+    policy = Parameters.get('defender_policy', 'always_passive') if policy is None else policy
+    h = self._register(Parameters)
+    path = os.path.join(self.root, 'trajectories', 'policy=' + str(policy), 'param_hash=' + h, f'seed={int(seed)}')
+    _write_columns(path, {c: df[c].to_numpy() for c in df.columns})
+    if df.attrs:
+      #per-run constants of the compact schema
+      with open(os.path.join(path, '_attrs.json'), 'w') as f:
+        json.dump({k: (v.item() if hasattr(v, 'item') else v) for k, v in df.attrs.items()}, f)
+
+  def stored_columns(self, table = 'summaries'):
+    """Set of column names stored in any partition of table"""
+    cols = set()
+    root = os.path.join(self.root, table)
+    key = 'seed' if table == 'trajectories' else 'part'
+    for p in _partitions(root, 'policy'):
+      for h in _partitions(os.path.join(root, 'policy=' + p), 'param_hash'):
+        base = os.path.join(root, 'policy=' + p, 'param_hash=' + h)
+        for part in _partitions(base, key):
+          cols.update(f[:-4] for f in os.listdir(os.path.join(base, f'{key}={part}')) if f.endswith('.npy'))
+    return cols
+
+  def select_partitions(self, table = 'summaries', policy = None, param_hash = None, where = None):
+    """
+    (policy, param_hash) pairs of table matching the filters, where entries naming parameters prune partitions.
+    Raises KeyError for a where entry that is neither a parameter nor a stored column of table.
+    """
+    root = os.path.join(self.root, table)
+    policies = _partitions(root, 'policy')
+    if policy is not None:
+      policies = [p for p in policies if p in ([policy] if isinstance(policy, str) else list(policy))]
+
+    param_where = {}
+    if where:
+      P = self.params()
+      param_where = {k: v for k, v in where.items() if k in P.columns}
+      unknown = [k for k in where if k not in param_where and k != 'seed']
+      if unknown:
+        stored = self.stored_columns(table)
+        unknown = [k for k in unknown if k not in stored]
+      if unknown:
+        raise KeyError(f"where names neither a parameter nor a stored column of {table}: {', '.join(unknown)}")
+    keep = None
+    if param_where:
+      mask = np.ones(len(P), dtype = bool)
+      for k, cond in param_where.items():
+        mask &= np.asarray(_match(P[k].to_numpy(), cond), dtype = bool)
+      keep = set(P.index[mask])
+
+    out = []
+    for p in policies:
+      for h in _partitions(os.path.join(root, 'policy=' + p), 'param_hash'):
+        if param_hash is not None and h not in ([param_hash] if isinstance(param_hash, str) else list(param_hash)):
+          continue
+        if keep is not None and h not in keep:
+          continue
+        out.append((p, h))
+    return out
+
+  def query(self, columns = None, table = 'summaries', policy = None, param_hash = None, where = None, params = None):
+    """
+    Reads columns of table for the matching partitions as one DataFrame.
+    1. policy / param_hash: partition values (a value or a list)
+    2. where: {name: value or (op, value)}, op in ==, !=, <, <=, >, >=, in. Names of parameters prune partitions,
+       names of stored columns filter rows (only those columns are read), any other name raises KeyError
+    3. params: parameter names to attach as columns (their value for each row's param_hash)
+    columns = None reads every column. The result always has policy and param_hash columns (and seed).
+    """
+    if table not in TABLES:
+      raise ValueError(f"Unknown table: {table}")
+    where = where or {}
+    frames = []
+    P = self.params() if params else None
+    for p, h in self.select_partitions(table, policy = policy, param_hash = param_hash, where = where):
+      base = os.path.join(self.root, table, 'policy=' + p, 'param_hash=' + h)
+      key = 'seed' if table == 'trajectories' else 'part'
+      for part in _partitions(base, key):
+        if key == 'seed' and 'seed' in where and not _match(int(part), where['seed']):
+          continue
+        path = os.path.join(base, f'{key}={part}')
+        stored = [f[:-4] for f in sorted(os.listdir(path)) if f.endswith('.npy')]
+        row_where = {k: v for k, v in where.items() if k in stored}
+        wanted = stored if columns is None else [c for c in columns if c in stored]
+        load = list(dict.fromkeys(wanted + list(row_where) + (['seed'] if 'seed' in stored else [])))
+        data = {c: np.load(os.path.join(path, c + '.npy'), mmap_mode = 'r') for c in load}
+
+        n = len(next(iter(data.values()))) if data else 0
+        mask = np.ones(n, dtype = bool)
+        for k, cond in row_where.items():
+          mask &= np.asarray(_match(data[k], cond), dtype = bool)
+        if not mask.any():
+          continue
+
+        df = pd.DataFrame({c: np.asarray(data[c])[mask] for c in load if c in wanted or c == 'seed'})
+        if table == 'trajectories' and 'seed' not in df.columns:
+          df.insert(0, 'seed', int(part))
+        df.insert(0, 'param_hash', h)
+        df.insert(0, 'policy', p)
+        for name in params or []:
+          df[name] = P.loc[h, name]
+        frames.append(df)
+
+    if not frames:
+      return pd.DataFrame(columns = ['policy', 'param_hash', 'seed'] + list(columns or []) + list(params or []))
+    out = pd.concat(frames, ignore_index = True)
+    #parts where an action was never played have no column for it
+    freq = [c for c in (out.columns if columns is None else columns) if c in FREQ_COLUMNS]
+    for c in freq:
+      out[c] = out[c].fillna(0.0) if c in out.columns else 0.0
+    return out
@@ -1,5 +1,6 @@
 import numpy as np
 from .enums import Action
+from .qtable import DENSE_LIMIT, make_q_table
 
 
 def rl_bin(x, lo, high):
@@ -13,12 +14,24 @@ def rl_bin(x, lo, high):
   if x < high: return 1
   return 2
 
-def discretize_state(Parameters, State):
+#defender policies backed by a learning agent (agent.encode / select_action / update), see QLearner and tilecoding.LinearQLearner
+LEARNING_POLICIES = ('qlearn_v1', 'linear_v1')
+
+#shape of the default discretized state (it_comp, ot_comp, id_cap_bin, damage_bin, outage_bin)
+RL_STATE_SHAPE = (2, 2, 3, 3, 3)
+N_STATES = int(np.prod(RL_STATE_SHAPE))
+
+def discretize_state(Parameters, State, discretizer = None):
   """
-  Discretized State Tuple:
+  Returns the discretized state packed into a single integer index.
+  Default (discretizer = None) is the state tuple:
   (it_comp = 2, ot_comp = 2, id_cap_bin = 3, damage_bin = 3, outage_bin =3)
   2 x 2 x 3 x 3 x 3 = 108 possible states in which our defender agent needs learn to make action decisions in
+  packed as it_comp * 54 + ot_comp * 27 + id_cap_bin * 9 + damage_bin * 3 + outage_bin.
+  A discretize.Discretizer can be passed instead for finer bins or additional state variables.
   """
+  if discretizer is not None:
+    return discretizer.index(State)
 
   it_c = int(State['it_comp'])
   ot_c = int(State['ot_comp'])
@@ -27,7 +40,25 @@ def discretize_state(Parameters, State):
   damage_discrete = rl_bin(float(State['phys_damage']), float(Parameters['rl_damage_lo']), float(Parameters['rl_damage_high']))
   outage_discrete = rl_bin(float(State['outage']), float(Parameters['rl_outage_lo']), float(Parameters['rl_outage_high']))
 
-  return(it_c, ot_c, id_c_discrete, damage_discrete, outage_discrete)
+  return (((it_c * 2 + ot_c) * 3 + id_c_discrete) * 3 + damage_discrete) * 3 + outage_discrete
+
+def rl_bin_batch(x, lo, high):
+  """Vectorized rl_bin, lo and high may be scalars or per-environment arrays"""
+  return np.where(x < lo, 0, np.where(x < high, 1, 2))
+
+def discretize_state_batch(Parameters, States, discretizer = None):
+  """
+  Vectorized discretize_state for a batch of states (dict of arrays, see batch.py), returns packed indices.
+  With the default discretization the rl_* thresholds may also be per-environment arrays.
+  """
+  if discretizer is not None:
+    return discretizer.index_batch(States)
+
+  id_c_discrete = rl_bin_batch(States['id_cap'], Parameters['rl_id_cap_lo'], Parameters['rl_id_cap_high'])
+  damage_discrete = rl_bin_batch(States['phys_damage'], Parameters['rl_damage_lo'], Parameters['rl_damage_high'])
+  outage_discrete = rl_bin_batch(States['outage'], Parameters['rl_outage_lo'], Parameters['rl_outage_high'])
+
+  return np.ravel_multi_index((States['it_comp'], States['ot_comp'], id_c_discrete, damage_discrete, outage_discrete), RL_STATE_SHAPE)
 
 def rl_step_reward(Parameters, damage_step, phys_damage_next, outage_next, it_comp_end, ot_comp_end, action):
   loss = 0.0
@@ -46,16 +77,70 @@ def rl_step_reward(Parameters, damage_step, phys_damage_next, outage_next, it_co
 
   return -(float(loss) + float(cost))
 
+def rl_step_reward_batch(Parameters, damage_step, phys_damage_next, outage_next, it_comp_end, ot_comp_end, action):
+  """Vectorized rl_step_reward, every argument after Parameters is an array over environments"""
+  loss = (Parameters['rl_w_damage_step'] * damage_step
+          + Parameters['rl_w_outage'] * outage_next
+          + Parameters['rl_w_it_comp'] * it_comp_end
+          + Parameters['rl_w_ot_comp'] * ot_comp_end
+          + Parameters['rl_w_phys_damage'] * phys_damage_next)
+
+  cost = (Parameters.get('rl_cost_active', 0.0) * (action == Action.ACTIVE)
+          + Parameters.get('rl_cost_recover', 0.0) * (action == Action.RECOVER))
+
+  return -(loss + cost)
+
+def scheduled_epsilon(Parameters, n_steps):
+  """
+  Exploration rate after n_steps learning steps of the agent, by rl_epsilon_decay:
+  'none' = rl_epsilon, 'linear' = rl_epsilon down to rl_epsilon_min over rl_epsilon_decay_steps,
+  'exp' = rl_epsilon_min + (rl_epsilon - rl_epsilon_min) * exp(-n_steps / rl_epsilon_decay_steps).
+  Never above rl_epsilon, so greedy runs (rl_epsilon = 0) stay greedy. rl_epsilon may be a per-environment array.
+  """
+  eps = Parameters['rl_epsilon']
+  decay = Parameters.get('rl_epsilon_decay', 'none')
+  if decay == 'none':
+    return eps
+
+  lo = np.minimum(float(Parameters.get('rl_epsilon_min', 0.0)), eps)
+  scale = float(Parameters.get('rl_epsilon_decay_steps', 1))
+  if decay == 'linear':
+    return np.maximum(lo, eps - (eps - lo) * min(n_steps / scale, 1.0))
+  if decay == 'exp':
+    return lo + (eps - lo) * np.exp(-n_steps / scale)
+  raise ValueError(f"Unknown rl_epsilon_decay: {decay}")
+
+def learning_rates(Parameters, agent, s, a):
+  """
+  Counts the visits of (s, a) (scalars or arrays of transitions) in the agent and returns their step sizes, by rl_alpha_decay:
+  'none' = rl_alpha, 'visits' = max(rl_alpha_min, 1 / N(s, a)^rl_alpha_omega) with N(s, a) including this visit.
+  """
+  n = agent.count_visits(s, a)
+  decay = Parameters.get('rl_alpha_decay', 'none')
+  if decay == 'none':
+    return float(Parameters['rl_alpha'])
+  if decay == 'visits':
+    if n is None:
+      raise ValueError("rl_alpha_decay = 'visits' needs per-(s, a) visit counts (QLearner)")
+    return np.maximum(float(Parameters.get('rl_alpha_min', 0.0)), np.asarray(n, dtype = float) ** -float(Parameters.get('rl_alpha_omega', 0.8)))
+  raise ValueError(f"Unknown rl_alpha_decay: {decay}")
+
 def qlearn_update_step(Parameters, State, agent, s_pre, action, damage_step, it_comp_end, ot_comp_end):
   outage_next = float(State.get('outage', 0.0))
   phys_damage_next = float(State.get('phys_damage', 0.0))
   r = rl_step_reward(Parameters, damage_step, phys_damage_next, outage_next, it_comp_end, ot_comp_end, action)
 
-  s_post = discretize_state(Parameters, State)
+  s_post = agent.encode(Parameters, State)
 
   #ensure learning only occurs during training runs
   if int(Parameters.get('rl_learn', 1)) == 1:
-    agent.update(s_pre, int(action), r, s_post, alpha = float(Parameters['rl_alpha']), gamma = float(Parameters['rl_gamma']))
+    alpha = learning_rates(Parameters, agent, s_pre, int(action))
+    agent.update(s_pre, int(action), r, s_post, alpha = float(alpha), gamma = float(Parameters['rl_gamma']))
+
+    #experience replay, store the transition and learn from a mini-batch of past ones
+    if getattr(agent, 'replay', None) is not None:
+      agent.replay.add(s_pre, int(action), r, s_post)
+      agent.replay_update(int(Parameters.get('rl_replay_batch', 32)), int(Parameters.get('rl_replay_updates', 1)), float(Parameters['rl_alpha']), float(Parameters['rl_gamma']))
 
   return float(r)
 
@@ -63,27 +148,81 @@ def qlearn_update_step(Parameters, State, agent, s_pre, action, damage_step, it_
 class QLearner:
   """
   Class blueprint for an agent who implements Qlearn policy
+  States are the packed indices from discretize_state, by default the 108 state discretization.
+  Passing a discretize.Discretizer changes the state space, the Q-table is stored densely or sparsely
+  depending on its size (qtable.make_q_table).
   """
-  def __init__(self, n_actions = 3):
+  def __init__(self, n_actions = 3, replay = None, discretizer = None, dense_limit = DENSE_LIMIT):
     self.n_actions = n_actions
-    self.Q = {} #array that tracks the defender states for the Q-table
+    self.replay = replay #optional replay.ReplayBuffer, every transition is stored and replayed in mini-batches
+    self.discretizer = discretizer
+    self.n_states = N_STATES if discretizer is None else discretizer.n_states
+    self.Q = make_q_table(self.n_states, n_actions, dense_limit = dense_limit) #table that tracks the defender states for the Q-table
 
-  #if a one of the 108 state tuples isnt in the q-table yet, create a new row for that particular permutation of state variable values and add an array of 0s into the row
+    #running totals read by telemetry (number of updates and sum of |delta Q|)
+    self.n_updates = 0
+    self.abs_dq_total = 0.0
+
+    #per-(s, a) visit counts of the learning steps (replayed transitions are not visits), same storage as the Q-table
+    self.visits = make_q_table(self.n_states, n_actions, dense_limit = dense_limit)
+    self.n_steps = 0
+
+  #if a state isnt in the q-table yet, create a new row for it (a row of 0s) and count it as visited
   def row(self, s):
-    if s not in self.Q:
-      self.Q[s] = np.zeros(self.n_actions, dtype = float)
-    return self.Q[s]
+    return self.Q.row(s)
 
   #needed to add this since all states are not being touched during training, thus when select_action calls row(), it creates additional states-value pairs during evaluation
   def qvals(self,s):
-    return self.Q.get(s, np.zeros(self.n_actions, dtype = float))
+    return self.Q[s]
+
+  #state representation used by select_action/update, the packed discretized state index
+  def encode(self, Parameters, State):
+    return discretize_state(Parameters, State, self.discretizer)
+
+  def encode_batch(self, Parameters, States):
+    return discretize_state_batch(Parameters, States, self.discretizer)
+
+  #Q-values for an array of encoded states, shape (n, n_actions)
+  def q_batch(self, s):
+    return self.Q[s]
+
+  #number of states visited so far, logged as q_size
+  def n_visited(self):
+    return len(self.Q)
+
+  #dense (n_states, n_actions) copy of the Q-table, states never visited are left as 0s just like qvals()
+  def q_array(self):
+    return self.Q.to_array()
+
+  def count_visits(self, s, a):
+    """Adds one visit per transition (s, a scalars or arrays), returns N(s, a) after counting"""
+    if np.ndim(s) == 0:
+      row = self.visits.row(s)
+      row[a] += 1
+      self.n_steps += 1
+      return row[a]
+
+    s = np.asarray(s)
+    a = np.asarray(a)
+    flat, k = np.unique(s * self.n_actions + a, return_counts = True)
+    self.visits.add(flat // self.n_actions, flat % self.n_actions, k)
+    self.n_steps += int(s.shape[0])
+    return self.visits[s][np.arange(s.shape[0]), a]
+
+  def ucb_bonus(self, s):
+    #count-based exploration bonus sqrt(ln(N(s) + 1) / (N(s, a) + 1)) for a state or an array of states
+    n_sa = self.visits[s]
+    return np.sqrt(np.log(n_sa.sum(axis = -1, keepdims = True) + 1.0) / (n_sa + 1.0))
 
   #function to choose whether agent will either explore by randomly selecting a strategy with p = epsilon, or exploit the current best action choice with p = 1 - epsilon
-  def select_action(self, s, epsilon, rng):
+  #ucb_c > 0 adds ucb_c * ucb_bonus(s) to the Q-values before the greedy choice
+  def select_action(self, s, epsilon, rng, ucb_c = 0.0):
     if rng.random() < epsilon:
       return int(rng.integers(0, self.n_actions))
 
     q = self.qvals(s)
+    if ucb_c > 0:
+      q = q + ucb_c * self.ucb_bonus(s)
     best_actions = np.flatnonzero(q == q.max())
     return int(rng.choice(best_actions))
 
@@ -92,4 +231,44 @@ class QLearner:
     q = self.row(s)
     q_next = self.row(s_next)
     td_target = float(r) + float(gamma) * float(np.max(q_next)) # td_target = reward value at the current step plus discounted reward value at next step
-    q[a] = q[a] + float(alpha) * (td_target - q[a])
\ No newline at end of file
+    dq = float(alpha) * (td_target - q[a])
+    q[a] = q[a] + dq
+
+    self.n_updates += 1
+    self.abs_dq_total += abs(dq)
+
+  def update_batch(self, s, a, r, s_next, alpha, gamma, weights = None):
+    """
+    Vectorized update for arrays of transitions (packed state indices from discretize_state_batch).
+    All targets use the table as it was before this call (a synchronous update). When k transitions share the same
+    (s, a), their mean TD error is applied with step 1 - (1 - alpha)^k, which is what k sequential updates towards
+    the same target would give, so duplicates never overshoot.
+    alpha may be an array over transitions (learning_rates), transitions sharing an (s, a) share its step size.
+    weights (e.g. importance weights from prioritized replay) scale each transition's TD error.
+    Returns the unweighted TD errors.
+    """
+    s = np.asarray(s)
+    a = np.asarray(a)
+    td_target = r + gamma * self.Q[s_next].max(axis = 1)
+    td_error = td_target - self.Q[s][np.arange(s.shape[0]), a]
+
+    flat, inverse, counts = np.unique(s * self.n_actions + a, return_inverse = True, return_counts = True)
+    if np.ndim(alpha) > 0:
+      alpha_sa = np.empty(flat.shape[0])
+      alpha_sa[inverse] = alpha
+      alpha = alpha_sa
+    err_sum = np.bincount(inverse, weights = td_error if weights is None else td_error * weights, minlength = flat.shape[0])
+    step = (1.0 - (1.0 - alpha) ** counts) * (err_sum / counts)
+    self.Q.add(flat // self.n_actions, flat % self.n_actions, step)
+
+    self.n_updates += int(s.shape[0])
+    self.abs_dq_total += float(np.abs(step).sum())
+    self.Q.mark_visited(np.concatenate([s, np.asarray(s_next)]))
+    return td_error
+
+  def replay_update(self, batch_size, n_batches, alpha, gamma):
+    #mini-batch TD updates from the replay buffer, run between environment steps
+    for _ in range(int(n_batches)):
+      idx, s, a, r, s_next, w = self.replay.sample(batch_size)
+      td_error = self.update_batch(s, a, r, s_next, alpha, gamma, weights = w)
+      self.replay.update_priorities(idx, td_error)
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Deterministic replay log: store a run as its parameters, seed and actions, rebuild the rows on demand.
+
+A recorded run gives the policy its own random stream (sim_step(policy_rng =)), so the environment stream only
+depends on the seed and on the actions taken. The actions are packed 2 bits per step and every `every` steps
+the state and the environment rng state are checkpointed, so any step range can be rebuilt into the full
+sim_step row schema by replaying from the nearest checkpoint with the recorded actions (no agent needed).
+Learning runs also keep the change points of q_size, which is the only column that depends on the agent.
+
+A record is a few kilobytes against roughly 60 columns per step for the DataFrame. The split policy stream means
+record_run(P, seed) does not reproduce run_one(P, seed) draw for draw, only in distribution.
+"""
+from .state import make_initial_state
+from .rl import LEARNING_POLICIES
+from .sim import sim_step
+from .policies import make_policy
+from .schedules import check_stationary
+
+import hashlib
+import json
+import numpy as np
+
+
+def _plain(x):
+  #numpy scalars -> python scalars, so parameters survive a json round trip with their types
+  return x.item() if hasattr(x, 'item') else x
+
+def params_to_dict(Parameters):
+  return {str(k): _plain(v) for k, v in Parameters.items()}
+
+def param_hash(Parameters):
+  """sha256 of the parameters (sorted, json encoded), identifies the model configuration of a record"""
+  blob = json.dumps(params_to_dict(Parameters), sort_keys = True, default = str)
+  return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def pack_actions(actions):
+  #2 bits per step, 4 steps per byte
+  a = np.asarray(actions, dtype = np.uint8)
+  pad = (-len(a)) % 4
+  a = np.concatenate([a, np.zeros(pad, dtype = np.uint8)]).reshape(-1, 4)
+  return (a[:, 0] | (a[:, 1] << 2) | (a[:, 2] << 4) | (a[:, 3] << 6)).astype(np.uint8)
+
+def unpack_actions(packed, n):
+  p = np.asarray(packed, dtype = np.uint8)
+  a = np.stack([p & 3, (p >> 2) & 3, (p >> 4) & 3, (p >> 6) & 3], axis = 1).reshape(-1)
+  return a[:int(n)].astype(np.int64)
+
+
+class RunRecord:
+  """
+  Compact record of one run.
+  - params: parameter dict, param_hash: its hash (checked on load)
+  - seed: seed of the environment stream (the policy stream is spawned from it)
+  - T: number of steps, actions: packed action array (pack_actions)
+  - q_size: (step, q_size) change points for learning runs, empty otherwise
+  - checkpoints: list of (step, state dict, environment rng state) taken at the start of the step
+  """
+  def __init__(self, params, seed, T, actions, q_size, checkpoints, every):
+    self.params = dict(params)
+    self.param_hash = param_hash(self.params)
+    self.seed = int(seed)
+    self.T = int(T)
+    self.actions = np.asarray(actions, dtype = np.uint8)
+    self.q_size = np.asarray(q_size, dtype = np.int64).reshape(-1, 2)
+    self.checkpoints = list(checkpoints)
+    self.every = int(every)
+
+  def action_array(self, start = 0, stop = None):
+    #actions only, no replay needed
+    stop = self.T if stop is None else int(stop)
+    return unpack_actions(self.actions, self.T)[int(start):stop]
+
+  def rows(self, start = 0, stop = None):
+    """Rebuilds steps [start, stop) as the DataFrame run_sim would have returned for them"""
+    stop = self.T if stop is None else min(int(stop), self.T)
+    start = max(int(start), 0)
+    import pandas as pd
+    if start >= stop:
+      return pd.DataFrame()
+
+    P = dict(self.params)
+    actions = self.action_array()
+    k = max(i for i, c in enumerate(self.checkpoints) if c[0] <= start)
+    t, state, rng_state = self.checkpoints[k]
+    State = dict(state)
+    rng = np.random.default_rng()
+    rng.bit_generator.state = rng_state
+
+    rows = []
+    while t < stop:
+      sim_step(P, State, rng, t, rows, action = actions[t])
+      t += 1
+    df = pd.DataFrame(rows[start - self.checkpoints[k][0]:])
+
+    if P.get('defender_policy', 'always_passive') in LEARNING_POLICIES and len(self.q_size):
+      idx = np.searchsorted(self.q_size[:, 0], df['t'].to_numpy(), side = 'right') - 1
+      df['q_size'] = np.where(idx >= 0, self.q_size[np.maximum(idx, 0), 1], 0)
+    return df.reset_index(drop = True)
+
+  def to_dict(self):
+    return {
+      'params': self.params,
+      'param_hash': self.param_hash,
+      'seed': self.seed,
+      'T': self.T,
+      'actions': self.actions.tobytes().hex(),
+      'q_size': self.q_size.tolist(),
+      'checkpoints': [[int(t), s, r] for t, s, r in self.checkpoints],
+      'every': self.every,
+    }
+
+  @classmethod
+  def from_dict(cls, d):
+    rec = cls(d['params'], d['seed'], d['T'], np.frombuffer(bytes.fromhex(d['actions']), dtype = np.uint8),
+              d['q_size'], [tuple(c) for c in d['checkpoints']], d['every'])
+    if rec.param_hash != d['param_hash']:
+      raise ValueError("parameter hash does not match the stored parameters")
+    return rec
+
+  def save(self, path):
+    with open(path, 'w') as f:
+      json.dump(self.to_dict(), f)
+
+  @classmethod
+  def load(cls, path):
+    with open(path) as f:
+      return cls.from_dict(json.load(f))
+
+
+def record_run(Parameters, seed, agent = None, State = None, every = 1000):
+  """
+  Runs T steps like run_one and returns the RunRecord instead of the rows.
+  State defaults to make_initial_state(Parameters) and is updated in place. every is the checkpoint spacing,
+  rebuilding a range costs at most every extra steps.
+  """
+  check_stationary(Parameters, "record_run")
+  policy = Parameters.get('defender_policy', 'always_passive')
+  defender = make_policy(Parameters, agent = agent)
+  T = int(Parameters['T'])
+  every = max(int(every), 1)
+  State = make_initial_state(Parameters) if State is None else State
+
+  env_seed, policy_seed = np.random.SeedSequence(int(seed)).spawn(2)
+  rng = np.random.default_rng(env_seed)
+  policy_rng = np.random.default_rng(policy_seed)
+
+  actions = np.zeros(T, dtype = np.uint8)
+  q_size = []
+  checkpoints = []
+  rows = []
+  for t in range(T):
+    if t % every == 0:
+      checkpoints.append((t, {k: _plain(v) for k, v in State.items()}, rng.bit_generator.state))
+    sim_step(Parameters, State, rng, t, rows, agent = agent, policy_rng = policy_rng, defender = defender)
+    row = rows.pop()
+    actions[t] = row['action']
+    if policy in LEARNING_POLICIES and (not q_size or q_size[-1][1] != row['q_size']):
+      q_size.append((t, int(row['q_size'])))
+
+  return RunRecord(params_to_dict(Parameters), seed, T, pack_actions(actions), q_size, checkpoints, every)
@@ -0,0 +1,153 @@
+"""
+Time-varying parameter schedules.
+
+Any numeric parameter can hold a schedule instead of a constant, e.g.
+  P['p_attack'] = Piecewise([(0, 0.10), (5000, 0.60), (8000, 0.20)])   #attack campaign between t = 5000 and 8000
+  P['G'] = Periodic(0.6, 0.2, period = 2000)                            #governance cycling around 0.6
+  P['p_high_base'] = ArraySchedule(np.linspace(0.2, 0.5, T))           #explicit values, one per step
+  P['p_attack'] = lambda t: 0.1 + 0.4 * (t > 1000)                      #vectorized function of the step array
+compile_schedules evaluates every schedule once into a (T,) array, and the run loops (run_sim, run_batch,
+run_fleet) only write array[t] into their plain parameter dict each step. Plain arrays are not schedules,
+in the batched engine they are per-environment parameter values.
+Engines that assume stationary parameters (skip-ahead, mean-field, replay records, episodic training and
+self-play) reject scheduled parameters through check_stationary.
+"""
+import inspect
+import numpy as np
+
+
+class Schedule:
+  """Base class, subclasses implement values(t) for an array of steps t and to_dict() (a json spec, used for hashing)"""
+  def values(self, t):
+    raise NotImplementedError
+
+  def to_dict(self):
+    raise NotImplementedError
+
+  def compile(self, T):
+    v = np.asarray(self.values(np.arange(int(T))), dtype = float)
+    return np.broadcast_to(v, (int(T),)).copy()
+
+
+class Piecewise(Schedule):
+  """
+  (start step, value) pairs, the value holds from its start until the next start (the first value also holds
+  before its start). interp = 'linear' interpolates between the points instead.
+  """
+  def __init__(self, points, interp = 'step'):
+    points = sorted((int(t), float(v)) for t, v in points)
+    if not points:
+      raise ValueError("Piecewise schedule needs at least one point")
+    if interp not in ('step', 'linear'):
+      raise ValueError(f"Unknown interpolation: {interp}")
+    self.starts = np.array([p[0] for p in points])
+    self.levels = np.array([p[1] for p in points])
+    self.interp = interp
+
+  def values(self, t):
+    if self.interp == 'linear':
+      return np.interp(t, self.starts, self.levels)
+    return self.levels[np.maximum(np.searchsorted(self.starts, t, side = 'right') - 1, 0)]
+
+  def to_dict(self):
+    return {'type': 'Piecewise', 'points': [[int(t), float(v)] for t, v in zip(self.starts, self.levels)], 'interp': self.interp}
+
+  def __repr__(self):
+    return f"Piecewise({list(zip(self.starts.tolist(), self.levels.tolist()))}, interp = {self.interp!r})"
+
+class Periodic(Schedule):
+  """mean + amplitude * wave(2 pi (t + phase) / period), wave is a sine or a square wave (+1 for the first half of the period)"""
+  def __init__(self, mean, amplitude, period, phase = 0, shape = 'sine'):
+    if shape not in ('sine', 'square'):
+      raise ValueError(f"Unknown periodic shape: {shape}")
+    if float(period) <= 0:
+      raise ValueError("period must be positive")
+    self.mean, self.amplitude, self.period, self.phase, self.shape = float(mean), float(amplitude), float(period), float(phase), shape
+
+  def values(self, t):
+    x = (np.asarray(t) + self.phase) / self.period
+    wave = np.sin(2 * np.pi * x) if self.shape == 'sine' else np.where(x % 1.0 < 0.5, 1.0, -1.0)
+    return self.mean + self.amplitude * wave
+
+  def to_dict(self):
+    return {'type': 'Periodic', 'mean': self.mean, 'amplitude': self.amplitude, 'period': self.period,
+            'phase': self.phase, 'shape': self.shape}
+
+  def __repr__(self):
+    return f"Periodic({self.mean}, {self.amplitude}, period = {self.period}, phase = {self.phase}, shape = {self.shape!r})"
+
+class ArraySchedule(Schedule):
+  """explicit values, one per step (the last value holds if the run is longer)"""
+  def __init__(self, values):
+    self.array = np.asarray(values, dtype = float).ravel()
+    if self.array.size == 0:
+      raise ValueError("ArraySchedule needs at least one value")
+
+  def values(self, t):
+    return self.array[np.minimum(np.asarray(t), self.array.size - 1)]
+
+  def to_dict(self):
+    return {'type': 'ArraySchedule', 'values': self.array.tolist()}
+
+  def __repr__(self):
+    return f"ArraySchedule(<{self.array.size} values>)"
+
+class FunctionSchedule(Schedule):
+  """f(t) for the array of steps t, evaluated once"""
+  def __init__(self, f):
+    self.f = f
+
+  def values(self, t):
+    return self.f(t)
+
+  def to_dict(self):
+    #the function by its source (bytecode if the source is unavailable), defaults and closure values
+    try:
+      code = inspect.getsource(self.f)
+    except (OSError, TypeError):
+      code = self.f.__code__.co_code.hex()
+    return {'type': 'FunctionSchedule', 'function': f"{getattr(self.f, '__module__', '')}.{getattr(self.f, '__qualname__', '')}",
+            'code': code, 'defaults': list(getattr(self.f, '__defaults__', None) or ()),
+            'closure': [c.cell_contents for c in getattr(self.f, '__closure__', None) or ()]}
+
+  def __repr__(self):
+    return f"FunctionSchedule({getattr(self.f, '__name__', 'f')})"
+
+
+def as_schedule(value):
+  """value as a Schedule (Schedule instances and functions of t), None for anything else"""
+  if isinstance(value, Schedule):
+    return value
+  if callable(value):
+    return FunctionSchedule(value)
+  return None
+
+def compile_schedules(Parameters, T):
+  """{name: (T,) array} for every scheduled parameter, empty for a stationary configuration"""
+  out = {}
+  for k, v in Parameters.items():
+    s = as_schedule(v)
+    if s is not None:
+      out[k] = s.compile(T)
+  return out
+
+def has_schedules(Parameters):
+  return any(as_schedule(v) is not None for _, v in Parameters.items())
+
+def check_stationary(Parameters, what):
+  if has_schedules(Parameters):
+    raise ValueError(f"{what} does not support scheduled parameters")
+
+def scheduled_parameters(Parameters, T):
+  """
+  (plain dict copy of Parameters holding the step 0 values, compiled schedules), the loop then calls
+  apply_schedules(P, compiled, t) at the start of every step t
+  """
+  compiled = compile_schedules(Parameters, T)
+  P = dict(Parameters)
+  apply_schedules(P, compiled, 0)
+  return P, compiled
+
+def apply_schedules(P, compiled, t):
+  for k, v in compiled.items():
+    P[k] = v[t]
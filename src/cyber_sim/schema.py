@@ -0,0 +1,133 @@
+"""
+Compact schema for the run DataFrame.
+
+run_sim logs one dict per step, which pandas turns into int64/float64 columns and object strings. The compact
+schema stores the enum names as categoricals, the 0/1 flags as int8, optionally the continuous columns as
+float32, and moves the per-run constants (G, gov_mult, and q_size for non learning policies) into df.attrs.
+full_frame undoes it (up to float32 rounding), metrics accept either schema. run_sim builds the compact frame
+straight from its step dicts (compact_frame_from_rows), one typed column at a time, so the full frame never exists.
+pandas is only imported once a frame is converted, so importing this module (and run_sim) stays pandas-free.
+"""
+from .enums import Action, AttackTarget, Intensity
+
+import numpy as np
+
+#run_sim output: 'rows' is the list of per-step dicts, without building a DataFrame
+SCHEMAS = ('full', 'compact', 'compact32', 'rows')
+
+#categorical columns and their enum names
+CATEGORY_NAMES = {
+  'action_name': [a.name for a in Action],
+  'attack_name': [a.name for a in AttackTarget],
+  'intensity_name': [a.name for a in Intensity],
+}
+
+#0/1 flags and small enum codes
+INT8_COLUMNS = ('it_comp', 'ot_comp', 'action', 'attack', 'intensity', 'attack_success', 'it_comp_post_dc', 'ot_comp_post_dc',
+                'it_comp_end', 'ot_comp_end', 'it_detected', 'it_contained', 'ot_detected', 'ot_contained',
+                'it_comp_post', 'ot_comp_post', 'recovery_it_cleared', 'recovery_ot_cleared')
+
+#same value on every row of a run (unless G is scheduled, then they stay columns)
+CONSTANT_COLUMNS = ('G', 'gov_mult')
+
+
+def is_compact(df):
+  return bool(df.attrs.get('compact', False))
+
+def compact_frame(df, float32 = False):
+  """Returns df in the compact schema, float32 = True also stores the float columns in single precision"""
+  out = df.copy()
+  attrs = {'compact': True}
+
+  for c in CONSTANT_COLUMNS:
+    if c in out.columns and len(out) and (out[c] == out[c].iloc[0]).all():
+      attrs[c] = float(out[c].iloc[0])
+      out = out.drop(columns = c)
+  if 'q_size' in out.columns and out['q_size'].isna().all():
+    attrs['q_size'] = np.nan
+    out = out.drop(columns = 'q_size')
+
+  import pandas as pd
+  for c, names in CATEGORY_NAMES.items():
+    if c in out.columns:
+      out[c] = out[c].astype(pd.CategoricalDtype(names))
+  for c in INT8_COLUMNS:
+    if c in out.columns:
+      out[c] = out[c].astype(np.int8)
+  if 't' in out.columns:
+    out['t'] = out['t'].astype(np.int32)
+  if 'q_size' in out.columns:
+    out['q_size'] = out['q_size'].astype(np.int32)
+  if float32:
+    for c in out.columns[out.dtypes == np.float64]:
+      out[c] = out[c].astype(np.float32)
+
+  out.attrs.update(df.attrs)
+  out.attrs.update(attrs)
+  return out
+
+def compact_frame_from_rows(rows, float32 = False):
+  """compact_frame(pd.DataFrame(rows), float32) without building the full frame first"""
+  import pandas as pd
+  n = len(rows)
+  columns = list(rows[0]) if n else []
+  attrs = {'compact': True}
+  data = {}
+  for c in columns:
+    if c in CONSTANT_COLUMNS:
+      first = rows[0][c]
+      if all(r[c] == first for r in rows):
+        attrs[c] = float(first)
+        continue
+    if c in CATEGORY_NAMES:
+      code = {name: i for i, name in enumerate(CATEGORY_NAMES[c])}
+      codes = np.fromiter((code[r[c]] for r in rows), dtype = np.int8, count = n)
+      data[c] = pd.Categorical.from_codes(codes, dtype = pd.CategoricalDtype(CATEGORY_NAMES[c]))
+    elif c in INT8_COLUMNS:
+      data[c] = np.fromiter((r[c] for r in rows), dtype = np.int8, count = n)
+    elif c == 't':
+      data[c] = np.fromiter((r[c] for r in rows), dtype = np.int32, count = n)
+    else:
+      v = np.array([r[c] for r in rows])
+      if c == 'q_size':
+        if np.isnan(v.astype(float)).all():
+          attrs['q_size'] = np.nan
+          continue
+        v = v.astype(np.int32)
+      elif v.dtype.kind == 'U':
+        v = v.astype(object)
+      elif float32 and v.dtype == np.float64:
+        v = v.astype(np.float32)
+      data[c] = v
+
+  out = pd.DataFrame(data, copy = False)
+  out.attrs.update(attrs)
+  return out
+
+def full_frame(df):
+  """Inverse of compact_frame: restores the constant columns, python strings and 64 bit dtypes"""
+  if not is_compact(df):
+    return df
+  out = df.copy()
+  for c in CATEGORY_NAMES:
+    if c in out.columns:
+      out[c] = out[c].astype(str)
+  for c in out.columns:
+    if out[c].dtype.kind == 'i':
+      out[c] = out[c].astype(np.int64)
+    elif out[c].dtype.kind == 'f':
+      out[c] = out[c].astype(np.float64)
+  for i, c in enumerate(CONSTANT_COLUMNS):
+    if c in df.attrs:
+      out.insert(1 + i, c, float(df.attrs[c]))
+  if 'q_size' not in out.columns and 'q_size' in df.attrs:
+    pos = out.columns.get_loc('rl_reward') + 1 if 'rl_reward' in out.columns else len(out.columns)
+    out.insert(pos, 'q_size', float(df.attrs['q_size']))
+  out.attrs = {k: v for k, v in df.attrs.items() if k not in ('compact',) + CONSTANT_COLUMNS + ('q_size',)}
+  return out
+
+def column(df, name):
+  #column of either schema, per-run constants of the compact one come back as a scalar
+  if name in df.columns:
+    return df[name]
+  return df.attrs.get(name, np.nan)
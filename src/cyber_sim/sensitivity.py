@@ -0,0 +1,58 @@
+from .rl import LEARNING_POLICIES
+from .batch import batch_parameters, make_initial_batch_state, run_batch, summarize_batch, GroupedGenerator
+
+import numpy as np
+import pandas as pd
+
+
+def parameter_grid(**axes):
+  """
+  Builds the full cartesian product of one or more parameter axes, e.g.
+  parameter_grid(p_attack = np.linspace(0.05, 0.95, 10), G = [0.2, 0.6, 1.0])
+  Returns a dict of parameter name -> flat array, one entry per grid point.
+  """
+  names = list(axes)
+  mesh = np.meshgrid(*[np.asarray(axes[k], dtype = float) for k in names], indexing = 'ij')
+  return {k: m.ravel() for k, m in zip(names, mesh)}
+
+def sensitivity_curve(Parameters, grid, policy = None, agent = None, T = None, seed = 123, reps = 1, common = None):
+  """
+  Evaluates a policy at every point of a parameter grid in one batched pass (see batch.py).
+  1. grid is a dict of parameter name -> values of equal length (parameter_grid builds one from axes)
+  2. every grid point is simulated reps times for T steps, all grid points and reps step together
+  3. learning policies (qlearn_v1, linear_v1) are evaluated greedily with learning frozen, like eval_high_vs_low_threat
+  4. common (optional, one id per grid point): points with the same id run on common random numbers, replicate j of
+     each sharing its draws (batch.GroupedGenerator), so their differences carry less simulation noise
+  Returns a tidy DataFrame with one row per grid point: the grid values, the summarize_run metrics and the action mix.
+  """
+  P = Parameters.copy()
+  if policy is not None:
+    P['defender_policy'] = policy
+  if P.get('defender_policy') in LEARNING_POLICIES:
+    P['rl_learn'] = 0
+    P['rl_epsilon'] = 0.0
+
+  grid = {k: np.asarray(v, dtype = float).ravel() for k, v in grid.items()}
+  n_points = len(next(iter(grid.values())))
+  if any(len(v) != n_points for v in grid.values()):
+    raise ValueError("all grid axes must have the same number of points, use parameter_grid for a cartesian product")
+
+  #replicates of the same grid point are laid out next to each other
+  n = n_points * int(reps)
+  PB = batch_parameters(P, {k: np.repeat(v, reps) for k, v in grid.items()}, n = n)
+  SB = make_initial_batch_state(PB, n)
+  rng = np.random.default_rng(int(seed))
+  if common is not None:
+    common = np.asarray(common).ravel()
+    if common.shape[0] != n_points:
+      raise ValueError(f"common needs one id per grid point ({n_points}), got {common.shape[0]}")
+    _, ids = np.unique(common, return_inverse = True)
+    rng = GroupedGenerator(rng, np.repeat(ids, reps) * int(reps) + np.tile(np.arange(int(reps)), n_points))
+
+  acc = run_batch(PB, SB, rng, T = T, agent = agent)
+  summary = summarize_batch(acc)
+
+  df = pd.DataFrame(grid)
+  for k, v in summary.items():
+    df[k] = v.reshape(n_points, int(reps)).mean(axis = 1)
+  return df
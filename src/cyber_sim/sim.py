@@ -1,15 +1,18 @@
+from .enums import Action
 from .state import snapshot_state, make_initial_state
-from .rl import discretize_state, qlearn_update_step
-from .defender import apply_defender_action, choose_action
+from .schema import SCHEMAS, compact_frame_from_rows
+from .schedules import scheduled_parameters, apply_schedules
+from .rl import LEARNING_POLICIES, qlearn_update_step, rl_step_reward
+from .defender import apply_defender_action
+from .policies import make_policy
 from .attacker import sample_attacker_event, resolve_attack, p_high_given_idcap 
 from .dynamics import ot_physical_damage_step, downtime_update_step, recovery_resolution_step, outage_update_step, detection_and_containment_step
 
 
-import pandas as pd
 import numpy as np
 
 
-def sim_step(Parameters, State, rng, t, rows, agent = None):
+def sim_step(Parameters, State, rng, t, rows, agent = None, action = None, policy_rng = None, defender = None):
   """
   Simulation Loop event ordering is as follows:
   1. First, the defender chooses an action (PASSIVE, ACTIVE, or RECOVER) to play for the current timestep
@@ -20,14 +23,22 @@ def sim_step(Parameters, State, rng, t, rows, agent = None):
   6. downtime of defender infrastructure (represented by ot_layer) updates
   7. If in RECOVER, an additional step may clear compromise and reduce damage missed by the detection/containment step
   8. if policy = qlearn, run update_step method for q-learning
+  action forces the defender action instead of asking the policy (used to replay recorded runs, a learning policy
+  then needs no agent and rl_reward is computed without an update). policy_rng optionally gives the policy its own
+  random stream so that the environment draws do not depend on how many draws the policy made.
+  defender is the policy resolved once per run (policies.make_policy), None resolves it for this step.
   """
   pre = snapshot_state(Parameters, State, t)
 
   policy = Parameters.get('defender_policy', 'always_passive')
-  s_pre = discretize_state(Parameters, State) if policy == 'qlearn_v1' else None
+  s_pre = agent.encode(Parameters, State) if policy in LEARNING_POLICIES and agent is not None else None
 
   #defender action decision
-  action = choose_action(Parameters, State, rng, t, agent = agent)
+  if action is None:
+    defender = make_policy(Parameters, agent = agent) if defender is None else defender
+    action = Action(defender.decide(State, rng if policy_rng is None else policy_rng))
+  else:
+    action = Action(int(action))
 
   #Defender action effects
   B = apply_defender_action(Parameters, State, action)
@@ -65,10 +76,12 @@ def sim_step(Parameters, State, rng, t, rows, agent = None):
   outage_status = outage_update_step(Parameters, State)
   outage_end = float(State['outage'])
 
-  #additional learning step for Qlearn policy
+  #additional learning step for Qlearn (and linear) policy
   rl_reward = 0.0
-  if policy == 'qlearn_v1':
+  if policy in LEARNING_POLICIES and agent is not None:
     rl_reward = qlearn_update_step(Parameters, State, agent, s_pre = s_pre, action = action, damage_step = damage_step, it_comp_end = it_comp_end, ot_comp_end = ot_comp_end)
+  elif policy in LEARNING_POLICIES:
+    rl_reward = rl_step_reward(Parameters, damage_step, float(State['phys_damage']), outage_end, it_comp_end, ot_comp_end, action)
 
 
   #Log row for simulation data collection
@@ -118,7 +131,7 @@ def sim_step(Parameters, State, rng, t, rows, agent = None):
 
      #rl values
      'rl_reward' : rl_reward,
-     'q_size': len(agent.Q) if policy == 'qlearn_v1' else np.nan
+     'q_size': agent.n_visited() if policy in LEARNING_POLICIES and agent is not None else np.nan
 
     })
 
@@ -128,17 +141,47 @@ def sim_step(Parameters, State, rng, t, rows, agent = None):
   rows.append(row)
   return t + 1 #advance time
 
-def run_sim(Parameters, State, rng, agent = None):
+def run_sim(Parameters, State, rng, agent = None, telemetry = None, schema = 'full'):
+  """
+  Runs T timesteps and returns the log as a DataFrame.
+  telemetry (telemetry.Telemetry) optionally streams window aggregates every telemetry.every steps while the run is going.
+  schema = 'compact' returns the memory-lean schema of schema.compact_frame, 'compact32' also uses float32 columns,
+  'rows' returns the list of step dicts and never imports pandas (e.g. for SummaryAccumulator in light workers).
+  Scheduled parameters (schedules.py) are compiled once, the steps run on a plain dict copy of Parameters.
+  """
+  if schema not in SCHEMAS:
+    raise ValueError(f"Unknown schema: {schema}")
   rows_local = []
   t_local = 0
-
-  for _ in range(int(Parameters['T'])):
-    t_local = sim_step(Parameters, State, rng, t_local, rows_local, agent = agent)
-
+  T = int(Parameters['T'])
+  Parameters, compiled = scheduled_parameters(Parameters, T)
+  defender = make_policy(Parameters, agent = agent)
+
+  if telemetry is not None:
+    telemetry.start(Parameters, agent)
+
+  try:
+    for _ in range(T):
+      if compiled:
+        apply_schedules(Parameters, compiled, t_local)
+      t_local = sim_step(Parameters, State, rng, t_local, rows_local, agent = agent, defender = defender)
+      if telemetry is not None and t_local % telemetry.every == 0:
+        telemetry.emit(Parameters, rows_local, agent, t_local)
+  finally:
+    #also when a step raises: the steps logged so far are flushed and the file is released
+    if telemetry is not None:
+      telemetry.close(Parameters, rows_local, agent, t_local)
+
+  if schema == 'rows':
+    return rows_local
+
+  if schema != 'full':
+    return compact_frame_from_rows(rows_local, float32 = schema == 'compact32')
+  import pandas as pd
   return pd.DataFrame(rows_local)
 
 
-def run_one(Parameters, seed, policy, T, agent, learn=None, epsilon=None):
+def run_one(Parameters, seed, policy, T, agent, learn=None, epsilon=None, telemetry=None, schema='full'):
   P = Parameters.copy()
   P['Seed'] = int(seed)
   P['T'] = int(T)
@@ -150,4 +193,4 @@ def run_one(Parameters, seed, policy, T, agent, learn=None, epsilon=None):
 
   local_rng = np.random.default_rng(int(P['Seed']))
   S0 = make_initial_state(P)
-  return run_sim(P, S0, local_rng, agent = agent)
\ No newline at end of file
+  return run_sim(P, S0, local_rng, agent = agent, telemetry = telemetry, schema = schema)
\ No newline at end of file
@@ -0,0 +1,192 @@
+"""
+Event-driven (skip-ahead) version of run_sim for quiet periods.
+
+A step is quiet when nothing is compromised, no attack occurs and the policy plays PASSIVE. Nothing random
+happens in a quiet step (detection and recovery only act on compromises), and the state follows closed forms:
+vulnerabilities move linearly until clipped, phys_damage decays geometrically, downtime and outage are linear
+recurrences driven by that decay. So instead of stepping, we draw the geometric number of attack-free steps and
+jump over all of them in one go, evaluating the closed forms (and the policy, to check it keeps playing PASSIVE)
+only as arrays. Steps where something random can happen (an attack, an open compromise, a non PASSIVE action)
+are simulated explicitly with sim_step.
+
+The summary statistics are exact, i.e. have the same distribution as summarize_run(run_sim(...)),
+only the random number stream differs. Needs a deterministic policy: always_passive, threshold_v1,
+or a frozen greedy learning agent (rl_learn = 0, rl_epsilon = 0).
+"""
+from .enums import Action
+from .utils import clip01
+from .state import gov_mult
+from .rl import LEARNING_POLICIES
+from .sim import sim_step
+from .policies import make_policy
+from .schedules import check_stationary
+
+import numpy as np
+
+#longest quiet run evaluated in one go, longer ones are split (the attack process is memoryless)
+MAX_SKIP = 4096
+
+SKIP_POLICIES = ('always_passive', 'threshold_v1') + LEARNING_POLICIES
+
+
+def check_skipahead(Parameters, agent = None):
+  #raises if the closed forms or the policy check do not hold for these parameters
+  check_stationary(Parameters, "skip-ahead")
+  policy = Parameters.get('defender_policy', 'always_passive')
+  if policy not in SKIP_POLICIES:
+    raise ValueError(f"skip-ahead needs a deterministic policy, got {policy}")
+  if policy in LEARNING_POLICIES:
+    if agent is None:
+      raise ValueError("Q-learning policy requires an agent instance")
+    if int(Parameters.get('rl_learn', 1)) != 0 or float(Parameters['rl_epsilon']) != 0.0:
+      raise ValueError("skip-ahead needs a frozen greedy agent (rl_learn = 0, rl_epsilon = 0)")
+  if not 0.0 <= float(Parameters.get('damage_persistence', 1.0)) <= 1.0:
+    raise ValueError("skip-ahead needs 0 <= damage_persistence <= 1")
+  if float(Parameters.get('downtime_decay', 0.0)) < 0.0:
+    raise ValueError("skip-ahead needs downtime_decay >= 0")
+
+
+def _power_sum(p, j):
+  #sum_{i < j} p^i
+  if p == 1.0:
+    return j.astype(float)
+  return (1.0 - p ** j) / (1.0 - p)
+
+def _mixed_sum(q, p, j):
+  #sum_{i < j} q^(j-1-i) p^i
+  if np.isclose(q, p):
+    return j * p ** np.maximum(j - 1, 0)
+  return (q ** j - p ** j) / (q - p)
+
+def quiet_trajectory(Parameters, State, n):
+  """
+  States at the start of the next n + 1 quiet steps (j = 0 ... n) as a dict of arrays, in closed form.
+  outage is returned unclipped, the caller has to stop before it exceeds 1.
+  """
+  j = np.arange(n + 1)
+  gm = gov_mult(Parameters)
+  p = float(Parameters.get('damage_persistence', 1.0))
+  q = 1.0 - float(Parameters.get('outage_decay', 0.60))
+  pd0 = float(State['phys_damage'])
+
+  traj = {
+    'it_vuln': clip01(float(State['it_vuln']) - j * (gm * float(Parameters['delta_it_vuln']))),
+    'ot_vuln': clip01(float(State['ot_vuln']) - j * (gm * float(Parameters['delta_ot_vuln']))),
+    'id_cap': clip01(float(State['id_cap']) + j * (gm * float(Parameters['delta_id_cap']))),
+    'it_comp': np.zeros(n + 1, dtype = np.int64),
+    'ot_comp': np.zeros(n + 1, dtype = np.int64),
+    'phys_damage': pd0 * p ** j,
+  }
+  #downtime increments c * pd_j - decay never increase, so the max(0, .) of every step collapses into one
+  traj['downtime'] = np.maximum(0.0, float(State['downtime'])
+                                + float(Parameters['downtime_damage_cost']) * pd0 * _power_sum(p, j)
+                                - j * float(Parameters.get('downtime_decay', 0.0)))
+  #outage_{j+1} = q * outage_j + outage_damage_cost * pd_{j+1}
+  traj['outage'] = (q ** j * float(State['outage'])
+                    + float(Parameters.get('outage_damage_cost', 0.20)) * pd0 * p * _mixed_sum(q, p, j))
+  return traj
+
+def quiet_passive(Parameters, traj, agent = None):
+  """Boolean array, True where the policy plays PASSIVE for sure (no random tie-break) in the trajectory state"""
+  policy = Parameters.get('defender_policy', 'always_passive')
+  n = traj['it_comp'].shape[0]
+  if policy == 'always_passive':
+    return np.ones(n, dtype = bool)
+  if policy in LEARNING_POLICIES:
+    q = agent.q_batch(agent.encode_batch(Parameters, traj))
+    return q[:, int(Action.PASSIVE)] > np.delete(q, int(Action.PASSIVE), axis = 1).max(axis = 1)
+  #threshold_v1 is deterministic, the rng is never used
+  return make_policy(Parameters, agent = agent).decide_batch(traj, None) == Action.PASSIVE
+
+
+def quiet_now(Parameters, State, agent = None):
+  #scalar version of quiet_passive for the current state, avoids building a trajectory when the policy is not PASSIVE
+  policy = Parameters.get('defender_policy', 'always_passive')
+  if policy == 'always_passive':
+    return True
+  if policy in LEARNING_POLICIES:
+    q = agent.qvals(agent.encode(Parameters, State))
+    return bool(q[int(Action.PASSIVE)] > np.delete(q, int(Action.PASSIVE)).max())
+  return make_policy(Parameters, agent = agent).decide(State, None) == Action.PASSIVE
+
+
+def run_skipahead(Parameters, State, rng, agent = None):
+  """
+  Runs T timesteps like run_sim but jumps over quiet periods, State is updated in place.
+  Returns the summarize_run dict for the run, plus explicit_steps (number of steps that were simulated).
+  """
+  check_skipahead(Parameters, agent = agent)
+  T = int(Parameters['T'])
+  policy = Parameters.get('defender_policy', 'always_passive')
+  p_attack = float(Parameters['p_attack'])
+  learning = policy in LEARNING_POLICIES
+
+  #the step right after an attack-free run is conditioned on the attack happening
+  P_attack = Parameters.copy()
+  P_attack['p_attack'] = 1.0
+
+  w_outage = float(Parameters['rl_w_outage']) if learning else 0.0
+  w_phys = float(Parameters['rl_w_phys_damage']) if learning else 0.0
+  tot = {'reward': 0.0, 'outage': 0.0, 'damage_step': 0.0, 'it_comp': 0, 'ot_comp': 0, 'explicit': 0}
+  action_counts = np.zeros(len(Action), dtype = np.int64)
+  rows = []
+
+  def explicit_step(P, t):
+    sim_step(P, State, rng, t, rows, agent = agent)
+    row = rows.pop()
+    tot['reward'] += row['rl_reward']
+    tot['outage'] += row['outage_next']
+    tot['damage_step'] += row['damage_step']
+    tot['it_comp'] += row['it_comp_end']
+    tot['ot_comp'] += row['ot_comp_end']
+    tot['explicit'] += 1
+    action_counts[row['action']] += 1
+    return t + 1
+
+  t = 0
+  while t < T:
+    if int(State['it_comp']) == 1 or int(State['ot_comp']) == 1 or not quiet_now(Parameters, State, agent = agent):
+      t = explicit_step(Parameters, t)
+      continue
+
+    #number of attack-free steps before the next attack
+    gap = rng.geometric(p_attack) - 1 if p_attack > 0 else np.inf
+    n = int(min(gap, T - t, MAX_SKIP))
+    traj = quiet_trajectory(Parameters, State, n + 1)
+
+    #a step is quiet if the policy plays PASSIVE and outage stays below its clip at 1, the stopping point (first
+    #step that is not) is a function of the state only, so the attack process before it is untouched:
+    #an attack strictly before it is the one drawn by gap, at or after it the step is simulated from scratch
+    ok = quiet_passive(Parameters, {k: v[:n + 1] for k, v in traj.items()}, agent = agent) & (traj['outage'][1:] <= 1.0)
+    stop = int(np.argmin(ok)) if not ok.all() else n + 1
+    m = min(stop, n)
+
+    if m > 0:
+      outage = traj['outage'][1:m + 1]
+      damage = traj['phys_damage'][1:m + 1]
+      tot['outage'] += float(outage.sum())
+      tot['reward'] -= float(w_outage * outage.sum() + w_phys * damage.sum())
+      action_counts[int(Action.PASSIVE)] += m
+      for k in ('it_vuln', 'ot_vuln', 'id_cap', 'downtime', 'phys_damage', 'outage'):
+        State[k] = float(traj[k][m])
+      t += m
+
+    if t >= T:
+      break
+    if stop <= n:
+      t = explicit_step(Parameters, t)
+    elif n == gap:
+      t = explicit_step(P_attack, t)
+    #otherwise the run was cut by MAX_SKIP, keep going (the attack process is memoryless)
+
+  out = {
+    'mean_reward': tot['reward'] / T,
+    'mean_outage': tot['outage'] / T,
+    'mean_damage_step': tot['damage_step'] / T,
+    'time_it_comp': tot['it_comp'] / T,
+    'time_ot_comp': tot['ot_comp'] / T,
+    'action_freq': {Action(a).name: c / T for a, c in sorted(enumerate(action_counts.tolist()), key = lambda x: -x[1]) if c > 0},
+    'q_size_end': float(agent.n_visited()) if learning else np.nan,
+    'explicit_steps': tot['explicit'],
+  }
+  return out
@@ -1,8 +1,8 @@
 from .utils import clip01
-import pandas as pd
 
 def make_initial_state(Parameters):
-  return pd.Series({
+  #plain dict of the state variables, updated in place by the step functions
+  return {
     'it_vuln' : clip01(Parameters['it_vuln_init']),
     'ot_vuln' : clip01(Parameters['ot_vuln_init']),
     'id_cap' : clip01(Parameters['id_cap_init']),
@@ -13,7 +13,7 @@ def make_initial_state(Parameters):
     "downtime" : float(Parameters['downtime_init']),
     "phys_damage" : float(Parameters['phys_damage_init']),
     "outage" : float(Parameters['outage_init']),
-    })
+    }
 
 def gov_mult(Parameters):
   #baseline government multiplier = 0.5 + 0.5 * G
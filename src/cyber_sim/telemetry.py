@@ -0,0 +1,86 @@
+import json
+import time
+
+from .enums import Action
+from .rl import LEARNING_POLICIES, scheduled_epsilon
+
+
+class Telemetry:
+  """
+  Streams per-window aggregates of a running simulation to a JSONL file and/or a callback.
+  run_sim calls emit() every `every` steps, the window statistics are computed from the rows already
+  logged by sim_step, so the only per-step cost is the modulo check in the run loop.
+  Each record contains: t, steps, steps_per_sec, mean_reward, mean_outage, action_mix,
+  mean_abs_dq (mean |delta Q| per update), states_visited and epsilon.
+  """
+  def __init__(self, every = 1000, path = None, callback = None):
+    if int(every) <= 0:
+      raise ValueError("telemetry window must be a positive number of steps")
+    self.every = int(every)
+    self.path = path
+    self.callback = callback
+    self.records = [] #kept in memory as well, handy for plotting learning curves after the run
+    self._file = None
+
+  def start(self, Parameters, agent):
+    if self.path is not None and self._file is None:
+      self._file = open(self.path, 'a', encoding = 'utf-8')
+
+    self._t_last = 0
+    self._clock_last = time.perf_counter()
+    self._updates_last = getattr(agent, 'n_updates', 0)
+    self._dq_last = getattr(agent, 'abs_dq_total', 0.0)
+
+  def emit(self, Parameters, rows, agent, t):
+    n = t - self._t_last
+    if n <= 0:
+      return None
+
+    window = rows[-n:]
+    now = time.perf_counter()
+    counts = [0] * len(Action)
+    reward = 0.0
+    outage = 0.0
+    for row in window:
+      counts[row['action']] += 1
+      reward += row['rl_reward']
+      outage += row['outage_next']
+
+    rec = {
+      't': int(t),
+      'steps': int(n),
+      'steps_per_sec': float(n / max(now - self._clock_last, 1e-12)),
+      'mean_reward': reward / n,
+      'mean_outage': outage / n,
+      'action_mix': {a.name: counts[int(a)] / n for a in Action},
+      'mean_abs_dq': None,
+      'states_visited': None,
+      'epsilon': float(scheduled_epsilon(Parameters, getattr(agent, 'n_steps', 0))) if Parameters.get('defender_policy') in LEARNING_POLICIES else None,
+    }
+
+    if agent is not None:
+      n_updates = agent.n_updates - self._updates_last
+      rec['mean_abs_dq'] = (agent.abs_dq_total - self._dq_last) / n_updates if n_updates > 0 else 0.0
+      rec['states_visited'] = agent.n_visited()
+      self._updates_last = agent.n_updates
+      self._dq_last = agent.abs_dq_total
+
+    self._t_last = t
+    self._clock_last = now
+    self.records.append(rec)
+
+    if self._file is not None:
+      self._file.write(json.dumps(rec) + '\n')
+      self._file.flush() #flush every window so the file can be tailed during long runs
+    if self.callback is not None:
+      self.callback(rec)
+    return rec
+
+  def close(self, Parameters, rows, agent, t):
+    #emit the last partial window and release the file, even if that emit fails
+    try:
+      self.emit(Parameters, rows, agent, t)
+    finally:
+      if self._file is not None:
+        self._file.close()
+        self._file = None
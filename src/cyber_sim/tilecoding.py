@@ -0,0 +1,143 @@
+from .discretize import DEFAULT_RANGES
+
+import numpy as np
+
+#odd 64-bit constant used to finish the hash (splitmix64 finalizer)
+_MIX = np.uint64(0xBF58476D1CE4E5B9)
+
+
+class TileCoder:
+  """
+  Tile coding over the continuous state variables, hashed into a fixed number of weights.
+  1. each of n_tilings grids covers ranges[k] with `tiles` tiles per variable, offset from each other by the
+     asymmetric displacement (1, 3, 5, ...) / n_tilings of a tile
+  2. the active tile of every tiling is hashed, together with the tiling number and the compromise flags, into [0, size)
+  So every state activates exactly n_tilings features, and memory is size * n_actions whatever the resolution.
+  Values outside ranges fall into the edge tiles.
+  """
+  #every continuous variable except downtime, an unbounded stock that never feeds back into the dynamics,
+  #so it is left out unless asked for
+  def __init__(self, variables = ('it_vuln', 'ot_vuln', 'id_cap', 'phys_damage', 'outage'),
+               n_tilings = 8, tiles = 8, size = 2 ** 16, ranges = None, flags = ('it_comp', 'ot_comp'), seed = 0):
+    ranges = dict(DEFAULT_RANGES, **(ranges or {}))
+    self.variables = tuple(variables)
+    self.flags = tuple(flags)
+    self.n_tilings = int(n_tilings)
+    self.size = int(size)
+
+    d = len(self.variables)
+    tiles = [int(tiles.get(k, 8)) for k in self.variables] if isinstance(tiles, dict) else [int(tiles)] * d
+    self.tiles = np.array(tiles, dtype = float)
+    self.lo = np.array([ranges[k][0] for k in self.variables], dtype = float)
+    self.span = np.array([ranges[k][1] - ranges[k][0] for k in self.variables], dtype = float)
+
+    #offsets[t, j] = t * (2j + 1) / n_tilings (in units of one tile), wrapped into [0, 1)
+    t = np.arange(self.n_tilings)[:, None]
+    j = np.arange(d)[None, :]
+    self.offsets = ((t * (2 * j + 1)) % self.n_tilings) / self.n_tilings
+
+    #random odd multipliers for the hash, one per variable, per flag and one for the tiling number
+    rng = np.random.default_rng(seed)
+    mult = rng.integers(1, 2 ** 62, size = d + len(self.flags) + 1, dtype = np.uint64) * np.uint64(2) + np.uint64(1)
+    self._mult_vars = mult[:d]
+    self._mult_flags = mult[d:-1]
+    self._tiling_hash = np.arange(self.n_tilings, dtype = np.uint64) * mult[-1]
+
+  def tiles_batch(self, States):
+    """Active feature indices for a batch of states (dict of arrays), shape (n, n_tilings)"""
+    X = np.stack([np.asarray(States[k], dtype = float) for k in self.variables], axis = -1)
+    u = np.clip((X - self.lo) / self.span, 0.0, 1.0 - 1e-9) * self.tiles
+    coords = np.floor(u[:, None, :] + self.offsets[None, :, :]).astype(np.uint64)
+
+    h = (coords * self._mult_vars).sum(axis = 2, dtype = np.uint64) + self._tiling_hash
+    for k, m in zip(self.flags, self._mult_flags):
+      h += np.asarray(States[k]).astype(np.uint64)[:, None] * m
+    h ^= h >> np.uint64(31)
+    h *= _MIX
+    h ^= h >> np.uint64(29)
+    return (h % np.uint64(self.size)).astype(np.int64)
+
+  def tiles_one(self, State):
+    return self.tiles_batch({k: np.array([State[k]]) for k in self.variables + self.flags})[0]
+
+
+class LinearQLearner:
+  """
+  Linear action-value agent, Q(s, a) = sum of w[i, a] over the active tiles i of s (TileCoder).
+  Learns with semi-gradient Q-learning, each active weight moves by alpha / n_tilings * td_error.
+  Used by the linear_v1 defender policy, with the same rl_alpha/rl_gamma/rl_epsilon parameters as qlearn_v1.
+  """
+  def __init__(self, n_actions = 3, coder = None):
+    self.n_actions = n_actions
+    self.coder = TileCoder() if coder is None else coder
+    self.w = np.zeros((self.coder.size, n_actions), dtype = float)
+    self.touched = np.zeros(self.coder.size, dtype = bool)
+    self.replay = None #replay buffers store discrete state indices, not supported for function approximation
+
+    #running totals read by telemetry (number of updates and sum of |delta Q|)
+    self.n_updates = 0
+    self.abs_dq_total = 0.0
+    self.n_steps = 0 #learning steps, drives rl_epsilon_decay
+
+  def encode(self, Parameters, State):
+    return self.coder.tiles_one(State)
+
+  def encode_batch(self, Parameters, States):
+    return self.coder.tiles_batch(States)
+
+  def qvals(self, phi):
+    return self.w[phi].sum(axis = 0)
+
+  def q_batch(self, phi):
+    return self.w[phi].sum(axis = 1)
+
+  #number of weight rows that have been updated at least once, logged as q_size
+  def n_visited(self):
+    return int(np.count_nonzero(self.touched))
+
+  def count_visits(self, phi, a):
+    #only the number of learning steps, there are no per-(s, a) counts for tile features
+    self.n_steps += 1 if np.ndim(a) == 0 else int(np.shape(a)[0])
+    return None
+
+  def select_action(self, phi, epsilon, rng):
+    if rng.random() < epsilon:
+      return int(rng.integers(0, self.n_actions))
+
+    q = self.qvals(phi)
+    best_actions = np.flatnonzero(q == q.max())
+    return int(rng.choice(best_actions))
+
+  def update(self, phi, a, r, phi_next, alpha, gamma):
+    td_target = float(r) + float(gamma) * float(np.max(self.qvals(phi_next)))
+    td_error = td_target - float(self.qvals(phi)[a])
+    step = float(alpha) / self.coder.n_tilings * td_error
+    np.add.at(self.w[:, a], phi, step)
+    self.touched[phi] = True
+
+    self.n_updates += 1
+    self.abs_dq_total += abs(step) * self.coder.n_tilings
+
+  def update_batch(self, phi, a, r, phi_next, alpha, gamma, weights = None):
+    """
+    Vectorized semi-gradient update for a batch of transitions, phi is (n, n_tilings).
+    Like QLearner.update_batch, contributions to the same weight are averaged and applied with step
+    (1 - (1 - alpha)^k) / n_tilings, so that many environments hitting one tile never overshoot
+    (a single transition gets alpha / n_tilings, the same as update).
+    Returns the TD errors.
+    """
+    a = np.asarray(a)
+    n, m = phi.shape
+    td_target = r + gamma * self.q_batch(phi_next).max(axis = 1)
+    td_error = td_target - self.q_batch(phi)[np.arange(n), a]
+    err = td_error if weights is None else td_error * weights
+
+    flat, inverse, counts = np.unique((phi * self.n_actions + a[:, None]).ravel(), return_inverse = True, return_counts = True)
+    err_sum = np.bincount(inverse, weights = np.repeat(err, m), minlength = flat.shape[0])
+    step = (1.0 - (1.0 - alpha) ** counts) / m * (err_sum / counts)
+    self.w.reshape(-1)[flat] += step
+    self.touched[flat // self.n_actions] = True
+
+    self.n_updates += n
+    self.abs_dq_total += float(np.abs(step).sum())
+    return td_error
@@ -8,5 +8,5 @@ def add_kv_pairs(P, kvs):
 
   items = kvs.items() if hasattr(kvs, 'items') else kvs
   for k, v in items:
-        if k not in P.index:
+        if k not in P:
             P[k] = v
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+#the package is not installed, tests import it from src/ like the scripts do with PYTHONPATH=src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
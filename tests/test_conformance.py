@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from cyber_sim.conformance import (
+    EXACT_ENGINES, DISTRIBUTION_ENGINES, SUMMARY_ENGINES, load_golden, check_exact, check_distribution,
+    check_summary, check_replay,
+)
+
+# recorded with: scripts/check_conformance.py record tests/golden --corners base high_threat compromised_start
+#                --steps 60 --reps 100 --dist_steps 30
+GOLDEN = os.path.join(os.path.dirname(__file__), "golden")
+
+
+@pytest.fixture(scope="module")
+def golden():
+    return load_golden(GOLDEN)
+
+
+@pytest.mark.parametrize("name", list(EXACT_ENGINES))
+def test_exact_engines(golden, name):
+    report = check_exact(golden, EXACT_ENGINES[name])
+    assert report["ok"].all(), report[~report["ok"]].to_string()
+
+
+@pytest.mark.parametrize("name", list(DISTRIBUTION_ENGINES))
+def test_distribution_engines(golden, name):
+    summary, _ = check_distribution(golden, DISTRIBUTION_ENGINES[name])
+    assert summary["ok"].all(), summary.to_string()
+
+
+@pytest.mark.parametrize("name", list(SUMMARY_ENGINES))
+def test_summary_engines(golden, name):
+    summary, _ = check_summary(golden, SUMMARY_ENGINES[name])
+    assert summary["ok"].all(), summary.to_string()
+    # only the cases an engine cannot run (skip-ahead: random and epsilon-greedy policies) may be skipped
+    assert (summary["skipped"] == "").sum() >= len(golden) // 2
+
+
+def test_record_run_replay(golden):
+    report = check_replay(golden)
+    assert report["ok"].all(), report[~report["ok"]].to_string()
@@ -0,0 +1,18 @@
+import numpy as np
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.fleet import run_fleet
+
+
+def test_site_params_set_per_site_initial_state():
+    P = apply_defaults(default_parameters())
+    P["defender_policy"] = "always_passive"
+    P["p_attack"] = 0.0  # no attacks, so the compromise flags only reflect the initial state
+    P["p_detect_base"] = 0.0
+    site_params = {"ot_comp_init": [0.0, 1.0], "it_vuln_init": [0.1, 0.9]}
+
+    sites, _ = run_fleet(P, 2, np.random.default_rng(0), T=5, rho=0.0, site_params=site_params)
+
+    assert sites["it_vuln_init"].tolist() == [0.1, 0.9]
+    assert sites["time_ot_comp"].iloc[0] == 0.0
+    assert sites["time_ot_comp"].iloc[1] == 1.0
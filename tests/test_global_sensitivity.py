@@ -0,0 +1,31 @@
+import numpy as np
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.batch import GroupedGenerator
+from cyber_sim.global_sensitivity import default_bounds, sobol_indices
+
+
+def test_grouped_generator_shares_draws_within_groups():
+    rng = GroupedGenerator(np.random.default_rng(0), [0, 1, 0, 2, 1])
+    u = rng.random(5)
+    assert u[0] == u[2] and u[1] == u[4] and len(set(u.tolist())) == 3
+    v = rng.random((3, 5))
+    assert np.array_equal(v[:, 0], v[:, 2])
+    q = rng.random((5, 3))
+    assert np.array_equal(q[1], q[4])
+    a = rng.integers(0, 1000, size=5)
+    assert a[0] == a[2]
+
+
+def test_sobol_total_index_of_an_inert_parameter_is_zero():
+    # always_passive never recovers, so delta_recover_clear cannot move the output
+    P = apply_defaults(default_parameters())
+    bounds = default_bounds(P, ["p_attack", "delta_recover_clear"])
+    kw = dict(n=128, T=100, policy="always_passive", metrics=("mean_outage",), n_boot=100)
+    ST = sobol_indices(P, bounds, **kw).loc["mean_outage", "ST"]
+    assert ST["delta_recover_clear"] < 1e-12
+    assert ST["p_attack"] > 0.1
+
+    # independent noise in every row shows up as a large total index
+    ST = sobol_indices(P, bounds, crn=False, **kw).loc["mean_outage", "ST"]
+    assert ST["delta_recover_clear"] > 0.1
@@ -0,0 +1,22 @@
+import numpy as np
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.hpsearch import hyperband, successive_halving
+
+
+def test_hyperband_brackets_end_at_max_steps():
+    # 1000 / 3^3 truncates to 37 and 37 * 27 = 999, every bracket must still train its last rung to max_steps
+    P = apply_defaults(default_parameters())
+    history, best = hyperband(P, 1000, min_steps=37, eta=3, eval_steps=10, eval_envs=2, seed=3)
+    for bracket, h in history.groupby('bracket'):
+        last = h[h['rung'] == h['rung'].max()]
+        assert (last['steps'] == 1000).all(), bracket
+        assert np.all(np.diff(h.groupby('rung')['steps'].max().to_numpy()) > 0)
+    assert best.steps == 1000
+
+
+def test_successive_halving_single_config_reaches_max_steps():
+    P = apply_defaults(default_parameters())
+    history, best = successive_halving(P, [{}], 10, max_steps=95, eta=3, eval_steps=10, eval_envs=2)
+    assert history['steps'].tolist() == [10, 31, 95]
+    assert best.steps == 95
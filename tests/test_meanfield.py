@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.batch import batch_parameters, make_initial_batch_state, batch_step, run_batch, summarize_batch
+from cyber_sim.policies import make_policy
+from cyber_sim.meanfield import meanfield_run
+
+TRAJECTORIES = ("phys_damage_next", "it_comp_end", "ot_comp_end", "outage_next")
+
+
+def test_meanfield_trajectories_match_monte_carlo_always_passive():
+    # under always_passive the vulnerabilities are deterministic, so the mean-field closures are exact
+    P = apply_defaults(default_parameters())
+    P["defender_policy"] = "always_passive"
+    T, n = 100, 4000
+
+    mf = meanfield_run(P, T=T)
+
+    PB = batch_parameters(P)
+    S = make_initial_batch_state(PB, n)
+    rng = np.random.default_rng(0)
+    defender = make_policy(PB)
+    mc = {k: np.zeros((T, n)) for k in TRAJECTORIES}
+    for t in range(T):
+        out = batch_step(PB, S, rng, defender.decide_batch(S, rng))
+        for k in TRAJECTORIES:
+            mc[k][t] = out[k]
+
+    for k in TRAJECTORIES:
+        mean = mc[k].mean(axis=1)
+        se = mc[k].std(axis=1, ddof=1) / np.sqrt(n)
+        expected = np.asarray(mf[k]).reshape(T)
+        assert np.all(np.abs(expected - mean) <= 4.5 * se + 1e-9), k
+
+
+@pytest.mark.parametrize("policy", ["threshold_v1", "random"])
+def test_meanfield_run_averages_close_to_monte_carlo(policy):
+    # policies that react to the state are evaluated at the conditional mean state, the documented error is a few percent
+    P = apply_defaults(default_parameters())
+    P["defender_policy"] = policy
+    T, n = 200, 4000
+
+    mf = meanfield_run(P, T=T)
+    PB = batch_parameters(P)
+    mc = summarize_batch(run_batch(PB, make_initial_batch_state(PB, n), np.random.default_rng(0), T=T))
+
+    pairs = {"outage_next": "mean_outage", "damage_step": "mean_damage_step",
+             "it_comp_end": "time_it_comp", "ot_comp_end": "time_ot_comp"}
+    for k, m in pairs.items():
+        assert float(np.mean(mf[k])) == pytest.approx(mc[m].mean(), rel=0.10), m
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.state import make_initial_state
+from cyber_sim.sim import run_sim
+from cyber_sim.metrics import summarize_run, block_bootstrap_starts, bootstrap_means, bootstrap_ci, compare_runs
+
+
+def run(policy, seed, T=3000):
+    P = apply_defaults(default_parameters())
+    P.update(defender_policy=policy, T=T)
+    return run_sim(P, make_initial_state(P), np.random.default_rng(seed))
+
+
+def test_bootstrap_ci_estimates_match_summarize_run():
+    df = run("random", 1)
+    summary = summarize_run(df)
+    ci = bootstrap_ci(df, n_boot=500, seed=3)
+
+    for k in ("mean_reward", "mean_outage", "mean_damage_step", "time_it_comp", "time_ot_comp"):
+        assert ci.loc[k, "estimate"] == pytest.approx(summary[k], rel=1e-12, abs=1e-15)
+    for name, f in summary["action_freq"].items():
+        assert ci.loc["freq_" + name, "estimate"] == pytest.approx(f)
+    assert (ci["lo"] <= ci["estimate"]).all() and (ci["estimate"] <= ci["hi"]).all()
+    assert ci.loc["mean_outage", "se"] > 0
+
+
+def test_compare_runs_differences():
+    a, b = run("random", 1), run("threshold_v1", 2)
+    diff = compare_runs(a, b, n_boot=500, seed=3)
+    sa, sb = summarize_run(a), summarize_run(b)
+    assert diff.loc["mean_outage", "estimate"] == pytest.approx(sa["mean_outage"] - sb["mean_outage"])
+    assert diff.loc["mean_outage", "lo"] <= diff.loc["mean_outage", "estimate"] <= diff.loc["mean_outage", "hi"]
+    assert diff.loc["freq_RECOVER", "p_greater"] == 1.0
+
+
+def test_shared_starts_need_their_block_len():
+    df = run("random", 1, T=1000)
+    starts, block_len = block_bootstrap_starts(len(df), 200, rng=np.random.default_rng(0))
+    with pytest.raises(ValueError, match="block_len"):
+        bootstrap_means(df, starts=starts)
+    with pytest.raises(ValueError, match="do not fit"):
+        bootstrap_means(df, block_len=block_len + 5, starts=starts)
+
+    est, draws = bootstrap_means(df, block_len=block_len, starts=starts)
+    est2, draws2 = bootstrap_means(df, 200, block_len, np.random.default_rng(0))
+    assert np.allclose(draws.to_numpy(), draws2.to_numpy())
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.state import make_initial_state
+from cyber_sim.sim import run_sim
+from cyber_sim.rl import QLearner
+from cyber_sim.tilecoding import LinearQLearner
+from cyber_sim.batch import batch_parameters, make_initial_batch_state, run_batch
+from cyber_sim.policies import make_policy
+from cyber_sim.adversary import make_attacker, train_selfplay, evaluate_selfplay
+
+
+def trained_agent():
+    P = apply_defaults(default_parameters())
+    P["defender_policy"] = "qlearn_v1"
+    P["rl_learn"] = 1
+    P["T"] = 3000
+    agent = QLearner(n_actions=3)
+    run_sim(P, make_initial_state(P), np.random.default_rng(0), agent=agent)
+    return agent
+
+
+def visited_states(n):
+    P = apply_defaults(default_parameters())
+    PB = batch_parameters(P)
+    S = make_initial_batch_state(PB, n)
+    run_batch(PB, S, np.random.default_rng(1), T=50)
+    return S
+
+
+def test_frozen_greedy_decisions_ignore_ucb_bonus():
+    agent = trained_agent()
+    S = visited_states(200)
+    P = apply_defaults(default_parameters())
+    P["defender_policy"] = "qlearn_v1"
+    P["rl_epsilon"] = 0.0
+    P["rl_learn"] = 0
+
+    actions = {}
+    for c in (0.0, 5.0):
+        P["rl_ucb_c"] = c
+        policy = make_policy(P, agent=agent)
+        batch = policy.decide_batch(S, np.random.default_rng(2))
+        single = [policy.decide({k: v[i] for k, v in S.items()}, np.random.default_rng(3)) for i in range(20)]
+        actions[c] = (batch, single)
+    assert np.array_equal(actions[0.0][0], actions[5.0][0])
+    assert actions[0.0][1] == actions[5.0][1]
+
+    # while learning the bonus does change the choice
+    P["rl_learn"] = 1
+    learning = make_policy(P, agent=agent).decide_batch(S, np.random.default_rng(2))
+    assert not np.array_equal(learning, actions[0.0][0])
+
+
+@pytest.mark.parametrize("policy, agent", [("qlearn_v1", QLearner(n_actions=3)), ("linear_v1", LinearQLearner(n_actions=3)),
+                                           ("threshold_v1", None)])
+def test_decide_batch_on_a_single_state(policy, agent):
+    P = apply_defaults(default_parameters())
+    P["defender_policy"] = policy
+    P["rl_epsilon"] = 0.5
+    State = make_initial_state(P)
+    State["it_comp"] = 1
+    defender = make_policy(P, agent=agent)
+
+    action = defender.decide_batch(State, np.random.default_rng(0))
+    batch = defender.decide_batch({k: np.asarray([v]) for k, v in State.items()}, np.random.default_rng(0))
+    assert np.ndim(action) == 0
+    assert int(action) == int(batch[0])
+
+
+class CountingQLearner(QLearner):
+    # counts the steps that asked for the UCB bonus
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ucb_calls = 0
+
+    def ucb_bonus(self, s):
+        self.ucb_calls += 1
+        return super().ucb_bonus(s)
+
+
+def test_selfplay_frozen_defender_ignores_ucb_bonus():
+    P = apply_defaults(default_parameters())
+    P["rl_ucb_c"] = 2.0
+
+    # alternating: the defender learns for the first 10 steps only, the attacker for the next 10
+    defender = CountingQLearner(n_actions=3)
+    train_selfplay(P, defender, make_attacker(P), 20, n_envs=8, schedule="alternating", phase_steps=10)
+    assert defender.ucb_calls == 10
+
+    defender.ucb_calls = 0
+    evaluate_selfplay(P, defender, make_attacker(P), T=10, n_envs=8)
+    assert defender.ucb_calls == 0
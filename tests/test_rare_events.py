@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.batch import batch_parameters, make_initial_batch_state, batch_step
+from cyber_sim.policies import make_policy
+from cyber_sim.rare_events import DamageExceedance, crude_monte_carlo, importance_sampling
+
+
+def hardening_parameters():
+    # PASSIVE hardening (id_cap up, ot_vuln down) moves the attacker probabilities within the step
+    P = apply_defaults(default_parameters())
+    P.update(defender_policy="always_passive", p_attack=0.5, k_deterrence=5.0, delta_id_cap=0.2, id_cap_init=0.0,
+             p_high_base=1.0, T=5)
+    return P
+
+
+def batch_hit_rate(P, level, n, seed):
+    PB = batch_parameters(P)
+    S = make_initial_batch_state(PB, n)
+    rng = np.random.default_rng(seed)
+    defender = make_policy(PB)
+    hit = np.zeros(n, dtype=bool)
+    for _ in range(int(P["T"])):
+        batch_step(PB, S, rng, defender.decide_batch(S, rng))
+        hit |= S["phys_damage"] >= level
+    return hit.mean(), hit.std(ddof=1) / np.sqrt(n)
+
+
+@pytest.mark.parametrize("tilt", [None, {"p_attack": 0.7, "p_ot": 0.5}])
+def test_estimators_match_run_batch_on_common_event(tilt):
+    P = hardening_parameters()
+    ref, ref_se = batch_hit_rate(P, 0.03, 40000, seed=1)
+    if tilt is None:
+        out = crude_monte_carlo(P, DamageExceedance(0.03), T=5, n=40000, seed=2)
+    else:
+        out = importance_sampling(P, DamageExceedance(0.03), T=5, n=40000, tilt=tilt, seed=2)
+    assert abs(out["estimate"] - ref) <= 4 * np.hypot(out["std_error"], ref_se)
@@ -0,0 +1,31 @@
+import pytest
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.results import ResultsStore
+
+
+def _summary(freq):
+    return {"mean_outage": 0.1, "mean_damage_step": 0.01, "action_freq": freq}
+
+
+def test_query_unknown_where_key_raises(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    store.append(apply_defaults(default_parameters()), 1, _summary({"PASSIVE": 1.0}))
+    store.flush()
+
+    assert len(store.query(where={"p_attack": 0.35, "mean_outage": ("<", 1.0)})) == 1
+    with pytest.raises(KeyError, match="p_atack"):
+        store.query(where={"p_atack": 0.35})
+
+
+def test_query_fills_missing_action_frequencies_with_zero(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    P = apply_defaults(default_parameters())
+    store.append(P, 1, _summary({"PASSIVE": 1.0}))
+    store.flush()
+    store.append(P, 2, _summary({"PASSIVE": 0.5, "RECOVER": 0.5}))
+    store.flush()
+
+    df = store.query().sort_values("seed")
+    assert df["freq_RECOVER"].tolist() == [0.0, 0.5]
+    assert store.query(columns=["freq_ACTIVE"])["freq_ACTIVE"].tolist() == [0.0, 0.0]
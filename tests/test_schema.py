@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.state import make_initial_state
+from cyber_sim.sim import run_sim
+from cyber_sim.rl import QLearner
+from cyber_sim.schedules import Piecewise
+from cyber_sim.schema import compact_frame, compact_frame_from_rows
+
+
+@pytest.mark.parametrize("policy, G", [("random", 0.6), ("threshold_v1", Piecewise([(0, 0.2), (50, 0.9)])), ("qlearn_v1", 0.6)])
+@pytest.mark.parametrize("float32", [False, True])
+def test_compact_frame_from_rows_matches_compact_frame(policy, G, float32):
+    P = apply_defaults(default_parameters())
+    P.update(defender_policy=policy, T=120, G=G)
+    agent = QLearner(n_actions=3) if policy == "qlearn_v1" else None
+    rows = run_sim(P, make_initial_state(P), np.random.default_rng(1), agent=agent, schema="rows")
+
+    expected = compact_frame(pd.DataFrame(rows), float32=float32)
+    got = compact_frame_from_rows(rows, float32=float32)
+    pd.testing.assert_frame_equal(got, expected)
+    assert got.attrs.keys() == expected.attrs.keys()
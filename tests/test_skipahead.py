@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.state import make_initial_state
+from cyber_sim.batch import batch_parameters, make_initial_batch_state, run_batch, summarize_batch
+from cyber_sim.skipahead import run_skipahead
+
+METRICS = ("mean_outage", "mean_damage_step", "time_it_comp", "time_ot_comp")
+
+
+@pytest.mark.parametrize("policy", ["always_passive", "threshold_v1"])
+def test_skipahead_summaries_match_stepping(policy):
+    # quiet periods only exist at a low attack rate, which is where skipping matters
+    P = apply_defaults(default_parameters())
+    P["defender_policy"] = policy
+    P["p_attack"] = 0.05
+    P["T"] = 200
+    reps = 600
+
+    skip = {m: np.empty(reps) for m in METRICS}
+    explicit = 0
+    for seed in range(reps):
+        out = run_skipahead(P, make_initial_state(P), np.random.default_rng(seed))
+        explicit += out["explicit_steps"]
+        for m in METRICS:
+            skip[m][seed] = out[m]
+    assert explicit < reps * P["T"]
+
+    PB = batch_parameters(P)
+    step = summarize_batch(run_batch(PB, make_initial_batch_state(PB, reps), np.random.default_rng(10_000), T=P["T"]))
+
+    # per-run means are independent across seeds, so a two-sample z statistic checks the engines agree
+    for m in METRICS:
+        a, b = skip[m], step[m]
+        se = np.sqrt(a.var(ddof=1) / reps + b.var(ddof=1) / reps)
+        assert abs(a.mean() - b.mean()) <= 4.0 * se + 1e-12, m
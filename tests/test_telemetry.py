@@ -0,0 +1,36 @@
+import json
+
+import numpy as np
+import pytest
+
+from cyber_sim.parameters import default_parameters, apply_defaults
+from cyber_sim.state import make_initial_state
+from cyber_sim.sim import run_sim
+from cyber_sim.rl import QLearner
+from cyber_sim.telemetry import Telemetry
+
+
+class FailingQLearner(QLearner):
+    # raises on its n-th update, i.e. in the middle of a run
+    def __init__(self, fail_at):
+        super().__init__(n_actions=3)
+        self.fail_at = fail_at
+
+    def update(self, *args, **kwargs):
+        if self.n_updates + 1 == self.fail_at:
+            raise RuntimeError("update failed")
+        super().update(*args, **kwargs)
+
+
+def test_telemetry_file_flushed_and_closed_when_run_fails(tmp_path):
+    P = apply_defaults(default_parameters())
+    P.update(defender_policy="qlearn_v1", rl_learn=1, T=100)
+    path = tmp_path / "telemetry.jsonl"
+    telemetry = Telemetry(every=10, path=str(path))
+
+    with pytest.raises(RuntimeError, match="update failed"):
+        run_sim(P, make_initial_state(P), np.random.default_rng(0), agent=FailingQLearner(26), telemetry=telemetry)
+
+    assert telemetry._file is None
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["t"] for r in records] == [10, 20, 25]